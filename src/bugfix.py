@@ -1,12 +1,14 @@
-from arcgis.features import FeatureSet, GeoAccessor
+from arcgis.features import FeatureSet
 from codecarbon import track_emissions
 from configparser import ConfigParser
 import json
 import logging
 import os
 import pandas as pd
-import sqlite3 as sql
-import warnings
+from relate.polygons import PolygonIndex
+from relate.segments import SegmentIndex
+from traffic.projection import project_polylines
+from traffic.read import read_sqlite_as_df
 
 def read_geojson_as_sdf(filepath: str, encoding: str='utf8'):
     """
@@ -15,14 +17,6 @@ def read_geojson_as_sdf(filepath: str, encoding: str='utf8'):
     with open(filepath, encoding=encoding) as in_stream:
         return FeatureSet.from_geojson(json.load(in_stream)).sdf
     
-def read_sqlite_as_sdf(db_filepath: str, select_statement: str, x_column: str='longitude', y_column: str='latitude'):
-    """
-    Reads the data from a sqlite database into main memory using a SQL statement.
-    """
-    with sql.connect(db_filepath) as connection:
-        df = pd.read_sql_query(select_statement, connection)
-        return GeoAccessor.from_xy(df, x_column, y_column)
-    
 config = ConfigParser()
 config.read('config.user')
 
@@ -30,43 +24,31 @@ config.read('config.user')
 def urban_intersect():
     logger = logging.getLogger('codecarbon')
     logger.info('Load urban datasets...')
-    districts_sdf = read_geojson_as_sdf(config['DEFAULT']['CityDistrictsFilePath'], encoding='cp1252')
+    districts_index = PolygonIndex.from_geojson(config['DEFAULT']['CityDistrictsFilePath'], encoding='cp1252')
     streets_sdf = read_geojson_as_sdf(config['DEFAULT']['CityStreetFilePath'])
     if 'area' in streets_sdf.columns:
         streets_sdf = streets_sdf[streets_sdf['area'].isna()]
-    traffic_sdf = read_sqlite_as_sdf(config['DEFAULT']['TrafficFilePath'], 'SELECT * from agent_pos LIMIT 10;')
+    traffic_df = read_sqlite_as_df(config['DEFAULT']['TrafficFilePath'], 'SELECT * from agent_pos;', epsg=25832)
     logger.info('Urban datasets loaded.')
     
     logger.info('Intersecting traffic with city districts...')
-    traffic_joined_districts_sdf = traffic_sdf.spatial.join(districts_sdf, how='inner', op='intersects')
-    logger.info(f'{traffic_joined_districts_sdf.shape[0]} traffic locations have intersections with city districts.')
-    
-    warnings.filterwarnings('ignore')
+    traffic_df['district'] = districts_index.locate(traffic_df['longitude'], traffic_df['latitude'])
+    traffic_joined_districts_df = traffic_df[0 <= traffic_df['district']]
+    logger.info(f'{traffic_joined_districts_df.shape[0]} traffic locations have intersections with city districts.')
     
+    # Traffic locations were projected while reading
     logger.info('Projecting city streets...')
-    streets_sdf.spatial.project(25832, 'DHDN_To_WGS_1984_4_NTv2')
+    streets_paths = project_polylines([street['paths'] for street in streets_sdf.SHAPE], 25832)
     logger.info(f'{streets_sdf.shape[0]} city streets were projected.')
     
-    logger.info('Projecting traffic locations...')
-    traffic_sdf.spatial.project(25832, 'DHDN_To_WGS_1984_4_NTv2')
-    logger.info(f'{traffic_sdf.shape[0]} traffic locations were projected.')
-    
-    warnings.filterwarnings('default')
-    
-    logger.info('Constructing city streets buffer...')
-    buffered_streets_sdf = streets_sdf.copy()
-    buffered_streets_sdf.SHAPE = streets_sdf.SHAPE.geom.buffer(50)
-    logger.info(f'{buffered_streets_sdf.shape[0]} city streets buffer were constructed.')
-    
-    logger.info('Intersecting traffic with city streets buffer...')
-    traffic_joined_buffered_streets_sdf = traffic_sdf.spatial.join(buffered_streets_sdf, how='inner', op='intersects')
-    logger.info(f'{traffic_joined_districts_sdf.shape[0]} traffic locations have intersections with city streets buffer.')
+    logger.info('Indexing city street segments...')
+    streets_index = SegmentIndex(streets_paths, ids=streets_sdf['F_id'].to_numpy())
+    logger.info(f'{len(streets_index)} city streets were indexed.')
     
-    # Join traffic with intersected streets buffer with original streets
-    # Calculate distance between traffic location and corresponding streets
+    # Find the nearest street within 50 meters of every traffic location
     logger.info('Calculating distances to city streets...')
-    traffic_joined_streets_sdf = pd.merge(traffic_joined_buffered_streets_sdf, streets_sdf, how='left', on='F_id', suffixes=['', '_street'])
-    traffic_joined_streets_sdf['distance_to'] = traffic_joined_streets_sdf.SHAPE.geom.distance_to(traffic_joined_streets_sdf.SHAPE_street)
-    logger.info(f'{traffic_joined_streets_sdf.shape[0]} distances to city streets were calculated.') 
+    traffic_df['F_id'], traffic_df['distance_to'] = streets_index.nearest_ids(traffic_df['x'], traffic_df['y'], max_distance=50)
+    traffic_joined_streets_df = traffic_df[traffic_df['distance_to'].notna()]
+    logger.info(f'{traffic_joined_streets_df.shape[0]} distances to city streets were calculated.') 
 
 urban_intersect()
\ No newline at end of file
@@ -1,22 +1,27 @@
-import arcpy
 from codecarbon import EmissionsTracker
-from glob import glob
+from functools import partial
 import logging
 import os
-import pandas as pd
 from spatialcarbon.experiment import Experiment
 from spatialcarbon.data import get_print_emissions, get_summary_emissions
-from traffic.read import read_traffic_as_df, read_traffic_as_sdf, read_traffic_to_featureclass, read_traffic_as_featureclass
+from spatialcarbon.ledger import EmissionsLedger
+from traffic.distinct import count_distinct_csv, create_distinct_counter
+from traffic.proximity import PointOfInterest, count_distinct_near
+from traffic.read import iter_traffic_many, read_traffic_as_df, read_traffic_as_sdf, read_traffic_to_featureclass, read_traffic_as_featureclass
 
 
 
-def count_persons(project_name: str, use_case: str, csv_files_pattern: str):
+def count_persons(project_name: str, use_case: str, csv_files_pattern: str, mode: str="exact", processes: int=None):
     """
     Determines the number of persons from the specified traffic files.
+    Only the person column is read chunk by chunk and the per file counts are merged into a total.
+    The files are counted in parallel and merged as soon as they are completed.
 
     :param str project_name: the project name e.g. "Digital Twin"
     :param str use_case: the use case e.g. "Count Travellers"
     :param str csv_files_pattern: the file pattern e.g. "data/2023-*.csv"
+    :param str mode: the distinct count mode "exact" or "hll" (HyperLogLog)
+    :param int processes: the number of worker processes, by default the number of CPUs
     """
     experiment = Experiment(project_name, use_case)
     tracker_name = experiment.create_tracker_name()
@@ -29,11 +34,13 @@ def count_persons(project_name: str, use_case: str, csv_files_pattern: str):
     tracker.start()
 
     try:        
-        for csv_file in glob(csv_files_pattern):
-            logging.getLogger("codecarbon").info(f"Processing {csv_file} ...")
-            df = pd.read_csv(csv_file)
-            count_persons = df["person"].nunique()
-            print(f"Es gibt insgesamt {count_persons} verschiedene Personen in der Simulation." )
+        total_counter = create_distinct_counter(mode)
+        count_persons_csv = partial(count_distinct_csv, column="person", mode=mode)
+        for csv_file, person_counter in iter_traffic_many(csv_files_pattern, count_persons_csv, processes, ordered=False):
+            logging.getLogger("codecarbon").info(f"Processed {csv_file}.")
+            print(f"Es gibt insgesamt {person_counter.count()} verschiedene Personen in der Simulation." )
+            total_counter.merge(person_counter)
+        print(f"Es gibt insgesamt {total_counter.count()} verschiedene Personen in allen Simulationen." )
     except Exception as ex:
         logging.getLogger("codecarbon").error(ex)
     finally:
@@ -41,10 +48,19 @@ def count_persons(project_name: str, use_case: str, csv_files_pattern: str):
         emissions = tracker.stop()
         logging.getLogger("codecarbon").info(get_print_emissions(emissions))    
 
-def count_persons_EsriBonn(project_name: str, use_case: str, csv_files_pattern: str):
-
-    arcpy.env.overwriteOutput = True
+def count_persons_EsriBonn(project_name: str, use_case: str, csv_files_pattern: str, radius: float=50, processes: int=None, max_bytes: int=4 * 1024 ** 3):
+    """
+    Determines the number of persons passing the Esri office in Bonn from the specified traffic files.
+    The persons are queried within the radius using the geodesic distance without any geoprocessing round trips.
+    The next files are read in parallel while the current file is queried.
 
+    :param str project_name: the project name e.g. "Digital Twin"
+    :param str use_case: the use case e.g. "Count Esri Bonn"
+    :param str csv_files_pattern: the file pattern e.g. "data/2023-*.csv"
+    :param float radius: the radius in meters
+    :param int processes: the number of worker processes, by default the number of CPUs
+    :param int max_bytes: the memory ceiling of the files being read ahead
+    """
     # Creates a new tracker object
     experiment = Experiment(project_name, use_case)
     tracker_name = experiment.create_tracker_name()
@@ -56,31 +72,13 @@ def count_persons_EsriBonn(project_name: str, use_case: str, csv_files_pattern:
     tracker.start()
 
     try:        
-        for csv_file in glob(csv_files_pattern):
+        # Esri Niederlassung Bonn
+        esri_bonn = PointOfInterest("Esri Bonn", 7.1156570, 50.7201054, radius)
+        read_locations = partial(read_traffic_as_df, columns=["person", "longitude", "latitude"])
+        for csv_file, traffic_df in iter_traffic_many(csv_files_pattern, read_locations, processes, max_bytes=max_bytes):
             logging.getLogger("codecarbon").info(f"Processing {csv_file} ...")
-            # sdf = read_traffic_as_sdf(csv_file)
-
-            feature_class_result = read_traffic_to_featureclass(csv_file)
-            # in_memory (old/ArcMap) and memory workspace
-
-            # Esri Niederlassung Bonn
-            pt = arcpy.Point(7.1156570, 50.7201054)
-            pt_geometry = arcpy.PointGeometry(pt, spatial_reference=arcpy.SpatialReference(4326))
-
-            buffer_result = arcpy.Buffer_analysis(in_features=pt_geometry, out_feature_class="memory/BufferEsriBonn", buffer_distance_or_field= "50 Meters")
-            buffer = buffer_result[0]
-            intersect_result = arcpy.Intersect_analysis(in_features=[feature_class_result, buffer], out_feature_class="memory/IntersectEsriBonn")
-            intersect = intersect_result[0]
-
-            values = [row[0] for row in arcpy.da.SearchCursor(intersect, "person")]
-            uniqueValues = set(values)
-            print(f"Es gibt insgesamt {len(uniqueValues)} verschiedene Personen, die an der Esri Niederlassung in Bonn vorbeigelaufen sind.")
-
-            # read_traffic_as_featureclass(csv_file)
-            arcpy.ClearWorkspaceCache_management()
-
-            # clear memory workspace
-            arcpy.Delete_management("memory")
+            person_counters = count_distinct_near(traffic_df["longitude"], traffic_df["latitude"], traffic_df["person"], [esri_bonn])
+            print(f"Es gibt insgesamt {person_counters[esri_bonn.name].count()} verschiedene Personen, die an der Esri Niederlassung in Bonn vorbeigelaufen sind.")
     except Exception as ex:
         logging.getLogger("codecarbon").error(ex)
     finally:
@@ -111,7 +109,9 @@ if __name__=="__main__":
         logging.getLogger("codecarbon").info("")
         logging.getLogger("codecarbon").info("Project summary")
         logging.getLogger("codecarbon").info("===============")
-        for summary in get_summary_emissions("log/emissions.csv"):
-            logging.getLogger("codecarbon").info(summary)
+        with EmissionsLedger("log/emissions.sqlite") as ledger:
+            ledger.ingest_many("log/emissions-*.user")
+            for summary in get_summary_emissions("log/emissions.csv", ledger):
+                logging.getLogger("codecarbon").info(summary)
     except Exception as ex:
         logging.getLogger("codecarbon").error(ex)
\ No newline at end of file
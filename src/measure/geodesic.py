@@ -0,0 +1,73 @@
+import numpy as np
+
+# WGS 84 ellipsoid
+WGS84_SEMI_MAJOR_AXIS = 6378137.0
+WGS84_FLATTENING = 1 / 298.257223563
+
+
+
+def geodesic_inverse(longitude_from, latitude_from, longitude_to, latitude_to, max_iterations: int=200, tolerance: float=1e-12):
+    """
+    Solves the inverse geodesic problem on the WGS 84 ellipsoid for arrays of point pairs using Vincenty's formulae.
+    Returns the initial azimuth in degrees (-180 to 180, clockwise from north) and the geodesic distance in meters
+    like ``PointGeometry.angleAndDistanceTo`` does for a single pair.
+
+    :param longitude_from:  The longitudes of the start points in degrees.
+    :param latitude_from:   The latitudes of the start points in degrees.
+    :param longitude_to:    The longitudes of the end points in degrees.
+    :param latitude_to:     The latitudes of the end points in degrees.
+    :param int max_iterations:  The maximum number of iterations for the longitude on the auxiliary sphere.
+    :param float tolerance:     The convergence tolerance in radians.
+    """
+    a = WGS84_SEMI_MAJOR_AXIS
+    f = WGS84_FLATTENING
+    b = a * (1 - f)
+
+    longitude_from, latitude_from, longitude_to, latitude_to = np.broadcast_arrays(
+        np.radians(np.asarray(longitude_from, dtype=np.float64)),
+        np.radians(np.asarray(latitude_from, dtype=np.float64)),
+        np.radians(np.asarray(longitude_to, dtype=np.float64)),
+        np.radians(np.asarray(latitude_to, dtype=np.float64)))
+
+    # reduced latitudes
+    u1 = np.arctan((1 - f) * np.tan(latitude_from))
+    u2 = np.arctan((1 - f) * np.tan(latitude_to))
+    sin_u1, cos_u1 = np.sin(u1), np.cos(u1)
+    sin_u2, cos_u2 = np.sin(u2), np.cos(u2)
+
+    delta_longitude = longitude_to - longitude_from
+    lambda_ = delta_longitude.copy()
+    active = np.ones(lambda_.shape, dtype=bool)
+    for _ in range(max_iterations):
+        sin_lambda, cos_lambda = np.sin(lambda_), np.cos(lambda_)
+        sin_sigma = np.hypot(cos_u2 * sin_lambda, cos_u1 * sin_u2 - sin_u1 * cos_u2 * cos_lambda)
+        cos_sigma = sin_u1 * sin_u2 + cos_u1 * cos_u2 * cos_lambda
+        sigma = np.arctan2(sin_sigma, cos_sigma)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            sin_alpha = np.where(sin_sigma == 0, 0.0, cos_u1 * cos_u2 * sin_lambda / sin_sigma)
+            cos_sq_alpha = 1 - sin_alpha ** 2
+            # equatorial lines have cos_sq_alpha == 0
+            cos_2sigma_m = np.where(cos_sq_alpha == 0, 0.0, cos_sigma - 2 * sin_u1 * sin_u2 / cos_sq_alpha)
+        c = f / 16 * cos_sq_alpha * (4 + f * (4 - 3 * cos_sq_alpha))
+        lambda_next = delta_longitude + (1 - c) * f * sin_alpha * (
+            sigma + c * sin_sigma * (cos_2sigma_m + c * cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)))
+        converged = np.abs(lambda_next - lambda_) <= tolerance
+        lambda_ = np.where(active, lambda_next, lambda_)
+        active &= ~converged
+        if not active.any():
+            break
+
+    sin_lambda, cos_lambda = np.sin(lambda_), np.cos(lambda_)
+    u_sq = cos_sq_alpha * (a ** 2 - b ** 2) / b ** 2
+    big_a = 1 + u_sq / 16384 * (4096 + u_sq * (-768 + u_sq * (320 - 175 * u_sq)))
+    big_b = u_sq / 1024 * (256 + u_sq * (-128 + u_sq * (74 - 47 * u_sq)))
+    delta_sigma = big_b * sin_sigma * (cos_2sigma_m + big_b / 4 * (
+        cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)
+        - big_b / 6 * cos_2sigma_m * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sigma_m ** 2)))
+    distance = b * big_a * (sigma - delta_sigma)
+
+    azimuth = np.degrees(np.arctan2(cos_u2 * sin_lambda, cos_u1 * sin_u2 - sin_u1 * cos_u2 * cos_lambda))
+    coincident = sin_sigma == 0
+    azimuth = np.where(coincident, 0.0, azimuth)
+    distance = np.where(coincident, 0.0, distance)
+    return azimuth, distance
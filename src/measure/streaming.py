@@ -0,0 +1,77 @@
+from measure.vectorized import measure_segments, parse_trip_time
+import numpy as np
+from spatialcarbon.tracing import span
+import sqlite3 as sql
+from traffic.read import iter_sqlite_chunks, to_traffic_array
+from traffic.sink import SqliteSink
+
+
+
+def create_trip_time_index(db_filepath: str, table: str="agent_pos") -> None:
+    """
+    Creates the index on trip and trip time, so that every chunk query seeks instead of sorting the whole table.
+    """
+    with sql.connect(db_filepath) as connection:
+        connection.execute(f'CREATE INDEX IF NOT EXISTS "{table}_trip_time" ON "{table}" (trip, trip_time);')
+
+def measure_sqlite_chunks(db_filepath: str, table: str="agent_pos", chunk_size: int=100000, shift_hours: int=-1, create_index: bool=True):
+    """
+    Measures the traffic table chunk by chunk ordered by trip and trip time and yields the enriched chunks.
+    Only the last trip of a chunk can continue in the next chunk, so its last point is carried over
+    and the results match measuring the whole table in main memory.
+
+    :param str db_filepath:     The traffic sqlite file.
+    :param str table:           The table name.
+    :param int chunk_size:      The maximum number of rows per chunk.
+    :param int shift_hours:     The hours being added to every trip time.
+    :param bool create_index:   Creates the trip time index if it does not exist.
+    """
+    if create_index:
+        create_trip_time_index(db_filepath, table)
+
+    # trip, longitude, latitude and trip time of the last point
+    last_point = None
+    for chunk_df in iter_sqlite_chunks(db_filepath, table, chunk_size, key_columns=("trip", "trip_time")):
+        with span("measure.chunk", chunk_df.shape[0]):
+            chunk_df["trip_time"] = parse_trip_time(chunk_df["trip_time"], shift_hours=shift_hours)
+            trip = chunk_df["trip"].to_numpy()
+            longitude = chunk_df["longitude"].to_numpy(dtype=np.float64)
+            latitude = chunk_df["latitude"].to_numpy(dtype=np.float64)
+            trip_time = chunk_df["trip_time"].to_numpy()
+            if None is last_point:
+                direction, distance, speed = measure_segments(trip, longitude, latitude, trip_time)
+            else:
+                direction, distance, speed = measure_segments(np.concatenate(([last_point[0]], trip)),
+                                                              np.concatenate(([last_point[1]], longitude)),
+                                                              np.concatenate(([last_point[2]], latitude)),
+                                                              np.concatenate(([last_point[3]], trip_time)))
+                direction, distance, speed = direction[1:], distance[1:], speed[1:]
+
+            last_point = (trip[-1], longitude[-1], latitude[-1], trip_time[-1])
+            chunk_df["point_direction"] = direction
+            chunk_df["point_distance"] = distance
+            chunk_df["speed"] = speed
+        yield chunk_df
+
+def measure_sqlite_to_sink(db_filepath: str, sink=None, table: str="agent_pos", chunk_size: int=100000, shift_hours: int=-1, create_index: bool=True):
+    """
+    Measures the traffic table with constant memory and writes the enriched rows into a sink as they are measured.
+    By default the rows are written into the "traffic_measured" table of the same database.
+
+    :param str db_filepath:     The traffic sqlite file.
+    :param sink:                The sink e.g. a SqliteSink, GeoPackageSink or ArrowSink.
+    :param str table:           The table name.
+    :param int chunk_size:      The maximum number of rows per chunk.
+    :param int shift_hours:     The hours being added to every trip time.
+    :param bool create_index:   Creates the trip time index if it does not exist.
+    """
+    if None is sink:
+        sink = SqliteSink(db_filepath, "traffic_measured")
+
+    try:
+        for chunk_df in measure_sqlite_chunks(db_filepath, table, chunk_size, shift_hours, create_index):
+            with span("measure.write_chunk", chunk_df.shape[0]):
+                sink.write(to_traffic_array(chunk_df))
+    finally:
+        output = sink.close()
+    return output
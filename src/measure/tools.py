@@ -1,5 +1,9 @@
 import arcpy
 import datetime
+from measure.vectorized import measure_segments, parse_trip_time
+import numpy as np
+from spatialcarbon.tracing import span
+from traffic.schema import traffic_field_mapping
 
 def convert_timefield(feature_class: str):
     
@@ -41,7 +45,7 @@ class MeasureTool(object):
             in_features=feature_class,
             out_features="memory/traffic_data_changed_timefield",
             use_field_alias_as_name="NOT_USE_ALIAS",
-            field_mapping='id "id" true true false 0 Long 0 0,First,#,traffic_data,id,-1,-1;trip "trip" true true false 0 Long 0 0,First,#,traffic_data,trip,-1,-1;person "person" true true false 0 Long 0 0,First,#,traffic_data,person,-1,-1;vehicle_type "vehicle_type" true true false 8 Text 0 0,First,#,traffic_data,vehicle_type,0,8;distance_crossed "distance_crossed" true true false 0 Long 0 0,First,#,traffic_data,distance_crossed,-1,-1;latitude "latitude" true true false 0 Double 0 0,First,#,traffic_data,latitude,-1,-1;longitude "longitude" true true false 0 Double 0 0,First,#,traffic_data,longitude,-1,-1;trip_time_old "trip_time_old" true true false 38 Text 0 0,First,#,traffic_data,trip_time,0,38',)
+            field_mapping=traffic_field_mapping("traffic_data", {"trip_time": "trip_time_old"}))
         
         return out_feature_class[0]
         
@@ -57,9 +61,10 @@ class MeasureTool(object):
         trip_point_a = Trip.create_empty()
 
         feature_class_column_names = ["trip", "longitude", "latitude", "trip_time", "trip_time_old", "point_direction", "point_distance", "speed"]
-        with arcpy.da.UpdateCursor(feature_class, feature_class_column_names) as cur:
+        with span("measure.cursor_loop") as loop_span, arcpy.da.UpdateCursor(feature_class, feature_class_column_names) as cur:
 
             for row in cur:
+                loop_span.add_rows(1)
                 
                 timestamp_string = row[4]
                 
@@ -83,8 +88,8 @@ class MeasureTool(object):
         return feature_class
 
     def calculate_distance_speed(self, trip_point_b, trip_point_a):
-        current_point = self.create_geometry(trip_point_b.lat, trip_point_b.long)
-        last_point = self.create_geometry(trip_point_a.lat, trip_point_a.long)
+        current_point = self.create_geometry(trip_point_b.long, trip_point_b.lat)
+        last_point = self.create_geometry(trip_point_a.long, trip_point_a.lat)
         trip_point_b.angle, trip_point_b.distance = current_point.angleAndDistanceTo(last_point)
         
         differential_seconds = datetime.timedelta.total_seconds(trip_point_b.trip_time - trip_point_a.trip_time)
@@ -98,7 +103,53 @@ class MeasureTool(object):
 
         return trip_point_b
 
-    def run(self, feature_class: str, workspace_dir: str):
+    def measure_numpy(self, feature_class):
+        """
+        Measures direction, distance and speed of all trip segments in one vectorized pass
+        instead of creating point geometries for every row.
+        The feature class must be sorted by trip and trip time.
+        """
+        with span("measure.to_array") as array_span:
+            feature_class_array = arcpy.da.TableToNumPyArray(feature_class, ["trip", "longitude", "latitude", "trip_time_old"])
+            array_span.add_rows(feature_class_array.shape[0])
+        with span("measure.segments", feature_class_array.shape[0]):
+            trip_time = parse_trip_time(feature_class_array["trip_time_old"])
+            direction, distance, speed = measure_segments(feature_class_array["trip"],
+                                                          feature_class_array["longitude"],
+                                                          feature_class_array["latitude"],
+                                                          trip_time)
+        
+        # numpy.datetime64 is not valid for a feature class
+        trip_time_values = trip_time.astype("datetime64[us]").tolist()
+        segment_values = zip(np.isnan(direction).tolist(), direction.tolist(), distance.tolist(), speed.tolist())
+
+        feature_class_column_names = ["trip_time", "point_direction", "point_distance", "speed"]
+        with span("measure.update_cursor", feature_class_array.shape[0]), arcpy.da.UpdateCursor(feature_class, feature_class_column_names) as cur:
+
+            for row, trip_time_value, (first_point, angle, point_distance, point_speed) in zip(cur, trip_time_values, segment_values):
+
+                row[0] = trip_time_value
+                if not first_point:
+                    row[1] = angle
+                    row[2] = point_distance
+                    # zero time gaps have no speed
+                    row[3] = None if point_speed != point_speed else point_speed
+
+                cur.updateRow(row)
+
+        return feature_class
+
+    def run(self, feature_class: str, workspace_dir: str, engine: str="cursor"):
+        """
+        Measures direction, distance and speed of the traffic data.
+
+        :param str feature_class:   The traffic feature class.
+        :param str workspace_dir:   The output workspace directory.
+        :param str engine:          The measure engine "cursor" (row by row) or "numpy" (vectorized).
+        """
+        if engine not in ("cursor", "numpy"):
+            raise ValueError(f"Unknown measure engine {engine}!")
+
         arcpy.env.overwriteOutput = True
         gdb_workspace = f"{workspace_dir}/traffic.gdb"
         if not arcpy.Exists(gdb_workspace):
@@ -107,11 +158,19 @@ class MeasureTool(object):
         else:
             arcpy.env.workspace = gdb_workspace
 
-        feature_class = self.change_timefield(feature_class)
-
-        arcpy.Sort_management(feature_class, "traffic_data", [["trip", "ASCENDING"], ["trip_time_old", "ASCENDING"]])
-        feature_class = arcpy.AddFields_management(in_table="traffic_data", field_description=[["trip_time", "DATE"],["point_direction", "DOUBLE", "", "", "0", ""], ["point_distance", "DOUBLE", "", "", "0", ""], ["speed", "DOUBLE", "", "", "0", ""]])
-
-        self.measure(feature_class)
-        arcpy.DeleteField_management(feature_class, drop_field=["trip_time_old", "ORIG_FID"])
+        with span("measure.change_timefield"):
+            feature_class = self.change_timefield(feature_class)
+
+        with span("measure.sort"):
+            arcpy.Sort_management(feature_class, "traffic_data", [["trip", "ASCENDING"], ["trip_time_old", "ASCENDING"]])
+        with span("measure.add_fields"):
+            feature_class = arcpy.AddFields_management(in_table="traffic_data", field_description=[["trip_time", "DATE"],["point_direction", "DOUBLE", "", "", "0", ""], ["point_distance", "DOUBLE", "", "", "0", ""], ["speed", "DOUBLE", "", "", "0", ""]])
+
+        with span(f"measure.{engine}"):
+            if "numpy" == engine:
+                self.measure_numpy(feature_class)
+            else:
+                self.measure(feature_class)
+        with span("measure.delete_fields"):
+            arcpy.DeleteField_management(feature_class, drop_field=["trip_time_old", "ORIG_FID"])
         return feature_class
@@ -0,0 +1,263 @@
+from measure.vectorized import measure_segments, parse_trip_time
+import numpy as np
+import pandas as pd
+from traffic.distinct import create_distinct_counter
+
+
+
+def _integer_array(values, name: str, nullable: bool=False):
+    """
+    Returns the identifiers keeping the narrow integer types of the traffic schema.
+    Missing identifiers are only allowed if nullable and kept as masked integer array instead of a fake identifier.
+    """
+    values = pd.Series(values)
+    missing = values.isna()
+    has_missing = missing.any()
+    if has_missing and not nullable:
+        raise ValueError(f"The {name} values must not be missing!")
+
+    valid_values = values[~missing] if has_missing else values
+    if not pd.api.types.is_integer_dtype(valid_values.dtype):
+        valid_values = pd.to_numeric(valid_values).to_numpy()
+        if not (np.isfinite(valid_values) & (valid_values == np.floor(valid_values))).all():
+            raise ValueError(f"The {name} values must be integers!")
+
+    if has_missing:
+        return pd.array(values, dtype=values.dtype if pd.api.types.is_extension_array_dtype(values.dtype) else "Int64")
+    if pd.api.types.is_integer_dtype(values.dtype):
+        return np.ascontiguousarray(values.to_numpy())
+    return np.ascontiguousarray(values.to_numpy(dtype=np.int64))
+
+
+class TripView(object):
+    """
+    Represents the points of one trip as views into the arrays of a trip table.
+    """
+
+    def __init__(self, trip_id, longitude, latitude, trip_time, person=None) -> None:
+        self.trip_id = trip_id
+        self.longitude = longitude
+        self.latitude = latitude
+        self.trip_time = trip_time
+        self.person = person
+
+    def __len__(self):
+        return self.longitude.shape[0]
+
+
+class TripTable(object):
+    """
+    Represents the traffic points as contiguous typed arrays sorted by trip and trip time.
+    The points of trip i are located between offsets[i] and offsets[i + 1],
+    so the trip boundaries are derived once and every trip is a zero-copy slice.
+    """
+
+    def __init__(self, trip, longitude, latitude, trip_time, person=None, vehicle_type=None) -> None:
+        self._trip = _integer_array(trip, "trip")
+        self._longitude = np.ascontiguousarray(longitude, dtype=np.float64)
+        self._latitude = np.ascontiguousarray(latitude, dtype=np.float64)
+        self._trip_time = np.ascontiguousarray(trip_time, dtype="datetime64[ns]")
+        self._person = None if None is person else _integer_array(person, "person", nullable=True)
+        self._vehicle_type = None if None is vehicle_type else pd.Categorical(vehicle_type)
+
+        point_count = self._trip.shape[0]
+        for values in (self._longitude, self._latitude, self._trip_time, self._person, self._vehicle_type):
+            if None is not values and values.shape[0] != point_count:
+                raise ValueError("All columns must have the same length!")
+
+        if not self._is_sorted():
+            order = np.lexsort((self._trip_time, self._trip))
+            self._trip = self._trip[order]
+            self._longitude = self._longitude[order]
+            self._latitude = self._latitude[order]
+            self._trip_time = self._trip_time[order]
+            if None is not self._person:
+                self._person = self._person[order]
+            if None is not self._vehicle_type:
+                self._vehicle_type = self._vehicle_type[order]
+
+        trip_starts = np.flatnonzero(np.concatenate(([True], self._trip[1:] != self._trip[:-1]))) if 0 < point_count else np.empty(0, dtype=np.int64)
+        self._offsets = np.append(trip_starts, point_count).astype(np.int64)
+        self._trip_ids = self._trip[trip_starts]
+
+    def _is_sorted(self) -> bool:
+        trip_steps = np.diff(self._trip)
+        if (trip_steps < 0).any():
+            return False
+
+        same_trip = 0 == trip_steps
+        return not (self._trip_time[1:][same_trip] < self._trip_time[:-1][same_trip]).any()
+
+    @staticmethod
+    def from_df(traffic_df: pd.DataFrame, shift_hours: int=-1):
+        """
+        Creates a trip table from a traffic dataframe e.g. returned by read_sqlite_as_df.
+        The trip times are parsed and shifted like the measure tool does.
+
+        :param traffic_df:          The traffic dataframe.
+        :param int shift_hours:     The hours being added to the trip times.
+        """
+        return TripTable(traffic_df["trip"].to_numpy(),
+                         traffic_df["longitude"].to_numpy(),
+                         traffic_df["latitude"].to_numpy(),
+                         parse_trip_time(traffic_df["trip_time"], shift_hours=shift_hours),
+                         traffic_df["person"].to_numpy() if "person" in traffic_df.columns else None,
+                         traffic_df["vehicle_type"] if "vehicle_type" in traffic_df.columns else None)
+
+    @staticmethod
+    def from_array(traffic_array: np.ndarray, shift_hours: int=-1):
+        """
+        Creates a trip table from a structured traffic array e.g. returned by to_traffic_array or iter_sqlite_chunks.
+        The trip times are parsed and shifted like the measure tool does.
+
+        :param traffic_array:       The structured traffic array.
+        :param int shift_hours:     The hours being added to the trip times.
+        """
+        field_names = traffic_array.dtype.names
+        return TripTable(traffic_array["trip"],
+                         traffic_array["longitude"],
+                         traffic_array["latitude"],
+                         parse_trip_time(traffic_array["trip_time"], shift_hours=shift_hours),
+                         traffic_array["person"] if "person" in field_names else None,
+                         traffic_array["vehicle_type"] if "vehicle_type" in field_names else None)
+
+    @property
+    def trip(self):
+        return self._trip
+
+    @property
+    def longitude(self):
+        return self._longitude
+
+    @property
+    def latitude(self):
+        return self._latitude
+
+    @property
+    def trip_time(self):
+        return self._trip_time
+
+    @property
+    def person(self):
+        return self._person
+
+    @property
+    def vehicle_type(self):
+        return self._vehicle_type
+
+    @property
+    def offsets(self):
+        return self._offsets
+
+    @property
+    def trip_ids(self):
+        return self._trip_ids
+
+    @property
+    def trip_count(self) -> int:
+        return self._trip_ids.shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Returns the number of bytes of all arrays.
+        """
+        byte_count = sum(values.nbytes for values in (self._trip, self._longitude, self._latitude, self._trip_time, self._offsets, self._trip_ids))
+        if None is not self._person:
+            byte_count += self._person.nbytes
+        if None is not self._vehicle_type:
+            byte_count += self._vehicle_type.codes.nbytes
+        return byte_count
+
+    def __len__(self):
+        return self._trip.shape[0]
+
+    def __getitem__(self, index: int) -> TripView:
+        """
+        Returns the trip at the index as views without copying.
+        """
+        start, end = self._offsets[index], self._offsets[index + 1]
+        return TripView(self._trip_ids[index],
+                        self._longitude[start:end],
+                        self._latitude[start:end],
+                        self._trip_time[start:end],
+                        None if None is self._person else self._person[start:end])
+
+    def __iter__(self):
+        for index in range(self.trip_count):
+            yield self[index]
+
+    def find(self, trip_id) -> int:
+        """
+        Returns the index of the trip or -1 if the trip does not exist.
+        """
+        index = np.searchsorted(self._trip_ids, trip_id)
+        if index < self.trip_count and self._trip_ids[index] == trip_id:
+            return int(index)
+        return -1
+
+    def lengths(self) -> np.ndarray:
+        """
+        Returns the number of points of every trip.
+        """
+        return np.diff(self._offsets)
+
+    def first_points(self) -> np.ndarray:
+        """
+        Returns the point indices of every trip start.
+        """
+        return self._offsets[:-1]
+
+    def last_points(self) -> np.ndarray:
+        """
+        Returns the point indices of every trip end.
+        """
+        return self._offsets[1:] - 1
+
+    def reduce(self, values, ufunc=np.add) -> np.ndarray:
+        """
+        Reduces the point values of every trip e.g. the distances to the trip length.
+
+        :param values:  The values of all points.
+        :param ufunc:   The reducing ufunc e.g. np.add, np.maximum or np.minimum.
+        """
+        values = np.asarray(values)
+        if 0 == self.trip_count:
+            return np.empty(0, dtype=values.dtype)
+        return ufunc.reduceat(values, self._offsets[:-1])
+
+    def measure(self):
+        """
+        Returns direction, distance and speed of all points, the first point of every trip is NaN.
+        """
+        return measure_segments(self._trip, self._longitude, self._latitude, self._trip_time)
+
+    def count_distinct(self, column: str="person", mode: str="exact", precision: int=14) -> int:
+        """
+        Counts the distinct values of a column e.g. the persons being on the move.
+
+        :param str column:      The column name e.g. "person" or "trip".
+        :param str mode:        Exact counting or HyperLogLog estimation.
+        :param int precision:   The HyperLogLog precision.
+        """
+        if "trip" == column:
+            return self.trip_count
+
+        values = getattr(self, column)
+        if None is values:
+            raise ValueError(f"The column {column} does not exist!")
+
+        distinct_counter = create_distinct_counter(mode, precision)
+        distinct_counter.add(values)
+        return distinct_counter.count()
+
+    def to_df(self) -> pd.DataFrame:
+        """
+        Returns the points as dataframe sorted by trip and trip time.
+        """
+        columns = {"trip": self._trip, "longitude": self._longitude, "latitude": self._latitude, "trip_time": self._trip_time}
+        if None is not self._person:
+            columns["person"] = self._person
+        if None is not self._vehicle_type:
+            columns["vehicle_type"] = self._vehicle_type
+        return pd.DataFrame(columns)
@@ -0,0 +1,47 @@
+from measure.geodesic import geodesic_inverse
+import numpy as np
+from traffic.schema import parse_trip_time
+
+
+
+def measure_segments(trip, longitude, latitude, trip_time):
+    """
+    Calculates direction, distance and speed for all consecutive points of the same trip in one vectorized pass.
+    The arrays must be sorted by trip and trip time. The first point of every trip has no segment and is NaN.
+    The direction is the geodesic azimuth from the current point towards the last point in degrees,
+    the distance is rounded to centimeters and the speed is in kilometers per hour.
+    Segments without elapsed time and a distance greater than zero have an undefined speed of NaN.
+
+    :param trip:        The trip identifiers.
+    :param longitude:   The longitudes in degrees.
+    :param latitude:    The latitudes in degrees.
+    :param trip_time:   The trip times as datetime64 values.
+    """
+    trip = np.asarray(trip)
+    longitude = np.asarray(longitude, dtype=np.float64)
+    latitude = np.asarray(latitude, dtype=np.float64)
+    trip_time = np.asarray(trip_time, dtype="datetime64[ns]")
+
+    point_count = trip.shape[0]
+    direction = np.full(point_count, np.nan)
+    distance = np.full(point_count, np.nan)
+    speed = np.full(point_count, np.nan)
+    if point_count < 2:
+        return direction, distance, speed
+
+    # point b is the current point, point a is the last point of the same trip
+    same_trip = trip[1:] == trip[:-1]
+    index_b = np.flatnonzero(same_trip) + 1
+    index_a = index_b - 1
+
+    segment_direction, segment_distance = geodesic_inverse(longitude[index_b], latitude[index_b],
+                                                           longitude[index_a], latitude[index_a])
+    differential_seconds = (trip_time[index_b] - trip_time[index_a]) / np.timedelta64(1, "s")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        segment_speed = np.where(differential_seconds != 0, segment_distance / differential_seconds * 3.6, np.nan)
+    segment_speed[segment_distance == 0] = 0
+
+    direction[index_b] = segment_direction
+    distance[index_b] = np.round(segment_distance, 2)
+    speed[index_b] = segment_speed
+    return direction, distance, speed
@@ -0,0 +1,241 @@
+import numpy as np
+import pandas as pd
+
+try:
+    import netCDF4
+except ImportError:
+    # the cube can always be saved as numpy archive
+    netCDF4 = None
+
+_SQRT3 = np.sqrt(3.0)
+# axial hexagon coordinates are packed into one sortable key
+_KEY_OFFSET = 1 << 30
+
+
+
+def axial_hexagons(x, y, distance_interval: float):
+    """
+    Returns the axial coordinates of the pointy-top hexagons containing the points using cube rounding.
+
+    :param x:                       The projected x coordinates in meters.
+    :param y:                       The projected y coordinates in meters.
+    :param float distance_interval: The distance between opposite hexagon edges in meters.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    hexagon_size = distance_interval / _SQRT3
+    q = (_SQRT3 / 3 * x - y / 3) / hexagon_size
+    r = (2 / 3 * y) / hexagon_size
+    s = -q - r
+    rounded_q, rounded_r, rounded_s = np.round(q), np.round(r), np.round(s)
+    delta_q, delta_r, delta_s = np.abs(rounded_q - q), np.abs(rounded_r - r), np.abs(rounded_s - s)
+    fix_q = (delta_r < delta_q) & (delta_s < delta_q)
+    fix_r = ~fix_q & (delta_s < delta_r)
+    rounded_q = np.where(fix_q, -rounded_r - rounded_s, rounded_q)
+    rounded_r = np.where(fix_r, -rounded_q - rounded_s, rounded_r)
+    return rounded_q.astype(np.int64), rounded_r.astype(np.int64)
+
+def axial_hexagon_centers(q, r, distance_interval: float):
+    """
+    Returns the projected x and y coordinates of the hexagon centers.
+    """
+    hexagon_size = distance_interval / _SQRT3
+    q = np.asarray(q)
+    r = np.asarray(r)
+    return hexagon_size * (_SQRT3 * q + _SQRT3 / 2 * r), hexagon_size * 1.5 * r
+
+
+class HexagonCube(object):
+    """
+    Represents a space time cube counting projected points in a pointy-top hexagon grid and regular time steps.
+    The distance interval is the distance between opposite hexagon edges in meters, the time interval in minutes.
+    The cube is stored sparse as counts of non-empty (location, time step) bins,
+    new simulation slices are appended without recomputing the existing bins.
+    """
+
+    def __init__(self, distance_interval: float=200, time_interval: int=1, time_origin=None, spatial_reference: int=25832) -> None:
+        self._distance_interval = float(distance_interval)
+        self._time_interval = int(time_interval)
+        self._time_origin = None if None is time_origin else np.datetime64(time_origin, "s")
+        self._spatial_reference = spatial_reference
+        self._location_keys = np.zeros(0, dtype=np.int64)
+        self._location_order = np.zeros(0, dtype=np.int64)
+        self._bin_locations = np.zeros(0, dtype=np.int64)
+        self._bin_time_steps = np.zeros(0, dtype=np.int64)
+        self._bin_counts = np.zeros(0, dtype=np.int64)
+
+    @property
+    def distance_interval(self):
+        return self._distance_interval
+
+    @property
+    def time_interval(self):
+        return self._time_interval
+
+    @property
+    def time_origin(self):
+        return self._time_origin
+
+    @property
+    def spatial_reference(self):
+        return self._spatial_reference
+
+    @property
+    def location_count(self) -> int:
+        return self._location_keys.size
+
+    @property
+    def time_step_count(self) -> int:
+        return int(self._bin_time_steps.max()) + 1 if 0 < self._bin_time_steps.size else 0
+
+    @property
+    def bins(self):
+        """
+        Returns the location indices, time step indices and counts of all non-empty bins.
+        """
+        return self._bin_locations, self._bin_time_steps, self._bin_counts
+
+    def _hexagons(self, x: np.ndarray, y: np.ndarray):
+        return axial_hexagons(x, y, self._distance_interval)
+
+    def hexagon_coordinates(self):
+        """
+        Returns the axial hexagon coordinates ordered by location index.
+        """
+        return (self._location_keys >> 32) - _KEY_OFFSET, (self._location_keys & 0xFFFFFFFF) - _KEY_OFFSET
+
+    def hexagon_centers(self):
+        """
+        Returns the projected x and y coordinates of the hexagon centers ordered by location index.
+        """
+        q, r = self.hexagon_coordinates()
+        return axial_hexagon_centers(q, r, self._distance_interval)
+
+    def time_steps(self) -> np.ndarray:
+        """
+        Returns the start times of all time steps.
+        """
+        return self._time_origin + np.arange(self.time_step_count) * np.timedelta64(self._time_interval, "m") if None is not self._time_origin else np.zeros(0, dtype="datetime64[s]")
+
+    def append(self, x, y, times):
+        """
+        Bins the projected points and adds their counts to the cube.
+        New hexagons get new location indices and new time steps extend the cube,
+        the indices of existing locations and time steps remain unchanged.
+
+        :param x:       The projected x coordinates in meters.
+        :param y:       The projected y coordinates in meters.
+        :param times:   The point times.
+        """
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        times = pd.to_datetime(pd.Series(times)).to_numpy(dtype="datetime64[s]")
+        if 0 == x.size:
+            return self
+
+        time_interval = np.timedelta64(self._time_interval, "m")
+        if None is self._time_origin:
+            self._time_origin = times.min().astype("datetime64[m]").astype("datetime64[s]")
+        time_steps = (times - self._time_origin) // time_interval
+        if 0 < time_steps.size and time_steps.min() < 0:
+            raise ValueError("Points before the time origin cannot be appended!")
+
+        q, r = self._hexagons(x, y)
+        location_keys = ((q + _KEY_OFFSET) << 32) | (r + _KEY_OFFSET)
+        locations = self._register_locations(location_keys)
+
+        # aggregate the new points per bin and merge them with the existing bins
+        bin_keys = np.concatenate((self._bin_locations * (1 << 32) + self._bin_time_steps, locations * (1 << 32) + time_steps))
+        bin_counts = np.concatenate((self._bin_counts, np.ones(x.size, dtype=np.int64)))
+        unique_keys, inverse = np.unique(bin_keys, return_inverse=True)
+        self._bin_counts = np.bincount(inverse.ravel(), weights=bin_counts, minlength=unique_keys.size).astype(np.int64)
+        self._bin_locations = unique_keys >> 32
+        self._bin_time_steps = unique_keys & 0xFFFFFFFF
+        return self
+
+    def find_locations(self, q: np.ndarray, r: np.ndarray) -> np.ndarray:
+        """
+        Returns the location indices of axial hexagon coordinates or -1 for hexagons not being part of the cube.
+        """
+        location_keys = ((np.asarray(q, dtype=np.int64) + _KEY_OFFSET) << 32) | (np.asarray(r, dtype=np.int64) + _KEY_OFFSET)
+        sorted_keys = self._location_keys[self._location_order]
+        positions = np.minimum(np.searchsorted(sorted_keys, location_keys), max(sorted_keys.size - 1, 0))
+        if 0 == sorted_keys.size:
+            return np.full(location_keys.shape, -1, dtype=np.int64)
+
+        return np.where(sorted_keys[positions] == location_keys, self._location_order[positions], -1)
+
+    def _register_locations(self, location_keys: np.ndarray) -> np.ndarray:
+        """
+        Returns the location indices of hexagon keys and appends unknown hexagons.
+        """
+        sorted_keys = self._location_keys[self._location_order]
+        positions = np.searchsorted(sorted_keys, location_keys)
+        known = positions < sorted_keys.size
+        known[known] = sorted_keys[positions[known]] == location_keys[known]
+        new_keys = np.unique(location_keys[~known])
+        if 0 < new_keys.size:
+            self._location_keys = np.concatenate((self._location_keys, new_keys))
+            self._location_order = np.argsort(self._location_keys, kind="stable")
+            sorted_keys = self._location_keys[self._location_order]
+            positions = np.searchsorted(sorted_keys, location_keys)
+        return self._location_order[positions]
+
+    def to_dense(self) -> np.ndarray:
+        """
+        Returns the counts as dense array of locations by time steps.
+        """
+        dense_counts = np.zeros((self.location_count, self.time_step_count), dtype=np.int64)
+        dense_counts[self._bin_locations, self._bin_time_steps] = self._bin_counts
+        return dense_counts
+
+    def save(self, cube_filepath: str):
+        """
+        Saves the sparse cube as numpy archive.
+        """
+        # an empty cube has no time origin, it is stored as NaT instead of a pickled None
+        time_origin = np.datetime64("NaT", "s") if None is self._time_origin else self._time_origin
+        with open(cube_filepath, "wb") as out_stream:
+            np.savez_compressed(out_stream, distance_interval=self._distance_interval, time_interval=self._time_interval,
+                                time_origin=time_origin, spatial_reference=self._spatial_reference,
+                                location_keys=self._location_keys, bin_locations=self._bin_locations,
+                                bin_time_steps=self._bin_time_steps, bin_counts=self._bin_counts)
+        return cube_filepath
+
+    @classmethod
+    def load(cls, cube_filepath: str):
+        """
+        Loads a cube saved as numpy archive.
+        """
+        with np.load(cube_filepath) as archive:
+            time_origin = archive["time_origin"][()]
+            cube = cls(float(archive["distance_interval"]), int(archive["time_interval"]),
+                       None if np.isnat(time_origin) else time_origin, int(archive["spatial_reference"]))
+            cube._location_keys = archive["location_keys"]
+            cube._location_order = np.argsort(cube._location_keys, kind="stable")
+            cube._bin_locations = archive["bin_locations"]
+            cube._bin_time_steps = archive["bin_time_steps"]
+            cube._bin_counts = archive["bin_counts"]
+        return cube
+
+    def to_netcdf(self, cube_filepath: str):
+        """
+        Saves the dense COUNT cube as netCDF file having the dimensions time and location.
+        """
+        if None is netCDF4:
+            raise RuntimeError("Saving a netCDF file requires the netCDF4 module!")
+
+        center_x, center_y = self.hexagon_centers()
+        with netCDF4.Dataset(cube_filepath, "w") as dataset:
+            dataset.distance_interval = self._distance_interval
+            dataset.time_interval = self._time_interval
+            dataset.spatial_reference = self._spatial_reference
+            dataset.createDimension("time", self.time_step_count)
+            dataset.createDimension("location", self.location_count)
+            time_variable = dataset.createVariable("time", "f8", ("time",))
+            time_variable.units = f"minutes since {np.datetime_as_string(self._time_origin)}"
+            time_variable[:] = np.arange(self.time_step_count) * self._time_interval
+            dataset.createVariable("x", "f8", ("location",))[:] = center_x
+            dataset.createVariable("y", "f8", ("location",))[:] = center_y
+            dataset.createVariable("COUNT", "i8", ("time", "location"), zlib=True)[:] = self.to_dense().T
+        return cube_filepath
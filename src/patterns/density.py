@@ -0,0 +1,157 @@
+import numpy as np
+import pandas as pd
+
+
+
+class DensityStack(object):
+    """
+    Represents a stack of density rasters having one raster per time step.
+    The rows of every raster start at the lower left corner and the densities are points per square meter.
+    """
+
+    def __init__(self, densities: np.ndarray, origin_x: float, origin_y: float, bin_size: float, time_origin, time_interval: int) -> None:
+        self._densities = densities
+        self._origin_x = float(origin_x)
+        self._origin_y = float(origin_y)
+        self._bin_size = float(bin_size)
+        self._time_origin = np.datetime64(time_origin, "s")
+        self._time_interval = int(time_interval)
+
+    @property
+    def densities(self) -> np.ndarray:
+        return self._densities
+
+    @property
+    def origin_x(self) -> float:
+        return self._origin_x
+
+    @property
+    def origin_y(self) -> float:
+        return self._origin_y
+
+    @property
+    def bin_size(self) -> float:
+        return self._bin_size
+
+    @property
+    def time_origin(self):
+        return self._time_origin
+
+    @property
+    def time_interval(self) -> int:
+        return self._time_interval
+
+    def time_steps(self) -> np.ndarray:
+        """
+        Returns the start times of all time steps.
+        """
+        return self._time_origin + np.arange(self._densities.shape[0]) * np.timedelta64(self._time_interval, "m")
+
+    def save(self, density_filepath: str):
+        """
+        Saves the density rasters as numpy archive.
+        """
+        with open(density_filepath, "wb") as out_stream:
+            np.savez_compressed(out_stream, densities=self._densities, origin_x=self._origin_x, origin_y=self._origin_y,
+                                bin_size=self._bin_size, time_origin=self._time_origin, time_interval=self._time_interval)
+        return density_filepath
+
+    @classmethod
+    def load(cls, density_filepath: str):
+        """
+        Loads density rasters saved as numpy archive.
+        """
+        with np.load(density_filepath) as archive:
+            return cls(archive["densities"], float(archive["origin_x"]), float(archive["origin_y"]), float(archive["bin_size"]),
+                       archive["time_origin"][()], int(archive["time_interval"]))
+
+
+
+def uniform_kernel(bin_size: float, neighborhood_size: float) -> np.ndarray:
+    """
+    Returns the uniform kernel weighting every cell whose center is within the neighborhood size.
+    """
+    radius = int(np.floor(neighborhood_size / bin_size))
+    offsets = np.arange(-radius, radius + 1) * bin_size
+    return (np.hypot(offsets[:, np.newaxis], offsets) <= neighborhood_size).astype(np.float64)
+
+def bin_points(x, y, times, bin_size: float, time_interval: int, margin: int=0, time_origin=None):
+    """
+    Counts the projected points per grid cell and time step.
+
+    :param x:               The projected x coordinates in meters.
+    :param y:               The projected y coordinates in meters.
+    :param times:           The point times.
+    :param bin_size:        The cell size in meters.
+    :param time_interval:   The time step interval in minutes.
+    :param margin:          The number of empty cells added around the points.
+    :param time_origin:     The start of the first time step, by default the first minute having a point.
+    :return:                The counts as array of time steps by rows by columns, the grid origin and the time origin.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    times = pd.to_datetime(pd.Series(times)).to_numpy(dtype="datetime64[s]")
+    if 0 == x.size:
+        raise ValueError("There are no points to bin!")
+
+    origin_x = (np.floor(x.min() / bin_size) - margin) * bin_size
+    origin_y = (np.floor(y.min() / bin_size) - margin) * bin_size
+    columns = ((x - origin_x) // bin_size).astype(np.int64)
+    rows = ((y - origin_y) // bin_size).astype(np.int64)
+    if None is time_origin:
+        time_origin = times.min().astype("datetime64[m]")
+    time_origin = np.datetime64(time_origin, "s")
+    time_steps = ((times - time_origin) // np.timedelta64(time_interval, "m")).astype(np.int64)
+    if time_steps.min() < 0:
+        raise ValueError("Points before the time origin cannot be binned!")
+
+    shape = (int(time_steps.max()) + 1, int(rows.max()) + margin + 1, int(columns.max()) + margin + 1)
+    # only the occupied cells are counted, the stack stays compact
+    occupied_cells, cell_counts = np.unique(np.ravel_multi_index((time_steps, rows, columns), shape), return_counts=True)
+    counts = np.zeros(shape, dtype=np.int32)
+    counts.ravel()[occupied_cells] = cell_counts
+    return counts, origin_x, origin_y, time_origin
+
+def convolve_stack(stack: np.ndarray, kernel: np.ndarray, batch_size: int=64, dtype=np.float64, transform=None) -> np.ndarray:
+    """
+    Convolves every raster of a stack with the kernel using real FFTs.
+    The rasters are zero padded so that no values wrap around and the result keeps the raster shape.
+    Only one batch of rasters is transformed at once, the optional transform is applied to every convolved batch.
+    """
+    if None is transform:
+        transform = lambda convolved_batch: convolved_batch
+    kernel_rows, kernel_columns = kernel.shape
+    rows, columns = stack.shape[1:]
+    fft_shape = (rows + kernel_rows - 1, columns + kernel_columns - 1)
+    kernel_spectrum = np.fft.rfft2(kernel, fft_shape)
+    convolved = np.empty(stack.shape, dtype=dtype)
+    row_offset, column_offset = kernel_rows // 2, kernel_columns // 2
+    for start in range(0, stack.shape[0], batch_size):
+        spectrum = np.fft.rfft2(stack[start:start + batch_size], fft_shape)
+        full = np.fft.irfft2(spectrum * kernel_spectrum, fft_shape)
+        convolved[start:start + batch_size] = transform(full[:, row_offset:row_offset + rows, column_offset:column_offset + columns])
+    return convolved
+
+def calculate_density(x, y, times, bin_size: float, time_interval: int, neighborhood_size: float=None, time_origin=None) -> DensityStack:
+    """
+    Calculates the uniform kernel density of the projected points for every time step.
+    The points are binned once, afterwards the costs only depend on the grid size.
+
+    :param x:                   The projected x coordinates in meters.
+    :param y:                   The projected y coordinates in meters.
+    :param times:               The point times.
+    :param bin_size:            The cell size in meters.
+    :param time_interval:       The time step interval in minutes.
+    :param neighborhood_size:   The kernel radius in meters, by default 1.5 times the bin size.
+    :param time_origin:         The start of the first time step.
+    """
+    if None is neighborhood_size:
+        neighborhood_size = 1.5 * bin_size
+    kernel = uniform_kernel(bin_size, neighborhood_size)
+    margin = kernel.shape[0] // 2
+    counts, origin_x, origin_y, time_origin = bin_points(x, y, times, bin_size, time_interval, margin, time_origin)
+    neighborhood_area = np.pi * neighborhood_size * neighborhood_size
+    # the convolved counts are integers apart from rounding errors
+    densities = convolve_stack(counts, kernel, dtype=np.float32,
+                               transform=lambda neighborhood_counts: np.rint(neighborhood_counts) / neighborhood_area)
+    return DensityStack(densities, origin_x, origin_y, bin_size, time_origin, time_interval)
@@ -0,0 +1,173 @@
+import numpy as np
+import pandas as pd
+from patterns.cube import HexagonCube
+from patterns.weights import SpaceTimeNeighbors
+
+# two sided critical z-scores
+CRITICAL_Z_SCORES = {0.1: 1.6449, 0.05: 1.9600, 0.01: 2.5758}
+
+# emerging hot spot categories, cold spots use the negative codes
+PATTERNS = {0: "No Pattern Detected",
+            1: "New Hot Spot", 2: "Consecutive Hot Spot", 3: "Intensifying Hot Spot", 4: "Persistent Hot Spot",
+            5: "Diminishing Hot Spot", 6: "Sporadic Hot Spot", 7: "Oscillating Hot Spot", 8: "Historical Hot Spot",
+            -1: "New Cold Spot", -2: "Consecutive Cold Spot", -3: "Intensifying Cold Spot", -4: "Persistent Cold Spot",
+            -5: "Diminishing Cold Spot", -6: "Sporadic Cold Spot", -7: "Oscillating Cold Spot", -8: "Historical Cold Spot"}
+
+
+
+def _critical_z_score(significance_level: float) -> float:
+    if not significance_level in CRITICAL_Z_SCORES:
+        raise ValueError(f"Significance level {significance_level} is not supported!")
+
+    return CRITICAL_Z_SCORES[significance_level]
+
+def gi_star(space_time_cube: HexagonCube, neighbors: SpaceTimeNeighbors) -> np.ndarray:
+    """
+    Calculates the Getis-Ord Gi* z-scores of the counts for every bin.
+    Empty bins count as zero, but only the non-empty bins are scattered to their neighbors.
+
+    :param space_time_cube:     The space time cube.
+    :param neighbors:           The space time neighbors including the bins themselves.
+    :return:                    The z-scores as dense array of locations by time steps.
+    """
+    if not neighbors.include_self:
+        raise ValueError("Gi* requires the bins being neighbors of themselves!")
+
+    bin_locations, bin_time_steps, bin_counts = space_time_cube.bins
+    bin_total = space_time_cube.location_count * space_time_cube.time_step_count
+    if bin_total < 2:
+        raise ValueError("Gi* requires at least two bins!")
+
+    mean = bin_counts.sum() / bin_total
+    standard_deviation = np.sqrt(np.square(bin_counts.astype(np.float64)).sum() / bin_total - mean * mean)
+    lag_sums = neighbors.lag(bin_locations, bin_time_steps, bin_counts)
+    # binary weights, the sum of squared weights equals the neighbor count
+    weight_sums = neighbors.counts().astype(np.float64)
+    denominators = standard_deviation * np.sqrt((bin_total * weight_sums - weight_sums * weight_sums) / (bin_total - 1))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z_scores = (lag_sums - mean * weight_sums) / denominators
+    z_scores[~np.isfinite(z_scores)] = 0.0
+    return z_scores
+
+def mann_kendall(values: np.ndarray):
+    """
+    Runs the Mann-Kendall trend test for every row vectorized over the columns being the time steps.
+    The pairwise signs are counted using one binary indexed tree per row.
+
+    :param values:  The values as array of rows by time steps.
+    :return:        The Mann-Kendall statistics and z-scores of every row.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    row_count, time_step_count = values.shape
+    if time_step_count < 2:
+        return np.zeros(row_count, dtype=np.int64), np.zeros(row_count, dtype=np.float64)
+
+    # dense ranks starting by one, tied values share their rank
+    order = np.argsort(values, axis=1, kind="stable")
+    sorted_values = np.take_along_axis(values, order, axis=1)
+    sorted_boundaries = np.ones(values.shape, dtype=bool)
+    sorted_boundaries[:, 1:] = sorted_values[:, 1:] != sorted_values[:, :-1]
+    sorted_ranks = np.cumsum(sorted_boundaries, axis=1)
+    ranks = np.empty_like(sorted_ranks)
+    np.put_along_axis(ranks, order, sorted_ranks, axis=1)
+
+    # equal values keep their time order in sorted order, the earlier ties precede every value
+    sorted_positions = np.broadcast_to(np.arange(time_step_count), values.shape)
+    group_starts = np.maximum.accumulate(np.where(sorted_boundaries, sorted_positions, 0), axis=1)
+    tied_before = np.empty_like(sorted_ranks)
+    np.put_along_axis(tied_before, order, sorted_positions - group_starts, axis=1)
+
+    # the trees of all rows are interleaved and padded to a power of two, index zero is never updated
+    tree_size = 1 << int(time_step_count).bit_length()
+    level_count = tree_size.bit_length()
+    rows = np.arange(row_count)
+    tree = np.zeros((tree_size + 1) * row_count, dtype=np.int64)
+    statistics = np.zeros(row_count, dtype=np.int64)
+    for time_step in range(time_step_count):
+        rank = ranks[:, time_step]
+        smaller = np.zeros(row_count, dtype=np.int64)
+        index = rank - 1
+        for _ in range(level_count):
+            smaller += tree[index * row_count + rows]
+            index &= index - 1
+        greater = time_step - smaller - tied_before[:, time_step]
+        statistics += smaller - greater
+        index = rank.copy()
+        for _ in range(level_count):
+            tree[np.minimum(index, tree_size) * row_count + rows] += index <= tree_size
+            index += index & -index
+
+    # variance corrected by the tied groups
+    group_starts = np.flatnonzero(sorted_boundaries.ravel())
+    group_sizes = np.diff(np.append(group_starts, values.size))
+    group_rows = group_starts // time_step_count
+    tie_corrections = np.bincount(group_rows, weights=group_sizes * (group_sizes - 1) * (2 * group_sizes + 5), minlength=row_count)
+    variances = (time_step_count * (time_step_count - 1) * (2 * time_step_count + 5) - tie_corrections) / 18
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z_scores = np.where(0 < variances, (statistics - np.sign(statistics)) / np.sqrt(variances), 0.0)
+    return statistics, z_scores
+
+def _classify_spots(significant: np.ndarray, opposite: np.ndarray, trend_z_scores: np.ndarray, critical_z_score: float) -> np.ndarray:
+    """
+    Returns the positive emerging hot spot categories of locations being significant at the final time step
+    and historical spots for all other locations.
+    """
+    time_step_count = significant.shape[1]
+    significant_counts = significant.sum(axis=1)
+    most_of_time = 0.9 <= significant_counts / time_step_count
+    final_significant = significant[:, -1]
+    # length of the uninterrupted run of significant time steps at the end
+    reversed_gaps = ~significant[:, ::-1]
+    final_runs = np.where(reversed_gaps.any(axis=1), np.argmax(reversed_gaps, axis=1), time_step_count)
+
+    categories = np.zeros(significant.shape[0], dtype=np.int64)
+    categories[final_significant & ~most_of_time] = 6
+    categories[final_significant & ~most_of_time & opposite.any(axis=1)] = 7
+    categories[final_significant & ~most_of_time & (2 <= final_runs) & (final_runs == significant_counts)] = 2
+    categories[final_significant & (1 == significant_counts)] = 1
+    categories[final_significant & most_of_time] = 4
+    categories[final_significant & most_of_time & (critical_z_score <= trend_z_scores)] = 3
+    categories[final_significant & most_of_time & (trend_z_scores <= -critical_z_score)] = 5
+    categories[~final_significant & most_of_time] = 8
+    return categories
+
+def classify_emerging_hot_spots(z_scores: np.ndarray, significance_level: float=0.05):
+    """
+    Classifies every location into the emerging hot and cold spot categories using the Gi* z-scores of all time steps.
+    The trend of the z-scores is determined by the Mann-Kendall test.
+
+    :param z_scores:            The Gi* z-scores as array of locations by time steps.
+    :param significance_level:  The significance level of the hot spots and trends.
+    :return:                    The categories and the trend z-scores of every location.
+    """
+    critical_z_score = _critical_z_score(significance_level)
+    hot = critical_z_score <= z_scores
+    cold = z_scores <= -critical_z_score
+    _, trend_z_scores = mann_kendall(z_scores)
+    hot_categories = _classify_spots(hot, cold, trend_z_scores, critical_z_score)
+    cold_categories = -_classify_spots(cold, hot, -trend_z_scores, critical_z_score)
+
+    # spots at the final time step take precedence over historical spots
+    categories = np.where(0 != hot_categories, hot_categories, cold_categories)
+    categories = np.where(cold[:, -1], cold_categories, categories)
+    return categories, trend_z_scores
+
+def emerging_hot_spot_analysis(space_time_cube: HexagonCube, neighborhood_distance: float, neighborhood_time_step: int=1, significance_level: float=0.05) -> pd.DataFrame:
+    """
+    Analyzes the emerging hot and cold spots of the counts in a space time cube.
+
+    :param space_time_cube:         The space time cube.
+    :param neighborhood_distance:   The spatial neighborhood distance in meters.
+    :param neighborhood_time_step:  The number of previous time steps being neighbors.
+    :param significance_level:      The significance level of the hot spots and trends.
+    :return:                        The hexagon centers with their category, pattern name and trend z-score.
+    """
+    neighbors = SpaceTimeNeighbors(space_time_cube, neighborhood_distance, neighborhood_time_step)
+    z_scores = gi_star(space_time_cube, neighbors)
+    categories, trend_z_scores = classify_emerging_hot_spots(z_scores, significance_level)
+    x, y = space_time_cube.hexagon_centers()
+    return pd.DataFrame({"x": x,
+                         "y": y,
+                         "CATEGORY": categories,
+                         "PATTERN": pd.Series(categories).map(PATTERNS).to_numpy(dtype=str),
+                         "TREND_Z": trend_z_scores})
@@ -0,0 +1,232 @@
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from patterns.cube import HexagonCube
+from patterns.weights import SpaceTimeNeighbors
+import time
+
+# cluster and outlier types of the bins
+CLUSTER_TYPES = {0: "Not Significant", 1: "High-High Cluster", 2: "Low-Low Cluster", 3: "High-Low Outlier", 4: "Low-High Outlier"}
+
+# cluster and outlier categories of the locations over all time steps
+PATTERNS = {0: "Never Significant", 1: "Only High-High Cluster", 2: "Only Low-Low Cluster",
+            3: "Only High-Low Outlier", 4: "Only Low-High Outlier", 5: "Multiple Types"}
+
+# maximum number of random keys drawn at once without replacement
+_KEYS_PER_BLOCK = 1 << 22
+
+
+
+class _PermutationSampler(object):
+    """
+    Draws the neighbor values of conditional permutations from all bins of a cube.
+    The values are represented as the number of empty bins followed by the sorted counts of the non-empty bins.
+    """
+
+    def __init__(self, empty_count: int, sorted_counts: np.ndarray, permutations: int) -> None:
+        self._empty_count = empty_count
+        self._sorted_counts = sorted_counts
+        self._permutations = permutations
+
+    def _values(self, positions: np.ndarray) -> np.ndarray:
+        value_positions = np.maximum(positions - self._empty_count, 0)
+        return np.where(positions < self._empty_count, 0, self._sorted_counts[value_positions])
+
+    def sample(self, value: int, neighbor_count: int, seed_sequence: np.random.SeedSequence) -> np.ndarray:
+        """
+        Returns the sorted sums of randomly drawn neighbor values while the bin having the value stays fixed.
+        The neighbors of every permutation are drawn without replacement.
+        """
+        random_generator = np.random.default_rng(seed_sequence)
+        bin_total = self._empty_count + self._sorted_counts.size
+        # one bin having the value is excluded from the draw
+        fixed_position = self._empty_count + np.searchsorted(self._sorted_counts, value) if 0 < value else 0
+        if neighbor_count * neighbor_count <= bin_total:
+            # repeated positions are rare, so the rows containing them are simply drawn again
+            positions = random_generator.integers(0, bin_total - 1, size=(self._permutations, neighbor_count))
+            while True:
+                sorted_positions = np.sort(positions, axis=1)
+                repeated = (sorted_positions[:, 1:] == sorted_positions[:, :-1]).any(axis=1)
+                if not repeated.any():
+                    break
+                positions[repeated] = random_generator.integers(0, bin_total - 1, size=(repeated.sum(), neighbor_count))
+        else:
+            # the neighborhood covers a large part of the cube, the positions having the smallest random keys are drawn
+            rows_per_block = max(1, _KEYS_PER_BLOCK // (bin_total - 1))
+            positions = np.concatenate([np.argpartition(random_generator.random((min(rows_per_block, self._permutations - start), bin_total - 1)),
+                                                        neighbor_count - 1, axis=1)[:, :neighbor_count]
+                                        for start in range(0, self._permutations, rows_per_block)])
+        positions += fixed_position <= positions
+        return np.sort(self._values(positions).sum(axis=1))
+
+    def sample_many(self, values: np.ndarray, neighbor_counts: np.ndarray, seed_sequences: list) -> np.ndarray:
+        return np.stack([self.sample(value, neighbor_count, seed_sequence)
+                         for value, neighbor_count, seed_sequence in zip(values, neighbor_counts, seed_sequences)])
+
+class LocalOutlierAnalysis(object):
+    """
+    Represents a Local Moran's I cluster and outlier analysis of the counts in a space time cube.
+    The neighbors are row standardized and the significance is estimated by conditional permutations.
+    All bins having the same count and neighbor count share their reference distribution,
+    so the permutations are drawn per group of bins instead of per bin.
+    """
+
+    def __init__(self, space_time_cube: HexagonCube, neighborhood_distance: float, neighborhood_time_step: int=1,
+                 permutations: int=499, seed=None, processes: int=1, groups_per_task: int=64) -> None:
+        if permutations < 1:
+            raise ValueError("At least one permutation is required!")
+
+        self._space_time_cube = space_time_cube
+        self._neighbors = SpaceTimeNeighbors(space_time_cube, neighborhood_distance, neighborhood_time_step, include_self=False)
+        self._permutations = permutations
+        self._seed = seed
+        self._processes = processes
+        self._groups_per_task = groups_per_task
+        self._local_i = None
+        self._p_values = None
+        self._cluster_types = None
+        self._runtime = None
+        self._group_count = None
+
+    @property
+    def permutations(self) -> int:
+        return self._permutations
+
+    @property
+    def local_i(self) -> np.ndarray:
+        return self._local_i
+
+    @property
+    def p_values(self) -> np.ndarray:
+        return self._p_values
+
+    @property
+    def cluster_types(self) -> np.ndarray:
+        return self._cluster_types
+
+    @property
+    def runtime(self) -> float:
+        """
+        Returns the seconds the last run took.
+        """
+        return self._runtime
+
+    @property
+    def group_count(self) -> int:
+        """
+        Returns the number of reference distributions the last run has drawn.
+        """
+        return self._group_count
+
+    @property
+    def permutations_per_second(self) -> float:
+        """
+        Returns the number of permutations drawn per second by the last run.
+        """
+        return self._group_count * self._permutations / self._runtime if 0 < self._runtime else float("inf")
+
+    @property
+    def bin_permutations_per_second(self) -> float:
+        """
+        Returns the number of permutations per second a run drawing them for every bin would need to match the last run.
+        """
+        return self._permutations * self._local_i.size / self._runtime if 0 < self._runtime else float("inf")
+
+    def _reference_distributions(self, sampler: _PermutationSampler, values: np.ndarray, neighbor_counts: np.ndarray) -> np.ndarray:
+        seed_sequences = np.random.SeedSequence(self._seed).spawn(values.size)
+        if 1 < self._processes and self._groups_per_task < values.size:
+            task_starts = range(0, values.size, self._groups_per_task)
+            with ProcessPoolExecutor(max_workers=self._processes, initializer=_initialize_worker, initargs=(sampler,)) as executor:
+                sampled_sums = executor.map(_sample_in_worker,
+                                            (values[start:start + self._groups_per_task] for start in task_starts),
+                                            (neighbor_counts[start:start + self._groups_per_task] for start in task_starts),
+                                            (seed_sequences[start:start + self._groups_per_task] for start in task_starts))
+                return np.concatenate(list(sampled_sums))
+
+        return sampler.sample_many(values, neighbor_counts, seed_sequences)
+
+    def run(self, significance_level: float=0.05):
+        """
+        Calculates the local Moran's I, the pseudo p-values and the cluster types of all bins.
+
+        :param float significance_level:    The pseudo p-value below which a bin is significant.
+        """
+        start_time = time.perf_counter()
+        bin_locations, bin_time_steps, bin_counts = self._space_time_cube.bins
+        location_count = self._space_time_cube.location_count
+        time_step_count = self._space_time_cube.time_step_count
+        bin_total = location_count * time_step_count
+        if bin_total < 2:
+            raise ValueError("Local Moran's I requires at least two bins!")
+
+        counts = self._space_time_cube.to_dense()
+        mean = bin_counts.sum() / bin_total
+        deviations = counts - mean
+        squared_deviations = np.square(bin_counts - mean).sum() + (bin_total - bin_counts.size) * mean * mean
+        neighbor_counts = self._neighbors.counts()
+        lag_sums = self._neighbors.lag(bin_locations, bin_time_steps, bin_counts)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            lag_deviations = np.where(0 < neighbor_counts, lag_sums / neighbor_counts - mean, 0.0)
+        self._local_i = (bin_total - 1) * deviations * lag_deviations / squared_deviations if 0 < squared_deviations else np.zeros(counts.shape)
+
+        # every group of bins having the same count and neighbor count is permuted once
+        unique_values = np.unique(np.append(bin_counts, 0))
+        unique_neighbor_counts = np.unique(neighbor_counts)
+        group_indices = (np.searchsorted(unique_values, counts.ravel()) * unique_neighbor_counts.size
+                         + np.searchsorted(unique_neighbor_counts, neighbor_counts).ravel())
+        group_sizes = np.bincount(group_indices, minlength=unique_values.size * unique_neighbor_counts.size)
+        sampled = (0 < group_sizes) & (0 < np.tile(unique_neighbor_counts, unique_values.size))
+        self._group_count = int(sampled.sum())
+        sampler = _PermutationSampler(bin_total - bin_counts.size, np.sort(bin_counts), self._permutations)
+        sampled_sums = np.zeros((group_sizes.size, self._permutations), dtype=np.int64)
+        if sampled.any():
+            sampled_sums[sampled] = self._reference_distributions(sampler,
+                                                                  np.repeat(unique_values, unique_neighbor_counts.size)[sampled],
+                                                                  np.tile(unique_neighbor_counts, unique_values.size)[sampled])
+
+        # pseudo p-values of the folded reference distributions, the integer sums of all groups are searched at once
+        sum_range = int(max(sampled_sums.max(), lag_sums.max())) + 1
+        group_offsets = np.arange(group_sizes.size, dtype=np.int64)[:, np.newaxis] * sum_range
+        group_ends = (np.arange(group_sizes.size) + 1) * self._permutations
+        observed_keys = group_indices * sum_range + np.rint(lag_sums.ravel()).astype(np.int64)
+        larger_counts = group_ends[group_indices] - np.searchsorted((sampled_sums + group_offsets).ravel(), observed_keys)
+        larger_counts = np.minimum(larger_counts, self._permutations - larger_counts)
+        p_values = (larger_counts + 1) / (self._permutations + 1)
+        p_values[0 == neighbor_counts.ravel()] = 1.0
+        self._p_values = p_values.reshape(counts.shape)
+
+        significant = self._p_values < significance_level
+        high, high_neighbors = 0 < deviations, 0 < lag_deviations
+        cluster_types = np.zeros(counts.shape, dtype=np.int64)
+        cluster_types[significant & high & high_neighbors] = 1
+        cluster_types[significant & ~high & ~high_neighbors] = 2
+        cluster_types[significant & high & ~high_neighbors] = 3
+        cluster_types[significant & ~high & high_neighbors] = 4
+        self._cluster_types = cluster_types
+        self._runtime = time.perf_counter() - start_time
+        return self
+
+    def to_df(self) -> pd.DataFrame:
+        """
+        Returns the hexagon centers with the category of their cluster and outlier types over all time steps.
+        """
+        if None is self._cluster_types:
+            raise ValueError("The analysis did not run!")
+
+        type_counts = np.stack([(self._cluster_types == cluster_type).sum(axis=1) for cluster_type in range(1, 5)], axis=1)
+        type_total = (0 < type_counts).sum(axis=1)
+        categories = np.where(1 < type_total, 5, np.where(1 == type_total, np.argmax(0 < type_counts, axis=1) + 1, 0))
+        x, y = self._space_time_cube.hexagon_centers()
+        return pd.DataFrame({"x": x,
+                             "y": y,
+                             "CATEGORY": categories,
+                             "PATTERN": pd.Series(categories).map(PATTERNS).to_numpy(dtype=str)})
+
+
+
+def _initialize_worker(sampler: _PermutationSampler):
+    global _worker_sampler
+    _worker_sampler = sampler
+
+def _sample_in_worker(values: np.ndarray, neighbor_counts: np.ndarray, seed_sequences: list) -> np.ndarray:
+    return _worker_sampler.sample_many(values, neighbor_counts, seed_sequences)
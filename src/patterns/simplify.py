@@ -0,0 +1,160 @@
+import logging
+import numpy as np
+import pandas as pd
+
+
+
+def _trip_order(trip, trip_time) -> np.ndarray:
+    # None if the points are already sorted by trip and trip time
+    trip_steps = np.diff(trip)
+    same_trip = 0 == trip_steps
+    if not (trip_steps < 0).any() and not (trip_time[1:][same_trip] < trip_time[:-1][same_trip]).any():
+        return None
+    return np.lexsort((trip_time, trip))
+
+def _segment_distances(x, y, points, starts, ends) -> np.ndarray:
+    """
+    Returns the distances of the points to the segments between the start and end points.
+    """
+    segment_x = x[ends] - x[starts]
+    segment_y = y[ends] - y[starts]
+    segment_length = segment_x * segment_x + segment_y * segment_y
+    point_x = x[points] - x[starts]
+    point_y = y[points] - y[starts]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # degenerated segments use the distance to the start point
+        projection = np.where(0 < segment_length, (point_x * segment_x + point_y * segment_y) / segment_length, 0.0)
+    projection = np.clip(projection, 0.0, 1.0)
+    return np.hypot(point_x - projection * segment_x, point_y - projection * segment_y)
+
+def douglas_peucker(trip, x, y, tolerance: float):
+    """
+    Simplifies all trips at once using the Douglas-Peucker algorithm.
+    Every iteration splits all open segments of all trips at their farthest point,
+    so the number of iterations only depends on the depth of the deepest split.
+    The points must be sorted by trip and trip time.
+
+    :param trip:                The trip identifiers.
+    :param x:                   The projected x coordinates in meters.
+    :param y:                   The projected y coordinates in meters.
+    :param float tolerance:     The maximum distance of a dropped point to the simplified trip in meters.
+    :return:                    The mask of the kept points and the maximum distance of a dropped point.
+    """
+    if tolerance < 0:
+        raise ValueError("The tolerance must not be negative!")
+
+    trip = np.asarray(trip)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    point_count = trip.shape[0]
+    keep = np.zeros(point_count, dtype=bool)
+    if 0 == point_count:
+        return keep, 0.0
+
+    # the trip starts and ends are always kept
+    trip_starts = np.flatnonzero(np.concatenate(([True], trip[1:] != trip[:-1])))
+    trip_ends = np.append(trip_starts[1:], point_count) - 1
+    keep[trip_starts] = True
+    keep[trip_ends] = True
+
+    max_deviation = 0.0
+    starts, ends = trip_starts, trip_ends
+    while True:
+        open_segments = 1 < ends - starts
+        starts, ends = starts[open_segments], ends[open_segments]
+        if 0 == starts.size:
+            return keep, max_deviation
+
+        # the inner points of all open segments as one flat array
+        inner_counts = ends - starts - 1
+        segment_offsets = np.concatenate(([0], np.cumsum(inner_counts)[:-1]))
+        segments = np.repeat(np.arange(starts.size), inner_counts)
+        points = np.arange(segments.size) - segment_offsets[segments] + starts[segments] + 1
+        distances = _segment_distances(x, y, points, starts[segments], ends[segments])
+
+        max_distances = np.maximum.reduceat(distances, segment_offsets)
+        split = tolerance < max_distances
+        if (~split).any():
+            max_deviation = max(max_deviation, float(max_distances[~split].max()))
+
+        # the first farthest point of every segment being split
+        farthest = distances == max_distances[segments]
+        farthest &= split[segments]
+        farthest_segments, first_farthest = np.unique(segments[farthest], return_index=True)
+        split_points = points[np.flatnonzero(farthest)[first_farthest]]
+        keep[split_points] = True
+        starts = np.concatenate((starts[farthest_segments], split_points))
+        ends = np.concatenate((split_points, ends[farthest_segments]))
+
+def downsample(agent, trip_time, time_interval: int, time_origin=None) -> np.ndarray:
+    """
+    Keeps the first point of every agent in every time step.
+    The time steps start at the same origin as the space time cube.
+
+    :param agent:               The agent identifiers e.g. the persons or trips.
+    :param trip_time:           The point times.
+    :param int time_interval:   The time step interval in minutes.
+    :param time_origin:         The start of the first time step, by default the minute of the first point.
+    :return:                    The mask of the kept points.
+    """
+    if time_interval < 1:
+        raise ValueError("The time interval must be positive!")
+
+    agent = np.asarray(agent)
+    trip_time = pd.to_datetime(pd.Series(trip_time)).to_numpy(dtype="datetime64[s]")
+    keep = np.zeros(agent.shape[0], dtype=bool)
+    if 0 == agent.shape[0]:
+        return keep
+
+    if None is time_origin:
+        time_origin = trip_time.min().astype("datetime64[m]")
+    time_steps = (trip_time - np.datetime64(time_origin, "s")) // np.timedelta64(time_interval, "m")
+    order = np.lexsort((trip_time, time_steps, agent))
+    sorted_agent = agent[order]
+    sorted_time_steps = time_steps[order]
+    first_points = np.concatenate(([True], (sorted_agent[1:] != sorted_agent[:-1]) | (sorted_time_steps[1:] != sorted_time_steps[:-1])))
+    keep[order[first_points]] = True
+    return keep
+
+def simplify_trips(trip, x, y, trip_time, tolerance: float=None, time_interval: int=None, agent=None, time_origin=None):
+    """
+    Reduces the points of the trips before the space time cube is created.
+    The trips are simplified using Douglas-Peucker and afterwards downsampled to at most one point per agent and time step.
+    The points do not need to be sorted, the returned mask has the order of the input points.
+
+    :param trip:                The trip identifiers.
+    :param x:                   The projected x coordinates in meters.
+    :param y:                   The projected y coordinates in meters.
+    :param trip_time:           The point times.
+    :param float tolerance:     The Douglas-Peucker tolerance in meters, no simplification if None.
+    :param int time_interval:   The time step interval in minutes, no downsampling if None.
+    :param agent:               The agent identifiers e.g. the persons, by default the trips.
+    :param time_origin:         The start of the first time step.
+    :return:                    The mask of the kept points and the report of the dropped rows.
+    """
+    trip = np.asarray(trip)
+    trip_time = pd.to_datetime(pd.Series(trip_time)).to_numpy(dtype="datetime64[ns]")
+    point_count = trip.shape[0]
+    keep = np.ones(point_count, dtype=bool)
+    report = {"input_rows": point_count, "simplified_rows": 0, "downsampled_rows": 0, "max_deviation": 0.0}
+
+    if None is not tolerance:
+        order = _trip_order(trip, trip_time)
+        if None is order:
+            keep, report["max_deviation"] = douglas_peucker(trip, x, y, tolerance)
+        else:
+            sorted_keep, report["max_deviation"] = douglas_peucker(trip[order], np.asarray(x)[order], np.asarray(y)[order], tolerance)
+            keep[order] = sorted_keep
+        report["simplified_rows"] = point_count - int(keep.sum())
+
+    if None is not time_interval:
+        agent = trip if None is agent else np.asarray(agent)
+        kept_points = np.flatnonzero(keep)
+        keep[kept_points] = downsample(agent[kept_points], trip_time[kept_points], time_interval, time_origin)
+        report["downsampled_rows"] = point_count - report["simplified_rows"] - int(keep.sum())
+
+    report["output_rows"] = int(keep.sum())
+    report["dropped_ratio"] = 1.0 - report["output_rows"] / point_count if 0 < point_count else 0.0
+    logging.getLogger("codecarbon").info(f"Simplifying dropped {report['simplified_rows']} rows, downsampling dropped {report['downsampled_rows']} rows, "
+                                         f"{report['output_rows']} of {point_count} rows remain.")
+    return keep, report
@@ -1,29 +1,73 @@
 import arcpy
+import logging
 import os
+from patterns.cube import HexagonCube
+from patterns.density import calculate_density
+from patterns.hotspots import emerging_hot_spot_analysis
+from patterns.outliers import LocalOutlierAnalysis
+from patterns.simplify import simplify_trips
+from spatialcarbon.tracing import span
 from sys import argv
 
 class SpaceTimeCube(object):
     
     def create_space_time_cube(self, feature_class: str, space_time_cube_path: str, time_interval: int, distance_interval: int):
-        geodatabase_feature_class = arcpy.ExportFeatures_conversion(feature_class, "trafficFeatureClass")
+        with span("patterns.export"):
+            geodatabase_feature_class = arcpy.ExportFeatures_conversion(feature_class, "trafficFeatureClass")
 
-        projected_feature_class = arcpy.Project_management(in_dataset = geodatabase_feature_class,
-                                                           out_dataset = f"{geodatabase_feature_class}_projected_25832",
-                                                           out_coor_system = arcpy.SpatialReference(25832))
+        with span("patterns.project"):
+            projected_feature_class = arcpy.Project_management(in_dataset = geodatabase_feature_class,
+                                                               out_dataset = f"{geodatabase_feature_class}_projected_25832",
+                                                               out_coor_system = arcpy.SpatialReference(25832))
 
         # Always convert to an absolute path
         # otherwise relative paths can cause an "ERROR 000210: Cannot create output <value>."
         space_time_cube_filepath = os.path.abspath(os.path.join(space_time_cube_path, "SpaceTimeTrafficCube.nc"))
 
-        space_time_cube = arcpy.CreateSpaceTimeCube_stpm(projected_feature_class, 
-                                       output_cube = space_time_cube_filepath, 
-                                       time_field ="trip_time",
-                                       time_step_interval = f"{time_interval} Minutes",
-                                       distance_interval =  f"{distance_interval} Meters",
-                                       aggregation_shape_type="HEXAGON_GRID")
+        with span("patterns.create_cube"):
+            space_time_cube = arcpy.CreateSpaceTimeCube_stpm(projected_feature_class, 
+                                           output_cube = space_time_cube_filepath, 
+                                           time_field ="trip_time",
+                                           time_step_interval = f"{time_interval} Minutes",
+                                           distance_interval =  f"{distance_interval} Meters",
+                                           aggregation_shape_type="HEXAGON_GRID")
 
         return space_time_cube
 
+    def read_projected_traffic(self, feature_class: str, field_names=("trip_time",)):
+        # Projects the shapes while reading, no intermediate feature classes are needed
+        with span("patterns.read") as read_span:
+            traffic_array = arcpy.da.FeatureClassToNumPyArray(feature_class,
+                                                              ["SHAPE@X", "SHAPE@Y"] + list(field_names),
+                                                              spatial_reference=arcpy.SpatialReference(25832))
+            read_span.add_rows(traffic_array.shape[0])
+        return traffic_array
+
+    def simplify_traffic(self, traffic_array, time_interval: int, tolerance: float=None, downsample: bool=False, time_origin=None):
+        # Drops the redundant points before they are binned, the time steps must start at the origin of an existing cube
+        with span("patterns.simplify", traffic_array.shape[0]):
+            keep, report = simplify_trips(traffic_array["trip"],
+                                          traffic_array["SHAPE@X"],
+                                          traffic_array["SHAPE@Y"],
+                                          traffic_array["trip_time"],
+                                          tolerance=tolerance,
+                                          time_interval=time_interval if downsample else None,
+                                          agent=traffic_array["person"],
+                                          time_origin=time_origin)
+        return traffic_array[keep], report
+
+    def create_hexagon_cube(self, traffic_array, space_time_cube_path: str, time_interval: int, distance_interval: int, space_time_cube: HexagonCube=None):
+        if None is space_time_cube:
+            space_time_cube = HexagonCube(distance_interval, time_interval)
+        elif space_time_cube.distance_interval != distance_interval or space_time_cube.time_interval != time_interval:
+            raise ValueError("The intervals do not match the existing space time cube!")
+
+        with span("patterns.hexagon_cube", traffic_array.shape[0]):
+            space_time_cube.append(traffic_array["SHAPE@X"], traffic_array["SHAPE@Y"], traffic_array["trip_time"])
+            space_time_cube_filepath = os.path.abspath(os.path.join(space_time_cube_path, "SpaceTimeTrafficCube.npz"))
+            space_time_cube.save(space_time_cube_filepath)
+        return space_time_cube
+
     def visualize_space_time_cube(self, space_time_cube_path:str):
 
         arcpy.VisualizeSpaceTimeCube3D_stpm(in_cube = space_time_cube_path,
@@ -36,16 +80,62 @@ class HotColdSpotsTool(object):
 
     def create_hot_cold_spots_space_time(self, space_time_cube_path: str, distance_interval: int):
     
-        arcpy.stpm.EmergingHotSpotAnalysis(in_cube = space_time_cube_path,
-                                           analysis_variable = "COUNT",
-                                           output_features = "SpaceTimeCube_EmergingHotSpotAnalysis",
-                                           neighborhood_distance =  f"{distance_interval} Meters")
-
-        arcpy.stpm.LocalOutlierAnalysis(in_cube = space_time_cube_path,
-                                        analysis_variable = "COUNT",
-                                        output_features = "SpaceTimeCube_LocalOutlierAnalysis",
-                                        neighborhood_distance =  f"{distance_interval} Meters")
+        with span("patterns.emerging_hot_spots"):
+            arcpy.stpm.EmergingHotSpotAnalysis(in_cube = space_time_cube_path,
+                                               analysis_variable = "COUNT",
+                                               output_features = "SpaceTimeCube_EmergingHotSpotAnalysis",
+                                               neighborhood_distance =  f"{distance_interval} Meters")
+
+        with span("patterns.local_outliers"):
+            arcpy.stpm.LocalOutlierAnalysis(in_cube = space_time_cube_path,
+                                            analysis_variable = "COUNT",
+                                            output_features = "SpaceTimeCube_LocalOutlierAnalysis",
+                                            neighborhood_distance =  f"{distance_interval} Meters")
         
+    def create_hot_cold_spots_cube(self, space_time_cube: HexagonCube, distance_interval: int, permutations: int=499, processes: int=1):
+        # Classifies the hexagon centers using the native space time cube
+        spatial_reference = arcpy.SpatialReference(space_time_cube.spatial_reference)
+        with span("patterns.emerging_hot_spots"):
+            emerging_hot_spots_df = emerging_hot_spot_analysis(space_time_cube, neighborhood_distance=distance_interval)
+            arcpy.da.NumPyArrayToFeatureClass(emerging_hot_spots_df.to_records(index=False),
+                                              "SpaceTimeCube_EmergingHotSpotAnalysis",
+                                              ("x", "y"),
+                                              spatial_reference)
+
+        with span("patterns.local_outliers"):
+            local_outlier_analysis = LocalOutlierAnalysis(space_time_cube,
+                                                          neighborhood_distance=distance_interval,
+                                                          permutations=permutations,
+                                                          processes=processes).run()
+            logging.getLogger("codecarbon").info(f"Local outlier analysis took {local_outlier_analysis.runtime:.2f} seconds "
+                                                 f"drawing {local_outlier_analysis.permutations_per_second:.0f} permutations/sec.")
+            local_outliers_df = local_outlier_analysis.to_df()
+            arcpy.da.NumPyArrayToFeatureClass(local_outliers_df.to_records(index=False),
+                                              "SpaceTimeCube_LocalOutlierAnalysis",
+                                              ("x", "y"),
+                                              spatial_reference)
+        return emerging_hot_spots_df, local_outliers_df
+
+    def create_density_rasters(self, traffic_array, density_path: str, distance_interval: int, time_interval: int, save_rasters: bool=False):
+        # Uniform kernel density per time step with the same neighborhood as CalculateDensity
+        with span("patterns.density", traffic_array.shape[0]):
+            density_stack = calculate_density(traffic_array["SHAPE@X"],
+                                              traffic_array["SHAPE@Y"],
+                                              traffic_array["trip_time"],
+                                              bin_size=distance_interval,
+                                              time_interval=time_interval,
+                                              neighborhood_size=distance_interval * 1.5)
+            density_stack.save(os.path.abspath(os.path.join(density_path, "CalculateDensity.npz")))
+            if save_rasters:
+                lower_left_corner = arcpy.Point(density_stack.origin_x, density_stack.origin_y)
+                for time_step, densities in enumerate(density_stack.densities):
+                    # Raster rows start at the top
+                    density_raster = arcpy.NumPyArrayToRaster(densities[::-1], lower_left_corner, density_stack.bin_size, density_stack.bin_size)
+                    arcpy.management.DefineProjection(density_raster, arcpy.SpatialReference(25832))
+                    density_raster.save(f"CalculateDensity_{time_step}")
+
+        return density_stack
+
     def create_hot_cold_spots_feature_class(self, feature_class: str, distance_interval: int, time_interval: int):
 
         arcpy.CalculateDensity_gapro(input_layer = feature_class,
@@ -66,7 +156,10 @@ class HotColdSpotsTool(object):
     
 class PatternsTool(object):
 # ToDO: config.user muss space_time_cube_path, time_interval, distance_interval enthalten 
-    def run(self, feature_class, workspace_dir, time_interval=1, distance_interval=200):
+    def run(self, feature_class, workspace_dir, time_interval=1, distance_interval=200, engine="arcpy", space_time_cube=None, permutations=499, processes=1, tolerance=None, downsample=False):
+        if not engine in ["arcpy", "numpy"]:
+            raise ValueError(f"Engine {engine} is not supported!")
+
         arcpy.env.overwriteOutput = True
         gdb_workspace = f"{workspace_dir}/traffic.gdb"
         if not arcpy.Exists(gdb_workspace):
@@ -75,6 +168,32 @@ class PatternsTool(object):
         else:
             arcpy.env.workspace = gdb_workspace
 
+        if "numpy" == engine:
+            # Appends the features to an existing native cube
+            space_time_cube_tool = SpaceTimeCube()
+            if None is tolerance and not downsample:
+                traffic_array = space_time_cube_tool.read_projected_traffic(feature_class)
+            else:
+                traffic_array = space_time_cube_tool.read_projected_traffic(feature_class, ("trip_time", "trip", "person"))
+                time_origin = None if None is space_time_cube else space_time_cube.time_origin
+                traffic_array, _ = space_time_cube_tool.simplify_traffic(traffic_array, time_interval, tolerance, downsample, time_origin)
+            space_time_cube = space_time_cube_tool.create_hexagon_cube(traffic_array,
+                                                                       workspace_dir,
+                                                                       time_interval,
+                                                                       distance_interval,
+                                                                       space_time_cube)
+
+            hot_cold_spots_tool = HotColdSpotsTool()
+            hot_cold_spots_tool.create_hot_cold_spots_cube(space_time_cube,
+                                                           distance_interval,
+                                                           permutations,
+                                                           processes)
+            hot_cold_spots_tool.create_density_rasters(traffic_array,
+                                                       workspace_dir,
+                                                       distance_interval,
+                                                       time_interval)
+            return space_time_cube
+
         # SpaceTimeCube Tool
         space_time_cube_tool = SpaceTimeCube()
         space_time_cube = space_time_cube_tool.create_space_time_cube(feature_class,
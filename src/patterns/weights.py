@@ -0,0 +1,95 @@
+import numpy as np
+from patterns.cube import HexagonCube
+
+
+
+class SpaceTimeNeighbors(object):
+    """
+    Represents the binary space time neighborhood of the hexagon locations from a space time cube.
+    Two locations are spatial neighbors if the distance between their hexagon centers is within the neighborhood distance.
+    A bin is a neighbor of all bins at neighboring locations having the same or one of the following neighborhood time steps.
+    The spatial neighbors are precomputed as sparse compressed rows using the hexagon lattice offsets.
+    """
+
+    def __init__(self, space_time_cube: HexagonCube, neighborhood_distance: float, neighborhood_time_step: int=1, include_self: bool=True) -> None:
+        if neighborhood_distance < 0 or neighborhood_time_step < 0:
+            raise ValueError("The neighborhood must not be negative!")
+
+        self._space_time_cube = space_time_cube
+        self._neighborhood_time_step = int(neighborhood_time_step)
+        self._include_self = include_self
+
+        # all lattice offsets whose hexagon centers are within the neighborhood distance
+        ring_count = int(np.floor(neighborhood_distance / space_time_cube.distance_interval))
+        offset_q, offset_r = np.meshgrid(np.arange(-ring_count, ring_count + 1), np.arange(-ring_count, ring_count + 1), indexing="ij")
+        offset_q, offset_r = offset_q.ravel(), offset_r.ravel()
+        center_distances = space_time_cube.distance_interval * np.sqrt(offset_q * offset_q + offset_q * offset_r + offset_r * offset_r)
+        within = center_distances <= neighborhood_distance + 1e-9
+        offset_q, offset_r = offset_q[within], offset_r[within]
+
+        q, r = space_time_cube.hexagon_coordinates()
+        neighbor_locations = space_time_cube.find_locations(q[:, np.newaxis] + offset_q, r[:, np.newaxis] + offset_r)
+        valid = 0 <= neighbor_locations
+        self._offsets = np.concatenate(([0], np.cumsum(valid.sum(axis=1))))
+        self._locations = neighbor_locations[valid]
+
+    @property
+    def neighborhood_time_step(self) -> int:
+        return self._neighborhood_time_step
+
+    @property
+    def include_self(self) -> bool:
+        return self._include_self
+
+    def neighbors(self, location: int) -> np.ndarray:
+        """
+        Returns the spatial neighbors of a location including the location itself.
+        """
+        return self._locations[self._offsets[location]:self._offsets[location + 1]]
+
+    def counts(self) -> np.ndarray:
+        """
+        Returns the number of space time neighbors for every bin as dense array of locations by time steps.
+        """
+        time_step_count = self._space_time_cube.time_step_count
+        spatial_counts = np.diff(self._offsets)
+        temporal_counts = np.minimum(np.arange(time_step_count), self._neighborhood_time_step) + 1
+        neighbor_counts = np.outer(spatial_counts, temporal_counts)
+        if not self._include_self:
+            neighbor_counts -= 1
+        return neighbor_counts
+
+    def lag(self, bin_locations: np.ndarray, bin_time_steps: np.ndarray, bin_values: np.ndarray, block_size: int=250000) -> np.ndarray:
+        """
+        Returns the sums of the neighboring values for every bin as dense array of locations by time steps.
+        Only the given bins are scattered to their neighbors, all other bins are treated as zero.
+        The runtime scales linearly with the number of given bins.
+        """
+        location_count = self._space_time_cube.location_count
+        time_step_count = self._space_time_cube.time_step_count
+        spatial_counts = np.diff(self._offsets)
+        time_offsets = np.arange(self._neighborhood_time_step + 1)
+        lag_sums = np.zeros(location_count * time_step_count, dtype=np.float64)
+        for start in range(0, len(bin_locations), block_size):
+            block_locations = np.asarray(bin_locations[start:start + block_size], dtype=np.int64)
+            block_time_steps = np.asarray(bin_time_steps[start:start + block_size], dtype=np.int64)
+            block_values = np.asarray(bin_values[start:start + block_size], dtype=np.float64)
+
+            # expands every bin to its spatial neighbors
+            repeats = spatial_counts[block_locations]
+            bin_indices = np.repeat(np.arange(block_locations.size), repeats)
+            neighbor_starts = np.repeat(self._offsets[block_locations] - np.cumsum(repeats) + repeats, repeats)
+            target_locations = self._locations[neighbor_starts + np.arange(bin_indices.size)]
+
+            # expands every spatial neighbor to the following time steps
+            target_time_steps = (block_time_steps[bin_indices][:, np.newaxis] + time_offsets).ravel()
+            source_indices = np.repeat(bin_indices, time_offsets.size)
+            target_locations = np.repeat(target_locations, time_offsets.size)
+            valid = target_time_steps < time_step_count
+            if not self._include_self:
+                valid &= (target_locations != block_locations[source_indices]) | (target_time_steps != block_time_steps[source_indices])
+
+            lag_sums += np.bincount(target_locations[valid] * time_step_count + target_time_steps[valid],
+                                    weights=block_values[source_indices[valid]],
+                                    minlength=lag_sums.size)
+        return lag_sums.reshape(location_count, time_step_count)
@@ -0,0 +1,240 @@
+import hashlib
+import logging
+import os
+import pandas as pd
+import pickle
+from spatialcarbon.tracing import span
+import time
+from traffic.cache import TrafficCache, file_digest
+
+_PIPELINE_VERSION = 1
+_ARTIFACT_SUFFIX = ".pickle"
+
+
+
+class Stage(object):
+    """
+    Represents one step of a pipeline.
+    The function is called with the outputs of the input stages as positional arguments and the parameters as keyword arguments.
+    The source parameters name input files, their content hash is part of the stage key instead of their path.
+    """
+
+    def __init__(self, name: str, function, inputs=(), parameters: dict=None, sources=(), cache: bool=True) -> None:
+        self._name = name
+        self._function = function
+        self._inputs = tuple(inputs)
+        self._parameters = dict() if None is parameters else dict(parameters)
+        self._sources = tuple(sources)
+        self._cache = cache
+        for source in self._sources:
+            if not source in self._parameters:
+                raise ValueError(f"The source {source} is not a parameter of stage {name}!")
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def function(self):
+        return self._function
+
+    @property
+    def inputs(self):
+        return self._inputs
+
+    @property
+    def parameters(self):
+        return self._parameters
+
+    @property
+    def sources(self):
+        return self._sources
+
+    @property
+    def cache(self):
+        return self._cache
+
+    def create_key(self, input_keys, parameters: dict) -> str:
+        """
+        Returns the key of the stage output.
+        The key chains the keys of the input stages, so that changing a stage invalidates all of its descendants.
+
+        :param input_keys:          The keys of the input stages.
+        :param dict parameters:     The effective parameters of this run.
+        """
+        source_digests = tuple(file_digest(parameters[source]) for source in self._sources)
+        stable_parameters = tuple((name, value) for name, value in sorted(parameters.items()) if not name in self._sources)
+        key_hash = hashlib.sha256(repr((_PIPELINE_VERSION, self._name, tuple(input_keys), stable_parameters, source_digests)).encode("utf8"))
+        return key_hash.hexdigest()
+
+
+class Pipeline(object):
+    """
+    Represents a directed acyclic graph of stages e.g. read, measure and patterns.
+    The stage outputs are handed over in main memory and stored as artifacts.
+    Every stage whose inputs and parameters match a stored artifact is skipped,
+    a stage whose descendants are all skipped is not even loaded.
+    Dataframes are stored using the traffic cache, all other outputs are pickled.
+    """
+
+    def __init__(self, artifact_dir: str=None, max_bytes: int=8 * 1024 ** 3) -> None:
+        self._stages = dict()
+        self._artifact_dir = artifact_dir
+        self._table_cache = None
+        if None is not artifact_dir:
+            self._table_cache = TrafficCache(artifact_dir, max_bytes)
+        self._report = []
+
+    @property
+    def stages(self):
+        return list(self._stages.values())
+
+    @property
+    def artifact_dir(self):
+        return self._artifact_dir
+
+    def add_stage(self, name: str, function, inputs=(), parameters: dict=None, sources=(), cache: bool=True):
+        """
+        Adds a stage whose input stages were already added and returns the pipeline.
+
+        :param str name:            The unique stage name.
+        :param function:            The function creating the stage output.
+        :param inputs:              The names of the input stages.
+        :param dict parameters:     The default keyword arguments of the function.
+        :param sources:             The parameter names referencing input files.
+        :param bool cache:          Stores the output as artifact.
+        """
+        if name in self._stages:
+            raise ValueError(f"The stage {name} already exists!")
+        for input_name in inputs:
+            if not input_name in self._stages:
+                raise ValueError(f"The input stage {input_name} of stage {name} does not exist!")
+
+        self._stages[name] = Stage(name, function, inputs, parameters, sources, cache)
+        return self
+
+    def _upstream(self, targets):
+        # stages are added after their inputs, so insertion order is a topological order
+        required = set()
+        pending = list(targets)
+        while 0 < len(pending):
+            name = pending.pop()
+            if not name in self._stages:
+                raise ValueError(f"The stage {name} does not exist!")
+            if not name in required:
+                required.add(name)
+                pending.extend(self._stages[name].inputs)
+        return [name for name in self._stages if name in required]
+
+    def _artifact_path(self, key: str) -> str:
+        return os.path.join(self._artifact_dir, f"{key}{_ARTIFACT_SUFFIX}")
+
+    def _load_artifact(self, key: str):
+        # returns a tuple, so that None can be a valid stage output
+        if None is self._artifact_dir:
+            return None
+
+        table = self._table_cache.load(key)
+        if None is not table:
+            return (table,)
+
+        artifact_path = self._artifact_path(key)
+        if not os.path.exists(artifact_path):
+            return None
+
+        with open(artifact_path, "rb") as in_stream:
+            return (pickle.load(in_stream),)
+
+    def _store_artifact(self, key: str, output) -> None:
+        if isinstance(output, pd.DataFrame):
+            self._table_cache.store(key, output)
+            return
+
+        artifact_path = self._artifact_path(key)
+        temp_path = f"{artifact_path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as out_stream:
+            pickle.dump(output, out_stream, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, artifact_path)
+
+    def run(self, targets=None, parameters: dict=None, force=()) -> dict:
+        """
+        Runs all stages being required by the targets and returns the outputs of the targets.
+
+        :param targets:             The stage names whose outputs are returned, by default the stages without descendants.
+        :param dict parameters:     The parameters overriding the defaults by stage name e.g. {"hot_spots": {"distance_interval": 100}}.
+        :param force:               The stage names being executed even if an artifact exists.
+        """
+        if None is parameters:
+            parameters = dict()
+        if None is targets:
+            input_names = set(input_name for stage in self._stages.values() for input_name in stage.inputs)
+            targets = [name for name in self._stages if not name in input_names]
+        for name in parameters:
+            if not name in self._stages:
+                raise ValueError(f"The stage {name} does not exist!")
+
+        # keys only depend on the keys of the inputs, no stage must be executed for creating them
+        required = self._upstream(targets)
+        effective_parameters = dict()
+        keys = dict()
+        for name in required:
+            stage = self._stages[name]
+            effective_parameters[name] = {**stage.parameters, **parameters.get(name, dict())}
+            keys[name] = stage.create_key([keys[input_name] for input_name in stage.inputs], effective_parameters[name])
+
+        # walks backwards and only requests the outputs of stages which must be executed
+        # the artifacts are loaded right away, so that storing new artifacts cannot evict them
+        needed = set(targets)
+        outputs = dict()
+        durations = dict()
+        for name in reversed(required):
+            stage = self._stages[name]
+            if not name in needed:
+                continue
+
+            start_time = time.perf_counter()
+            artifact = None
+            if not name in force and stage.cache:
+                artifact = self._load_artifact(keys[name])
+            if None is artifact:
+                needed.update(stage.inputs)
+            else:
+                outputs[name] = artifact[0]
+                durations[name] = time.perf_counter() - start_time
+
+        self._report = []
+        logger = logging.getLogger("codecarbon")
+        for position, name in enumerate(required):
+            stage = self._stages[name]
+            if not name in needed:
+                self._report.append((name, keys[name], "skipped", 0.0))
+                continue
+
+            if name in durations:
+                status = "cached"
+                duration = durations[name]
+            else:
+                start_time = time.perf_counter()
+                with span(f"pipeline.{name}"):
+                    input_outputs = [outputs[input_name] for input_name in stage.inputs]
+                    outputs[name] = stage.function(*input_outputs, **effective_parameters[name])
+                    if stage.cache and None is not self._artifact_dir:
+                        self._store_artifact(keys[name], outputs[name])
+                status = "executed"
+                duration = time.perf_counter() - start_time
+            logger.info(f"Stage {name} {status} in {duration:.2f} seconds.")
+            self._report.append((name, keys[name], status, duration))
+
+            # releases the inputs as soon as no pending stage needs them
+            pending = [other for other in required[position + 1:] if other in needed and not other in durations]
+            for input_name in stage.inputs:
+                if not input_name in targets and all(not input_name in self._stages[other].inputs for other in pending):
+                    outputs.pop(input_name, None)
+
+        return {name: outputs[name] for name in targets}
+
+    def report(self) -> pd.DataFrame:
+        """
+        Returns the stages of the last run with their key, status and duration in seconds.
+        """
+        return pd.DataFrame(self._report, columns=["stage", "key", "status", "duration"])
@@ -0,0 +1,120 @@
+from measure.trips import TripTable
+from measure.vectorized import measure_segments, parse_trip_time
+import pandas as pd
+from patterns.cube import HexagonCube
+from patterns.density import calculate_density
+from patterns.hotspots import emerging_hot_spot_analysis
+from patterns.outliers import LocalOutlierAnalysis
+from patterns.simplify import simplify_trips
+from pipeline.graph import Pipeline
+from relate.flows import GridZones, ODMatrix, origin_destination_matrix
+from traffic.read import read_sqlite_as_df
+
+
+
+def read_stage(db_filepath: str, select_statement: str="SELECT * FROM agent_pos;", epsg: int=25832) -> pd.DataFrame:
+    """
+    Reads the traffic table and adds the projected x and y columns.
+    """
+    return read_sqlite_as_df(db_filepath, select_statement, epsg=epsg)
+
+def measure_stage(traffic_df: pd.DataFrame, shift_hours: int=-1) -> pd.DataFrame:
+    """
+    Parses the trip times and adds direction, distance and speed like the measure tool does.
+    """
+    traffic_df = traffic_df.copy()
+    traffic_df["trip_time"] = parse_trip_time(traffic_df["trip_time"], shift_hours=shift_hours)
+    traffic_df.sort_values(by=["trip", "trip_time"], kind="stable", inplace=True, ignore_index=True)
+    traffic_df["point_direction"], traffic_df["point_distance"], traffic_df["speed"] = measure_segments(traffic_df["trip"],
+                                                                                                        traffic_df["longitude"],
+                                                                                                        traffic_df["latitude"],
+                                                                                                        traffic_df["trip_time"])
+    return traffic_df
+
+def simplify_stage(traffic_df: pd.DataFrame, tolerance: float=None, time_interval: int=None) -> pd.DataFrame:
+    """
+    Simplifies the trips and downsamples them to one point per person and time step.
+    """
+    keep, _ = simplify_trips(traffic_df["trip"].to_numpy(),
+                             traffic_df["x"].to_numpy(),
+                             traffic_df["y"].to_numpy(),
+                             traffic_df["trip_time"].to_numpy(),
+                             tolerance=tolerance,
+                             time_interval=time_interval,
+                             agent=traffic_df["person"].to_numpy())
+    return traffic_df[keep].reset_index(drop=True)
+
+def cube_stage(traffic_df: pd.DataFrame, time_interval: int=1, distance_interval: int=200) -> HexagonCube:
+    """
+    Aggregates the projected points into a hexagon space time cube.
+    """
+    space_time_cube = HexagonCube(distance_interval, time_interval)
+    space_time_cube.append(traffic_df["x"].to_numpy(), traffic_df["y"].to_numpy(), traffic_df["trip_time"].to_numpy())
+    return space_time_cube
+
+def hot_spots_stage(space_time_cube: HexagonCube, neighborhood_distance: float=200, significance_level: float=0.05) -> pd.DataFrame:
+    """
+    Analyzes the emerging hot and cold spots of the space time cube.
+    """
+    return emerging_hot_spot_analysis(space_time_cube, neighborhood_distance, significance_level=significance_level)
+
+def outliers_stage(space_time_cube: HexagonCube, neighborhood_distance: float=200, permutations: int=499, seed: int=0, processes: int=1) -> pd.DataFrame:
+    """
+    Analyzes the local outliers of the space time cube.
+    The seed must be fixed, otherwise a cached result would differ from a new one.
+    """
+    return LocalOutlierAnalysis(space_time_cube,
+                                neighborhood_distance=neighborhood_distance,
+                                permutations=permutations,
+                                seed=seed,
+                                processes=processes).run().to_df()
+
+def density_stage(traffic_df: pd.DataFrame, distance_interval: int=200, time_interval: int=1):
+    """
+    Calculates the uniform kernel density of the projected points for every time step.
+    """
+    return calculate_density(traffic_df["x"].to_numpy(),
+                             traffic_df["y"].to_numpy(),
+                             traffic_df["trip_time"].to_numpy(),
+                             bin_size=distance_interval,
+                             time_interval=time_interval,
+                             neighborhood_size=distance_interval * 1.5)
+
+def od_stage(traffic_df: pd.DataFrame, cell_size: int=500, time_interval: int=60) -> ODMatrix:
+    """
+    Counts the trips between the hexagon cells of their first and last point per hour and vehicle type.
+    The trip times were already shifted by the measure stage.
+    """
+    return origin_destination_matrix(TripTable.from_df(traffic_df, shift_hours=0), GridZones(cell_size), time_interval)
+
+def create_traffic_pipeline(db_filepath: str, artifact_dir: str=None, time_interval: int=1, distance_interval: int=200, permutations: int=499, processes: int=1, tolerance: float=None, downsample: bool=False) -> Pipeline:
+    """
+    Creates the read, measure and patterns stages of the traffic use case.
+    Changing the parameters of the pattern stages only executes these stages again.
+
+    :param str db_filepath:         The traffic sqlite file.
+    :param str artifact_dir:        The directory of the stage artifacts, nothing is stored if None.
+    :param int time_interval:       The time step interval in minutes.
+    :param int distance_interval:   The hexagon distance interval in meters.
+    :param int permutations:        The number of permutations of the local outlier analysis.
+    :param int processes:           The number of processes of the local outlier analysis.
+    :param float tolerance:         The Douglas-Peucker tolerance in meters before the pattern stages.
+    :param bool downsample:         Downsamples to one point per person and time step before the pattern stages.
+    """
+    pipeline = Pipeline(artifact_dir)
+    pipeline.add_stage("read", read_stage, parameters={"db_filepath": db_filepath}, sources=("db_filepath",))
+    pipeline.add_stage("measure", measure_stage, inputs=("read",))
+    points_stage = "measure"
+    if None is not tolerance or downsample:
+        pipeline.add_stage("simplify", simplify_stage, inputs=("measure",), parameters={"tolerance": tolerance,
+                                                                                      "time_interval": time_interval if downsample else None})
+        points_stage = "simplify"
+    pipeline.add_stage("cube", cube_stage, inputs=(points_stage,), parameters={"time_interval": time_interval, "distance_interval": distance_interval})
+    pipeline.add_stage("hot_spots", hot_spots_stage, inputs=("cube",), parameters={"neighborhood_distance": distance_interval})
+    pipeline.add_stage("outliers", outliers_stage, inputs=("cube",), parameters={"neighborhood_distance": distance_interval,
+                                                                               "permutations": permutations,
+                                                                               "processes": processes})
+    pipeline.add_stage("density", density_stage, inputs=(points_stage,), parameters={"distance_interval": distance_interval, "time_interval": time_interval})
+    # the simplified trips may lose their first and last points
+    pipeline.add_stage("od", od_stage, inputs=("measure",))
+    return pipeline
@@ -0,0 +1,258 @@
+from measure.trips import TripTable
+import numpy as np
+import pandas as pd
+from patterns.cube import axial_hexagon_centers, axial_hexagons
+from relate.polygons import PolygonIndex
+from traffic.projection import project_points, unproject_points
+
+try:
+    from scipy import sparse
+except ImportError:
+    # the flows can always be exported as coordinate arrays
+    sparse = None
+
+# grid cells are packed into one sortable key
+_KEY_OFFSET = 1 << 30
+
+
+
+class GridZones(object):
+    """
+    Represents zones of a regular grid in projected meters e.g. for flows between hexagon cells.
+    Every zone is identified by its packed grid coordinates.
+    """
+
+    def __init__(self, cell_size: float=500, hexagons: bool=True, epsg: int=25832) -> None:
+        """
+        :param float cell_size: The cell size in meters, for hexagons the distance between opposite edges.
+        :param bool hexagons:   Uses pointy-top hexagons like the space time cube instead of squares.
+        :param int epsg:        The projected spatial reference.
+        """
+        if cell_size <= 0:
+            raise ValueError("The cell size must be positive!")
+
+        self._cell_size = float(cell_size)
+        self._hexagons = hexagons
+        self._epsg = epsg
+
+    @property
+    def cell_size(self):
+        return self._cell_size
+
+    @property
+    def hexagons(self):
+        return self._hexagons
+
+    def locate(self, longitude, latitude) -> np.ndarray:
+        """
+        Returns the zone of every point, points without coordinates are outside and get -1.
+        """
+        x, y = project_points(np.asarray(longitude, dtype=np.float64), np.asarray(latitude, dtype=np.float64), self._epsg)
+        outside = ~(np.isfinite(x) & np.isfinite(y))
+        x = np.where(outside, 0.0, x)
+        y = np.where(outside, 0.0, y)
+        if self._hexagons:
+            first, second = axial_hexagons(x, y, self._cell_size)
+        else:
+            first = np.floor(x / self._cell_size).astype(np.int64)
+            second = np.floor(y / self._cell_size).astype(np.int64)
+        zones = ((first + _KEY_OFFSET) << 32) | (second + _KEY_OFFSET)
+        zones[outside] = -1
+        return zones
+
+    def centers(self, zones):
+        """
+        Returns the longitudes and latitudes of the zone centers.
+        """
+        zones = np.asarray(zones, dtype=np.int64)
+        first = (zones >> 32) - _KEY_OFFSET
+        second = (zones & 0xFFFFFFFF) - _KEY_OFFSET
+        if self._hexagons:
+            x, y = axial_hexagon_centers(first, second, self._cell_size)
+        else:
+            x, y = (first + 0.5) * self._cell_size, (second + 0.5) * self._cell_size
+        return unproject_points(x, y, self._epsg)
+
+
+class ODMatrix(object):
+    """
+    Represents the trips between origin and destination zones per time bucket and vehicle type.
+    Only the non-empty cells are stored as coordinate arrays, the indices refer to the zone, time bucket and vehicle type labels.
+    """
+
+    def __init__(self, zones, time_buckets, vehicle_types, bucket_indices, vehicle_indices, origin_indices, destination_indices, counts, outside_count: int=0) -> None:
+        self._zones = np.asarray(zones)
+        self._time_buckets = np.asarray(time_buckets, dtype="datetime64[s]")
+        self._vehicle_types = np.asarray(vehicle_types, dtype=object)
+        self._bucket_indices = np.asarray(bucket_indices, dtype=np.int32)
+        self._vehicle_indices = np.asarray(vehicle_indices, dtype=np.int16)
+        self._origin_indices = np.asarray(origin_indices, dtype=np.int32)
+        self._destination_indices = np.asarray(destination_indices, dtype=np.int32)
+        self._counts = np.asarray(counts, dtype=np.int64)
+        self._outside_count = outside_count
+
+    @property
+    def zones(self):
+        return self._zones
+
+    @property
+    def time_buckets(self):
+        return self._time_buckets
+
+    @property
+    def vehicle_types(self):
+        return self._vehicle_types
+
+    @property
+    def outside_count(self) -> int:
+        """
+        Returns the number of trips starting or ending outside of all zones.
+        """
+        return self._outside_count
+
+    @property
+    def trip_count(self) -> int:
+        return int(self._counts.sum())
+
+    def __len__(self):
+        return self._counts.shape[0]
+
+    def _select(self, time_bucket, vehicle_type):
+        selected = np.ones(self._counts.shape[0], dtype=bool)
+        if None is not time_bucket:
+            bucket_index = np.searchsorted(self._time_buckets, np.datetime64(time_bucket, "s"))
+            if bucket_index == self._time_buckets.shape[0] or self._time_buckets[bucket_index] != np.datetime64(time_bucket, "s"):
+                raise ValueError(f"The time bucket {time_bucket} does not exist!")
+            selected &= self._bucket_indices == bucket_index
+        if None is not vehicle_type:
+            vehicle_indices = np.flatnonzero(self._vehicle_types == vehicle_type)
+            if 0 == vehicle_indices.size:
+                raise ValueError(f"The vehicle type {vehicle_type} does not exist!")
+            selected &= self._vehicle_indices == vehicle_indices[0]
+        return selected
+
+    def to_dense(self, time_bucket=None, vehicle_type=None) -> np.ndarray:
+        """
+        Returns the trips as dense matrix of origin by destination zones, all buckets and vehicle types are summed up if None.
+        """
+        selected = self._select(time_bucket, vehicle_type)
+        zone_count = self._zones.shape[0]
+        cells = self._origin_indices[selected].astype(np.int64) * zone_count + self._destination_indices[selected]
+        return np.bincount(cells, weights=self._counts[selected], minlength=zone_count * zone_count).astype(np.int64).reshape(zone_count, zone_count)
+
+    def to_sparse(self, time_bucket=None, vehicle_type=None):
+        """
+        Returns the trips as sparse matrix of origin by destination zones, all buckets and vehicle types are summed up if None.
+        """
+        if None is sparse:
+            raise RuntimeError("The sparse matrix requires scipy!")
+
+        selected = self._select(time_bucket, vehicle_type)
+        zone_count = self._zones.shape[0]
+        od_matrix = sparse.coo_matrix((self._counts[selected], (self._origin_indices[selected], self._destination_indices[selected])),
+                                      shape=(zone_count, zone_count))
+        # duplicates of different buckets or vehicle types are summed up
+        od_matrix.sum_duplicates()
+        return od_matrix
+
+    def to_df(self) -> pd.DataFrame:
+        """
+        Returns the non-empty cells with their time bucket, vehicle type, origin and destination zone.
+        """
+        return pd.DataFrame({"time_bucket": self._time_buckets[self._bucket_indices],
+                             "vehicle_type": self._vehicle_types[self._vehicle_indices],
+                             "origin": self._zones[self._origin_indices],
+                             "destination": self._zones[self._destination_indices],
+                             "trips": self._counts})
+
+    def save(self, filepath: str) -> str:
+        """
+        Saves the coordinate arrays as compressed numpy archive.
+        """
+        # text labels e.g. district names are stored as fixed width strings instead of pickled objects
+        zones = self._zones.astype(str) if object == self._zones.dtype else self._zones
+        # missing vehicle types are masked, otherwise they would be loaded as the text "None"
+        missing_vehicle_types = np.array([None is vehicle_type for vehicle_type in self._vehicle_types], dtype=bool)
+        vehicle_types = np.where(missing_vehicle_types, "", self._vehicle_types).astype(str)
+        np.savez_compressed(filepath, zones=zones, time_buckets=self._time_buckets,
+                            vehicle_types=vehicle_types, missing_vehicle_types=missing_vehicle_types, bucket_indices=self._bucket_indices,
+                            vehicle_indices=self._vehicle_indices, origin_indices=self._origin_indices,
+                            destination_indices=self._destination_indices, counts=self._counts,
+                            outside_count=self._outside_count)
+        return filepath if filepath.endswith(".npz") else f"{filepath}.npz"
+
+    @classmethod
+    def load(cls, filepath: str):
+        """
+        Loads the coordinate arrays saved by save.
+        """
+        with np.load(filepath) as archive:
+            vehicle_types = archive["vehicle_types"].astype(object)
+            vehicle_types[archive["missing_vehicle_types"]] = None
+            return cls(archive["zones"], archive["time_buckets"], vehicle_types,
+                       archive["bucket_indices"], archive["vehicle_indices"], archive["origin_indices"],
+                       archive["destination_indices"], archive["counts"], int(archive["outside_count"]))
+
+
+
+def _locate_zones(zones, longitude, latitude):
+    """
+    Returns the zone keys of the points, -1 for points outside of all zones, and the zone labels.
+    """
+    if isinstance(zones, PolygonIndex):
+        return zones.locate(longitude, latitude), zones.ids
+    return zones.locate(longitude, latitude), None
+
+def origin_destination_matrix(trip_table: TripTable, zones, time_interval: int=60, by_vehicle_type: bool=True) -> ODMatrix:
+    """
+    Counts the trips between the zones of their first and last point per time bucket of their start and vehicle type.
+    Only the first and last point of every trip are located, so the costs mostly depend on the number of trips.
+
+    :param trip_table:              The trips e.g. TripTable.from_df(traffic_df).
+    :param zones:                   The zones e.g. GridZones or a PolygonIndex of the city districts.
+    :param int time_interval:       The time bucket interval in minutes.
+    :param bool by_vehicle_type:    Splits the flows by the vehicle type of the first point.
+    """
+    if time_interval < 1:
+        raise ValueError("The time interval must be positive!")
+
+    first_points = trip_table.first_points()
+    last_points = trip_table.last_points()
+    trip_count = first_points.shape[0]
+    endpoints = np.concatenate((first_points, last_points))
+    endpoint_zones, zone_labels = _locate_zones(zones, trip_table.longitude[endpoints], trip_table.latitude[endpoints])
+    origin_zones, destination_zones = endpoint_zones[:trip_count], endpoint_zones[trip_count:]
+    inside = (0 <= origin_zones) & (0 <= destination_zones)
+    outside_count = int(trip_count - inside.sum())
+    first_points = first_points[inside]
+    origin_zones, destination_zones = origin_zones[inside], destination_zones[inside]
+
+    # compact indices of the zones, time buckets and vehicle types
+    unique_zones, zone_indices = np.unique(np.concatenate((origin_zones, destination_zones)), return_inverse=True)
+    zone_indices = zone_indices.ravel()
+    origin_indices, destination_indices = zone_indices[:first_points.shape[0]], zone_indices[first_points.shape[0]:]
+    bucket_starts = trip_table.trip_time[first_points].astype("datetime64[m]").astype(np.int64) // time_interval * time_interval
+    unique_buckets, bucket_indices = np.unique(bucket_starts, return_inverse=True)
+    bucket_indices = bucket_indices.ravel()
+    if by_vehicle_type and None is not trip_table.vehicle_type:
+        vehicle_codes = trip_table.vehicle_type.codes[first_points].astype(np.int64)
+        # missing vehicle types get their own label
+        vehicle_types = np.append(trip_table.vehicle_type.categories.to_numpy(dtype=object), None)
+        vehicle_codes[vehicle_codes < 0] = vehicle_types.shape[0] - 1
+        used_vehicle_types, vehicle_indices = np.unique(vehicle_codes, return_inverse=True)
+        vehicle_types = vehicle_types[used_vehicle_types]
+        vehicle_indices = vehicle_indices.ravel()
+    else:
+        vehicle_types = np.array([None], dtype=object)
+        vehicle_indices = np.zeros(first_points.shape[0], dtype=np.int64)
+
+    # one sort over all flows groups the equal cells
+    order = np.lexsort((destination_indices, origin_indices, vehicle_indices, bucket_indices))
+    cells = np.stack((bucket_indices[order], vehicle_indices[order], origin_indices[order], destination_indices[order]))
+    cell_starts = np.flatnonzero(np.concatenate(([True], (cells[:, 1:] != cells[:, :-1]).any(axis=0)))) if 0 < order.size else np.zeros(0, dtype=np.int64)
+    counts = np.diff(np.append(cell_starts, order.size))
+    cells = cells[:, cell_starts]
+
+    zone_ids = unique_zones if None is zone_labels else zone_labels[unique_zones]
+    time_buckets = (unique_buckets * 60).astype("datetime64[s]")
+    return ODMatrix(zone_ids, time_buckets, vehicle_types, cells[0], cells[1], cells[2], cells[3], counts, outside_count)
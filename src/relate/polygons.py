@@ -0,0 +1,222 @@
+from concurrent.futures import ProcessPoolExecutor
+import json
+import numpy as np
+
+
+
+def _read_geojson_rings(geometry: dict) -> list:
+    """
+    Returns all rings of a GeoJSON polygon or multipolygon as coordinate arrays.
+    """
+    if None is geometry:
+        return []
+    if "Polygon" == geometry["type"]:
+        polygons = [geometry["coordinates"]]
+    elif "MultiPolygon" == geometry["type"]:
+        polygons = geometry["coordinates"]
+    else:
+        raise ValueError(f"Unsupported geometry type {geometry['type']}!")
+    return [np.asarray(ring, dtype=np.float64)[:, :2] for polygon in polygons for ring in polygon]
+
+
+class _PolygonEdges(object):
+    """
+    Represents the edges of all rings of one polygon bucketed into horizontal bands.
+    A point only needs to be tested against the edges of its band.
+    """
+
+    def __init__(self, rings: list, band_edge_count: int=8) -> None:
+        edges = [np.hstack((ring[:-1], ring[1:])) for ring in rings if 1 < len(ring)]
+        edges = np.vstack(edges) if 0 < len(edges) else np.zeros((0, 4))
+        # horizontal edges never cross a horizontal ray
+        edges = edges[edges[:, 1] != edges[:, 3]]
+        self.min_x = float(edges[:, [0, 2]].min()) if 0 < edges.shape[0] else np.inf
+        self.max_x = float(edges[:, [0, 2]].max()) if 0 < edges.shape[0] else -np.inf
+        self.min_y = float(edges[:, [1, 3]].min()) if 0 < edges.shape[0] else np.inf
+        self.max_y = float(edges[:, [1, 3]].max()) if 0 < edges.shape[0] else -np.inf
+
+        self.band_count = max(1, edges.shape[0] // band_edge_count)
+        self.band_height = (self.max_y - self.min_y) / self.band_count if 0 < edges.shape[0] else 1.0
+        edge_min_y = np.minimum(edges[:, 1], edges[:, 3])
+        edge_max_y = np.maximum(edges[:, 1], edges[:, 3])
+        first_bands = self._bands(edge_min_y)
+        last_bands = self._bands(edge_max_y)
+        # every edge is registered in all bands it spans
+        band_spans = last_bands - first_bands + 1
+        edge_indices = np.repeat(np.arange(edges.shape[0]), band_spans)
+        edge_bands = np.repeat(first_bands, band_spans) + (np.arange(edge_indices.size) - np.repeat(np.cumsum(band_spans) - band_spans, band_spans))
+        band_order = np.argsort(edge_bands, kind="stable")
+        self.band_edges = edges[edge_indices[band_order]]
+        self.band_offsets = np.searchsorted(edge_bands[band_order], np.arange(self.band_count + 1))
+
+    def _bands(self, y: np.ndarray) -> np.ndarray:
+        return np.clip(((y - self.min_y) / self.band_height).astype(np.int64), 0, self.band_count - 1)
+
+    def contains(self, x: np.ndarray, y: np.ndarray, block_size: int=1 << 20) -> np.ndarray:
+        """
+        Returns whether the points are inside using the even-odd rule, so that holes are excluded.
+        """
+        inside = np.zeros(x.shape, dtype=bool)
+        point_bands = self._bands(y)
+        point_order = np.argsort(point_bands, kind="stable")
+        point_offsets = np.searchsorted(point_bands[point_order], np.arange(self.band_count + 1))
+        for band in np.flatnonzero(np.diff(point_offsets)):
+            edges = self.band_edges[self.band_offsets[band]:self.band_offsets[band + 1]]
+            if 0 == edges.shape[0]:
+                continue
+
+            band_points = point_order[point_offsets[band]:point_offsets[band + 1]]
+            block_points = max(1, block_size // edges.shape[0])
+            for block_start in range(0, band_points.size, block_points):
+                points = band_points[block_start:block_start + block_points]
+                point_x = x[points, np.newaxis]
+                point_y = y[points, np.newaxis]
+                x1, y1, x2, y2 = edges[:, 0], edges[:, 1], edges[:, 2], edges[:, 3]
+                straddles = (y1 > point_y) != (y2 > point_y)
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    intersection_x = x1 + (point_y - y1) * (x2 - x1) / (y2 - y1)
+                crossings = np.count_nonzero(straddles & (point_x < intersection_x), axis=1)
+                inside[points] = 1 == crossings % 2
+        return inside
+
+
+class _TreeNode(object):
+
+    def __init__(self, bounds: np.ndarray, children: list, polygon_indices: np.ndarray) -> None:
+        self.bounds = bounds
+        self.children = children
+        self.polygon_indices = polygon_indices
+
+
+class PolygonIndex(object):
+    """
+    Represents a point in polygon engine e.g. for joining traffic locations with city districts.
+    An STR-tree (sort tile recursive) over the polygon bounding boxes narrows the candidate polygons
+    of whole point arrays, the candidates are tested using vectorized ray casting.
+    """
+
+    def __init__(self, polygons: list, ids=None, node_capacity: int=8) -> None:
+        """
+        :param list polygons:       The polygons as lists of rings, every ring is an array of x and y coordinates.
+        :param ids:                 The polygon ids, the polygon positions if None.
+        :param int node_capacity:   The maximum number of entries per tree node.
+        """
+        self._polygons = [_PolygonEdges(rings) for rings in polygons]
+        self._ids = np.arange(len(polygons)) if None is ids else np.asarray(ids)
+        bounds = np.array([(polygon.min_x, polygon.min_y, polygon.max_x, polygon.max_y) for polygon in self._polygons]).reshape(-1, 4)
+        self._root = self._pack(bounds, node_capacity)
+
+    @classmethod
+    def from_geojson(cls, filepath: str, id_property: str=None, encoding: str="utf8"):
+        """
+        Reads the polygons of a GeoJSON feature collection.
+
+        :param str filepath:        The GeoJSON file.
+        :param str id_property:     The property holding the polygon id, the feature position if None.
+        :param str encoding:        The file encoding.
+        """
+        with open(filepath, encoding=encoding) as in_stream:
+            features = json.load(in_stream)["features"]
+
+        polygons = [_read_geojson_rings(feature["geometry"]) for feature in features]
+        ids = None if None is id_property else [feature["properties"][id_property] for feature in features]
+        return cls(polygons, ids)
+
+    @property
+    def ids(self):
+        return self._ids
+
+    def __len__(self):
+        return len(self._polygons)
+
+    @staticmethod
+    def _pack(bounds: np.ndarray, node_capacity: int) -> _TreeNode:
+        nodes = [_TreeNode(bound, [], np.array([index])) for index, bound in enumerate(bounds)]
+        while node_capacity < len(nodes):
+            node_bounds = np.array([node.bounds for node in nodes])
+            slice_count = int(np.ceil(np.sqrt(np.ceil(len(nodes) / node_capacity))))
+            slice_size = slice_count * node_capacity
+            center_x = (node_bounds[:, 0] + node_bounds[:, 2]) / 2
+            center_y = (node_bounds[:, 1] + node_bounds[:, 3]) / 2
+            parents = []
+            x_order = np.argsort(center_x, kind="stable")
+            for slice_start in range(0, len(nodes), slice_size):
+                slice_indices = x_order[slice_start:slice_start + slice_size]
+                slice_indices = slice_indices[np.argsort(center_y[slice_indices], kind="stable")]
+                for node_start in range(0, slice_indices.size, node_capacity):
+                    child_indices = slice_indices[node_start:node_start + node_capacity]
+                    parents.append(PolygonIndex._create_parent([nodes[index] for index in child_indices]))
+            nodes = parents
+        return PolygonIndex._create_parent(nodes)
+
+    @staticmethod
+    def _create_parent(children: list) -> _TreeNode:
+        if 0 == len(children):
+            return _TreeNode(np.array([np.inf, np.inf, -np.inf, -np.inf]), [], np.zeros(0, dtype=np.int64))
+
+        child_bounds = np.array([child.bounds for child in children])
+        bounds = np.array([child_bounds[:, 0].min(), child_bounds[:, 1].min(), child_bounds[:, 2].max(), child_bounds[:, 3].max()])
+        return _TreeNode(bounds, children, np.concatenate([child.polygon_indices for child in children]))
+
+    def _query(self, node: _TreeNode, x: np.ndarray, y: np.ndarray, point_indices: np.ndarray, positions: np.ndarray):
+        min_x, min_y, max_x, max_y = node.bounds
+        point_x = x[point_indices]
+        point_y = y[point_indices]
+        # points already located in another polygon are skipped
+        point_indices = point_indices[(min_x <= point_x) & (point_x <= max_x) & (min_y <= point_y) & (point_y <= max_y) & (positions[point_indices] < 0)]
+        if 0 == point_indices.size:
+            return
+
+        if 0 == len(node.children):
+            polygon_index = int(node.polygon_indices[0])
+            inside = self._polygons[polygon_index].contains(x[point_indices], y[point_indices])
+            positions[point_indices[inside]] = polygon_index
+            return
+
+        for child in node.children:
+            self._query(child, x, y, point_indices, positions)
+
+    def locate(self, x, y, processes: int=1, chunk_size: int=1000000) -> np.ndarray:
+        """
+        Returns the position of the polygon containing every point or -1.
+        Overlapping polygons resolve to one of them.
+
+        :param x:               The point x coordinates e.g. longitudes.
+        :param y:               The point y coordinates e.g. latitudes.
+        :param int processes:   The number of worker processes the point arrays are split across.
+        :param int chunk_size:  The maximum number of points per worker task.
+        """
+        x = np.ascontiguousarray(x, dtype=np.float64)
+        y = np.ascontiguousarray(y, dtype=np.float64)
+        if 1 < processes and chunk_size < x.size:
+            chunk_starts = range(0, x.size, chunk_size)
+            with ProcessPoolExecutor(max_workers=processes, initializer=_initialize_worker, initargs=(self,)) as executor:
+                chunk_positions = executor.map(_locate_in_worker, (x[start:start + chunk_size] for start in chunk_starts),
+                                               (y[start:start + chunk_size] for start in chunk_starts))
+                return np.concatenate(list(chunk_positions))
+
+        positions = np.full(x.size, -1, dtype=np.int64)
+        self._query(self._root, x, y, np.arange(x.size), positions)
+        return positions
+
+    def locate_ids(self, x, y, missing=-1, processes: int=1) -> np.ndarray:
+        """
+        Returns the id of the polygon containing every point or the missing value.
+        """
+        positions = self.locate(x, y, processes)
+        ids = self._ids[np.maximum(positions, 0)] if 0 < len(self) else np.zeros(positions.size, dtype=self._ids.dtype)
+        if 0 <= positions.min(initial=0):
+            return ids
+        ids = ids.astype(np.result_type(ids.dtype, np.asarray(missing).dtype))
+        ids[positions < 0] = missing
+        return ids
+
+
+_worker_polygon_index = None
+
+def _initialize_worker(polygon_index: PolygonIndex):
+    global _worker_polygon_index
+    _worker_polygon_index = polygon_index
+
+def _locate_in_worker(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    return _worker_polygon_index.locate(x, y)
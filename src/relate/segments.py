@@ -0,0 +1,145 @@
+import numpy as np
+
+
+
+class SegmentIndex(object):
+    """
+    Represents a nearest segment engine e.g. for the distance of traffic locations to city streets.
+    The segments of all polylines are bucketed into a uniform grid of projected coordinates,
+    every point is only measured against the segments of the grid cells within the maximum distance.
+    """
+
+    def __init__(self, polylines: list, ids=None, cell_size: float=50.0) -> None:
+        """
+        :param list polylines:      The polylines as lists of paths, every path is an array of projected x and y coordinates.
+        :param ids:                 The polyline ids, the polyline positions if None.
+        :param float cell_size:     The grid cell size in projected units e.g. meters.
+        """
+        segments = []
+        polyline_indices = []
+        for polyline_index, paths in enumerate(polylines):
+            for path in paths:
+                path = np.asarray(path, dtype=np.float64)[:, :2]
+                if 1 < path.shape[0]:
+                    segments.append(np.hstack((path[:-1], path[1:])))
+                    polyline_indices.append(np.full(path.shape[0] - 1, polyline_index))
+
+        segments = np.vstack(segments) if 0 < len(segments) else np.zeros((0, 4))
+        polyline_indices = np.concatenate(polyline_indices) if 0 < len(polyline_indices) else np.zeros(0, dtype=np.int64)
+
+        # long segments are split into pieces not longer than a cell, so that they only cover the cells along them
+        piece_counts = np.maximum(1, np.ceil(np.hypot(segments[:, 2] - segments[:, 0], segments[:, 3] - segments[:, 1]) / cell_size)).astype(np.int64)
+        piece_segments = np.repeat(np.arange(segments.shape[0]), piece_counts)
+        piece_positions = np.arange(piece_segments.size) - np.repeat(np.cumsum(piece_counts) - piece_counts, piece_counts)
+        start_fractions = (piece_positions / piece_counts[piece_segments])[:, np.newaxis]
+        end_fractions = ((piece_positions + 1) / piece_counts[piece_segments])[:, np.newaxis]
+        starts = segments[piece_segments, :2]
+        deltas = segments[piece_segments, 2:] - starts
+        self._segments = np.hstack((starts + start_fractions * deltas, starts + end_fractions * deltas))
+        self._polyline_indices = polyline_indices[piece_segments]
+        self._ids = np.arange(len(polylines)) if None is ids else np.asarray(ids)
+        self._cell_size = float(cell_size)
+
+        segment_min = np.minimum(self._segments[:, :2], self._segments[:, 2:])
+        segment_max = np.maximum(self._segments[:, :2], self._segments[:, 2:])
+        self._origin = segment_min.min(axis=0) if 0 < self._segments.shape[0] else np.zeros(2)
+        first_cells = ((segment_min - self._origin) // self._cell_size).astype(np.int64)
+        last_cells = ((segment_max - self._origin) // self._cell_size).astype(np.int64)
+        self._shape = tuple((last_cells.max(axis=0) + 1).tolist()) if 0 < self._segments.shape[0] else (1, 1)
+
+        # every segment is registered in all cells of its bounding box
+        column_spans = last_cells[:, 0] - first_cells[:, 0] + 1
+        row_spans = last_cells[:, 1] - first_cells[:, 1] + 1
+        cell_counts = column_spans * row_spans
+        segment_indices = np.repeat(np.arange(self._segments.shape[0]), cell_counts)
+        cell_positions = np.arange(segment_indices.size) - np.repeat(np.cumsum(cell_counts) - cell_counts, cell_counts)
+        cell_columns = first_cells[segment_indices, 0] + cell_positions % column_spans[segment_indices]
+        cell_rows = first_cells[segment_indices, 1] + cell_positions // column_spans[segment_indices]
+        cell_ids = cell_rows * self._shape[0] + cell_columns
+        cell_order = np.argsort(cell_ids, kind="stable")
+        self._cell_segments = segment_indices[cell_order]
+        self._cell_offsets = np.searchsorted(cell_ids[cell_order], np.arange(self._shape[0] * self._shape[1] + 1))
+
+    @property
+    def ids(self):
+        return self._ids
+
+    def __len__(self):
+        return self._ids.size
+
+    def _measure(self, x: np.ndarray, y: np.ndarray, segment_indices: np.ndarray) -> np.ndarray:
+        x1, y1, x2, y2 = self._segments[segment_indices].T
+        delta_x = x2 - x1
+        delta_y = y2 - y1
+        length_sq = delta_x ** 2 + delta_y ** 2
+        with np.errstate(divide="ignore", invalid="ignore"):
+            fraction = np.where(0 < length_sq, ((x - x1) * delta_x + (y - y1) * delta_y) / length_sq, 0.0)
+        fraction = np.clip(fraction, 0.0, 1.0)
+        return np.hypot(x - (x1 + fraction * delta_x), y - (y1 + fraction * delta_y))
+
+    def nearest(self, x, y, max_distance: float, block_size: int=250000):
+        """
+        Returns the position of the nearest polyline and the distance for every point.
+        Points without any polyline within the maximum distance have the position -1 and the distance NaN.
+
+        :param x:                   The projected point x coordinates.
+        :param y:                   The projected point y coordinates.
+        :param float max_distance:  The maximum distance in projected units.
+        :param int block_size:      The number of points being measured at once.
+        """
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        positions = np.full(x.size, -1, dtype=np.int64)
+        distances = np.full(x.size, np.nan)
+        ring = int(np.ceil(max_distance / self._cell_size))
+        for block_start in range(0, x.size, block_size):
+            block_x = x[block_start:block_start + block_size]
+            block_y = y[block_start:block_start + block_size]
+            block_positions, block_distances = self._nearest_block(block_x, block_y, max_distance, ring)
+            positions[block_start:block_start + block_size] = block_positions
+            distances[block_start:block_start + block_size] = block_distances
+        return positions, distances
+
+    def _nearest_block(self, x: np.ndarray, y: np.ndarray, max_distance: float, ring: int):
+        best_distances = np.full(x.size, np.inf)
+        best_segments = np.full(x.size, -1, dtype=np.int64)
+        point_columns = np.floor((x - self._origin[0]) / self._cell_size).astype(np.int64)
+        point_rows = np.floor((y - self._origin[1]) / self._cell_size).astype(np.int64)
+        for row_offset in range(-ring, ring + 1):
+            for column_offset in range(-ring, ring + 1):
+                columns = point_columns + column_offset
+                rows = point_rows + row_offset
+                in_grid = np.flatnonzero((0 <= columns) & (columns < self._shape[0]) & (0 <= rows) & (rows < self._shape[1]))
+                cell_ids = rows[in_grid] * self._shape[0] + columns[in_grid]
+                starts = self._cell_offsets[cell_ids]
+                counts = self._cell_offsets[cell_ids + 1] - starts
+                if 0 == counts.sum():
+                    continue
+
+                # expand every point into pairs with the segments of the cell
+                pair_points = np.repeat(in_grid, counts)
+                pair_slots = np.arange(pair_points.size) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(starts, counts)
+                pair_segments = self._cell_segments[pair_slots]
+                pair_distances = self._measure(x[pair_points], y[pair_points], pair_segments)
+
+                # keep the nearest segment per point
+                np.minimum.at(best_distances, pair_points, pair_distances)
+                nearest_pairs = pair_distances == best_distances[pair_points]
+                best_segments[pair_points[nearest_pairs]] = pair_segments[nearest_pairs]
+
+        within = best_distances <= max_distance
+        positions = np.where(within, self._polyline_indices[np.maximum(best_segments, 0)] if 0 < self._polyline_indices.size else -1, -1)
+        distances = np.where(within, best_distances, np.nan)
+        return positions, distances
+
+    def nearest_ids(self, x, y, max_distance: float, missing=-1):
+        """
+        Returns the id of the nearest polyline and the distance for every point.
+        """
+        positions, distances = self.nearest(x, y, max_distance)
+        ids = self._ids[np.maximum(positions, 0)] if 0 < len(self) else np.zeros(positions.size, dtype=self._ids.dtype)
+        if 0 <= positions.min(initial=0):
+            return ids, distances
+        ids = ids.astype(np.result_type(ids.dtype, np.asarray(missing).dtype))
+        ids[positions < 0] = missing
+        return ids, distances
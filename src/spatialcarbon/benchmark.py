@@ -0,0 +1,220 @@
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import numpy as np
+import os
+import sys
+import pandas as pd
+import sqlite3 as sql
+import time
+
+try:
+    from codecarbon import OfflineEmissionsTracker
+except ImportError:
+    # emissions are not estimated without codecarbon
+    OfflineEmissionsTracker = None
+
+try:
+    import resource
+except ImportError:
+    # e.g. on Windows
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# the measured values of every repetition
+METRICS = ["wall_time", "cpu_time", "peak_rss", "rows_per_second", "emissions"]
+
+
+
+def _peak_rss() -> float:
+    """
+    Returns the peak resident set size of the current process in bytes.
+    """
+    if None is not resource:
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes, macOS bytes
+        return float(peak_rss) if "darwin" == sys.platform else float(peak_rss) * 1024
+    if None is not psutil:
+        memory_info = psutil.Process().memory_info()
+        return float(getattr(memory_info, "peak_wset", memory_info.rss))
+    return np.nan
+
+def _count_rows(result) -> float:
+    if None is result:
+        return np.nan
+    if isinstance(result, (int, np.integer)):
+        return float(result)
+    try:
+        return float(len(result))
+    except TypeError:
+        return np.nan
+
+def _run_variant(function, dataset, warmup: int, repetitions: int, track_emissions: bool, country_iso_code: str) -> list:
+    """
+    Runs the warmup runs and the measured repetitions of one variant on one dataset.
+    The peak resident set size is the peak of the running process at the end of each repetition.
+    """
+    for _ in range(warmup):
+        function(dataset)
+
+    measurements = []
+    for repetition in range(repetitions):
+        tracker = None
+        if track_emissions and None is not OfflineEmissionsTracker:
+            tracker = OfflineEmissionsTracker(country_iso_code=country_iso_code, save_to_file=False, log_level="error")
+            tracker.start()
+        start_cpu_time = time.process_time()
+        start_wall_time = time.perf_counter()
+        result = function(dataset)
+        wall_time = time.perf_counter() - start_wall_time
+        cpu_time = time.process_time() - start_cpu_time
+        emissions = tracker.stop() if None is not tracker else np.nan
+        rows = _count_rows(result)
+        measurements.append({"repetition": repetition,
+                             "wall_time": wall_time,
+                             "cpu_time": cpu_time,
+                             "peak_rss": _peak_rss(),
+                             "rows": rows,
+                             "rows_per_second": rows / wall_time if 0 < wall_time else np.nan,
+                             "emissions": np.nan if None is emissions else emissions})
+    return measurements
+
+
+
+class Benchmark(object):
+    """
+    Represents a benchmark running named variants on parameterized datasets.
+    Every variant is a function accepting the dataset and returning the processed rows or their count.
+    Every variant runs on every dataset in a fresh worker process, so the peak memory of variants does not interfere.
+    The variant functions must be importable module level functions when running in worker processes.
+    """
+
+    def __init__(self, name: str, warmup: int=1, repetitions: int=5, isolate: bool=True, track_emissions: bool=True, country_iso_code: str="USA") -> None:
+        if repetitions < 1:
+            raise ValueError("At least one repetition is required!")
+
+        self._name = name
+        self._warmup = warmup
+        self._repetitions = repetitions
+        self._isolate = isolate
+        self._track_emissions = track_emissions
+        self._country_iso_code = country_iso_code
+        self._variants = {}
+        self._datasets = {}
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def variants(self):
+        return list(self._variants)
+
+    @property
+    def datasets(self):
+        return list(self._datasets)
+
+    def add_variant(self, name: str, function):
+        """
+        Adds a named variant.
+        """
+        if name in self._variants:
+            raise ValueError(f"Variant {name} already exists!")
+
+        self._variants[name] = function
+        return self
+
+    def add_dataset(self, name: str, dataset, size: int=None):
+        """
+        Adds a named dataset being passed to every variant.
+
+        :param str name:    The name of the dataset.
+        :param dataset:     The dataset e.g. a file path.
+        :param int size:    The number of rows of the dataset.
+        """
+        if name in self._datasets:
+            raise ValueError(f"Dataset {name} already exists!")
+
+        self._datasets[name] = (dataset, size)
+        return self
+
+    def run(self) -> pd.DataFrame:
+        """
+        Runs all variants on all datasets and returns one row per repetition.
+        """
+        if 0 == len(self._variants) or 0 == len(self._datasets):
+            raise ValueError("The benchmark needs at least one variant and one dataset!")
+
+        results = []
+        for dataset_name, (dataset, size) in self._datasets.items():
+            for variant_name, function in self._variants.items():
+                arguments = (function, dataset, self._warmup, self._repetitions, self._track_emissions, self._country_iso_code)
+                if self._isolate:
+                    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+                        measurements = executor.submit(_run_variant, *arguments).result()
+                else:
+                    measurements = _run_variant(*arguments)
+
+                for measurement in measurements:
+                    results.append({"benchmark": self._name, "dataset": dataset_name, "size": size, "variant": variant_name, **measurement})
+        return pd.DataFrame(results)
+
+
+
+def summarize_benchmark(results_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Summarizes the repetitions of every variant and dataset by the median and the interquartile range of every metric.
+    """
+    grouped = results_df.groupby(["benchmark", "dataset", "size", "variant"], dropna=False, sort=False)[METRICS]
+    summary_df = grouped.median().add_suffix("_median")
+    iqr_df = (grouped.quantile(0.75) - grouped.quantile(0.25)).add_suffix("_iqr")
+    summary_df = summary_df.join(iqr_df)
+    summary_df["repetitions"] = grouped.size()
+    return summary_df.reset_index()
+
+def compare_benchmark(summary_df: pd.DataFrame, metric: str=None):
+    """
+    Ranks the variants of every dataset by the median metric and yields a text report.
+    The emissions are used if estimated, otherwise the wall time.
+    """
+    if None is metric:
+        metric = "emissions" if summary_df["emissions_median"].notna().any() else "wall_time"
+    for (benchmark_name, dataset_name), dataset_df in summary_df.groupby(["benchmark", "dataset"], sort=False):
+        ranked_df = dataset_df.sort_values(f"{metric}_median")
+        best = ranked_df[f"{metric}_median"].iloc[0]
+        title = f"{benchmark_name} - {dataset_name} ranked by {metric}"
+        yield ""
+        yield "-" * len(title)
+        yield title
+        yield "-" * len(title)
+        for rank, (_, variant_row) in enumerate(ranked_df.iterrows(), start=1):
+            ratio = variant_row[f"{metric}_median"] / best if 0 < best else np.nan
+            yield f"{rank}. {variant_row['variant']}: {variant_row[f'{metric}_median']:.6g} ± {variant_row[f'{metric}_iqr']:.3g} (IQR) " \
+                  f"x{ratio:.2f} \t{variant_row['wall_time_median']:.3f} s \t{variant_row['rows_per_second_median']:.0f} rows/s " \
+                  f"\t{variant_row['peak_rss_median'] / 2**20:.0f} MiB"
+
+def create_sqlite_samples(db_filepath: str, sample_dir: str, sizes: list, table: str="agent_pos") -> dict:
+    """
+    Copies the first rows of a table into one database per sample size.
+
+    :param str db_filepath:     The source database.
+    :param str sample_dir:      The directory of the sample databases.
+    :param list sizes:          The number of rows of every sample.
+    :return:                    The sample database file paths by size.
+    """
+    os.makedirs(sample_dir, exist_ok=True)
+    sample_filepaths = {}
+    for size in sizes:
+        sample_filepath = os.path.join(sample_dir, f"{table}_{size}.sqlite")
+        if not os.path.exists(sample_filepath):
+            with sql.connect(sample_filepath) as sample_connection:
+                sample_connection.execute("ATTACH DATABASE ? AS source;", (db_filepath,))
+                sample_connection.execute(f"CREATE TABLE {table} AS SELECT * FROM source.{table} ORDER BY rowid LIMIT ?;", (size,))
+                sample_connection.commit()
+                sample_connection.execute("DETACH DATABASE source;")
+            sample_connection.close()
+        sample_filepaths[size] = sample_filepath
+    return sample_filepaths
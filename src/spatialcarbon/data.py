@@ -1,26 +1,42 @@
 from codecarbon.viz.data import Data
+from functools import lru_cache
 import pandas as pd
+from spatialcarbon.experiment import Experiment
 
 
 
+@lru_cache(maxsize=1)
+def get_emissions_data() -> Data:
+    """
+    Returns the codecarbon reference data being loaded only once.
+    """
+    return Data()
+
 def get_print_emissions(carbon_equivalent: float) -> str:
     """
     Returns a text representation providing exemplary equivalents from daily life.
     """
-    emissions_stats = Data()
+    emissions_stats = get_emissions_data()
     return f"{emissions_stats.get_household_fraction(carbon_equivalent)} % of weekly American household emissions \
     \t{emissions_stats.get_car_miles(carbon_equivalent)} miles driven \
     \t{emissions_stats.get_tv_time(carbon_equivalent)} of 32-inch LCD TV watched"
 
-def get_summary_emissions(filepath: str) -> str:
+def get_summary_emissions(filepath: str, ledger=None) -> str:
     """
     Reads the emissions data and summarizes each project providing exemplary equivalents from daily life.
+    The optional EmissionsLedger only ingests the appended rows and summarizes its precomputed rollups.
     """
-    emissions_df = pd.read_csv(filepath)
-    overall_emissions_df = emissions_df.groupby(["project_name"])["emissions"].sum().reset_index()
+    if None is ledger:
+        emissions_df = pd.read_csv(filepath)
+        overall_emissions_df = emissions_df.groupby(["project_name"])["emissions"].sum().reset_index()
+    else:
+        ledger.ingest(filepath)
+        overall_emissions_df = ledger.rollup(by=("project_name", "use_case"))
+        overall_emissions_df["project_name"] = [Experiment(project_name, use_case).create_tracker_name() if use_case else project_name
+                                                for project_name, use_case in zip(overall_emissions_df["project_name"], overall_emissions_df["use_case"])]
     for _, emission_row in overall_emissions_df.iterrows():
         yield ""
         yield "-" * len(emission_row['project_name'])
         yield f"{emission_row['project_name']}"
         yield "-" * len(emission_row['project_name'])
-        yield f"{get_print_emissions(emission_row['emissions'])}"
\ No newline at end of file
+        yield f"{get_print_emissions(emission_row['emissions'])}"
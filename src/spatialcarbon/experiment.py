@@ -20,4 +20,13 @@ class Experiment(object):
         """
         Returns a tracker name using the project name and the use case.
         """
-        return f"{self._project_name} - {self._use_case}"
\ No newline at end of file
+        return f"{self._project_name} - {self._use_case}"
+
+    @classmethod
+    def from_tracker_name(cls, tracker_name: str):
+        """
+        Returns the experiment of a tracker name being created by an experiment.
+        A tracker name without use case becomes an experiment with an empty use case.
+        """
+        project_name, _, use_case = tracker_name.partition(" - ")
+        return cls(project_name, use_case)
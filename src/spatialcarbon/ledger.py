@@ -0,0 +1,221 @@
+from glob import glob
+import hashlib
+import io
+import os
+import pandas as pd
+from spatialcarbon.experiment import Experiment
+import sqlite3 as sql
+
+# the codecarbon columns being stored, missing columns of older versions are null
+EMISSIONS_COLUMNS = ["timestamp", "project_name", "run_id", "duration", "emissions", "energy_consumed"]
+
+# the aggregated columns of the rollups
+ROLLUP_COLUMNS = ["runs", "duration", "emissions", "energy_consumed"]
+
+# the number of bytes before the ingested offset identifying the ingested part of a file
+_FINGERPRINT_BYTES = 1024
+
+
+
+class EmissionsLedger(object):
+    """
+    Represents an append-only sqlite store of codecarbon emissions.
+    The tracker names are split into project and use case like an Experiment creates them.
+    Every ingested file is only read from the position of its last ingested line,
+    and the daily rollups per project and use case are updated while ingesting.
+    """
+
+    def __init__(self, db_filepath: str) -> None:
+        self._db_filepath = db_filepath
+        self._connection = sql.connect(db_filepath)
+        self._connection.executescript("""
+            CREATE TABLE IF NOT EXISTS emissions (
+                source TEXT NOT NULL,
+                line INTEGER NOT NULL,
+                timestamp TEXT,
+                day TEXT,
+                project_name TEXT,
+                use_case TEXT,
+                run_id TEXT,
+                duration REAL,
+                emissions REAL,
+                energy_consumed REAL,
+                PRIMARY KEY (source, line));
+            CREATE INDEX IF NOT EXISTS emissions_experiment ON emissions (project_name, use_case, timestamp);
+            CREATE INDEX IF NOT EXISTS emissions_timestamp ON emissions (timestamp);
+            CREATE TABLE IF NOT EXISTS sources (
+                source TEXT PRIMARY KEY,
+                offset INTEGER NOT NULL,
+                lines INTEGER NOT NULL,
+                header TEXT NOT NULL,
+                fingerprint TEXT);
+            CREATE TABLE IF NOT EXISTS daily_rollups (
+                project_name TEXT NOT NULL,
+                use_case TEXT NOT NULL,
+                day TEXT NOT NULL,
+                runs INTEGER NOT NULL,
+                duration REAL,
+                emissions REAL,
+                energy_consumed REAL,
+                PRIMARY KEY (project_name, use_case, day));
+            CREATE INDEX IF NOT EXISTS daily_rollups_day ON daily_rollups (day);
+            """)
+        source_columns = [column_info[1] for column_info in self._connection.execute("PRAGMA table_info(sources);")]
+        if not "fingerprint" in source_columns:
+            # the files of older ledgers are ingested again once
+            self._connection.execute("ALTER TABLE sources ADD COLUMN fingerprint TEXT;")
+        self._connection.commit()
+
+    @property
+    def db_filepath(self):
+        return self._db_filepath
+
+    def close(self):
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def ingest(self, filepath: str) -> int:
+        """
+        Ingests the lines of a codecarbon emissions file being appended since the last ingest.
+        A file being shorter than the ingested part or whose bytes before the ingested offset changed
+        was rewritten and is ingested again.
+
+        :param str filepath:    The codecarbon emissions file.
+        :return:                The number of ingested rows.
+        """
+        source = os.path.abspath(filepath)
+        source_row = self._connection.execute("SELECT offset, lines, header, fingerprint FROM sources WHERE source = ?;", (source,)).fetchone()
+        with open(filepath, "rb") as in_stream:
+            header = in_stream.readline()
+            offset, lines = (len(header), 0)
+            if (None is not source_row and os.path.getsize(filepath) >= source_row[0] and header.decode("utf-8") == source_row[2]
+                    and _fingerprint(in_stream, source_row[0]) == source_row[3]):
+                offset, lines = source_row[0], source_row[1]
+            elif None is not source_row:
+                self._remove_source(source)
+            in_stream.seek(offset)
+            content = in_stream.read()
+            # a partially written last line is ingested next time
+            content = content[:content.rfind(b"\n") + 1]
+            fingerprint = _fingerprint(in_stream, offset + len(content))
+
+        if 0 == len(content.strip()):
+            self._update_source(source, offset + len(content), lines, header, fingerprint)
+            self._connection.commit()
+            return 0
+
+        emissions_df = pd.read_csv(io.BytesIO(header + content))
+        emissions_df = emissions_df.reindex(columns=EMISSIONS_COLUMNS)
+        experiments = [Experiment.from_tracker_name(tracker_name) for tracker_name in emissions_df["project_name"].astype(str)]
+        emissions_df["project_name"] = [experiment.project_name for experiment in experiments]
+        emissions_df["use_case"] = [experiment.use_case for experiment in experiments]
+        emissions_df["timestamp"] = emissions_df["timestamp"].astype(str)
+        emissions_df["day"] = emissions_df["timestamp"].str.slice(0, 10)
+        emissions_df["source"] = source
+        emissions_df["line"] = range(lines, lines + emissions_df.shape[0])
+
+        with self._connection:
+            self._connection.executemany("""
+                INSERT OR IGNORE INTO emissions (source, line, timestamp, day, project_name, use_case, run_id, duration, emissions, energy_consumed)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?);""",
+                emissions_df[["source", "line", "timestamp", "day", "project_name", "use_case", "run_id", "duration", "emissions", "energy_consumed"]]
+                .astype(object).where(emissions_df.notna(), None).itertuples(index=False, name=None))
+            rollups_df = emissions_df.groupby(["project_name", "use_case", "day"]).agg(runs=("line", "size"),
+                                                                                       duration=("duration", "sum"),
+                                                                                       emissions=("emissions", "sum"),
+                                                                                       energy_consumed=("energy_consumed", "sum")).reset_index()
+            self._connection.executemany("""
+                INSERT INTO daily_rollups (project_name, use_case, day, runs, duration, emissions, energy_consumed)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (project_name, use_case, day) DO UPDATE SET
+                    runs = runs + excluded.runs,
+                    duration = duration + excluded.duration,
+                    emissions = emissions + excluded.emissions,
+                    energy_consumed = energy_consumed + excluded.energy_consumed;""",
+                rollups_df.astype(object).itertuples(index=False, name=None))
+            self._update_source(source, offset + len(content), lines + emissions_df.shape[0], header, fingerprint)
+        return emissions_df.shape[0]
+
+    def ingest_many(self, files_pattern: str="log/emissions*") -> int:
+        """
+        Ingests all codecarbon emissions files matching the file pattern e.g. "log/emissions-*.user".
+        """
+        return sum(self.ingest(filepath) for filepath in sorted(glob(files_pattern)))
+
+    def _update_source(self, source: str, offset: int, lines: int, header: bytes, fingerprint: str):
+        self._connection.execute("INSERT OR REPLACE INTO sources (source, offset, lines, header, fingerprint) VALUES (?, ?, ?, ?, ?);",
+                                 (source, offset, lines, header.decode("utf-8"), fingerprint))
+
+    def _remove_source(self, source: str):
+        """
+        Removes the rows of a rewritten file and rebuilds the affected rollups.
+        """
+        with self._connection:
+            self._connection.execute("""
+                DELETE FROM daily_rollups WHERE (project_name, use_case, day) IN
+                    (SELECT DISTINCT project_name, use_case, day FROM emissions WHERE source = ?);""", (source,))
+            self._connection.execute("DELETE FROM emissions WHERE source = ?;", (source,))
+            self._connection.execute("""
+                INSERT OR IGNORE INTO daily_rollups (project_name, use_case, day, runs, duration, emissions, energy_consumed)
+                SELECT project_name, use_case, day, COUNT(*), TOTAL(duration), TOTAL(emissions), TOTAL(energy_consumed)
+                FROM emissions GROUP BY project_name, use_case, day;""")
+            self._connection.execute("DELETE FROM sources WHERE source = ?;", (source,))
+
+    def rollup(self, by=("project_name",), project_name: str=None, use_case: str=None, start_day: str=None, end_day: str=None) -> pd.DataFrame:
+        """
+        Sums the precomputed daily rollups.
+
+        :param by:                  The grouping columns out of "project_name", "use_case" and "day".
+        :param str project_name:    The optional project filter.
+        :param str use_case:        The optional use case filter.
+        :param str start_day:       The optional first day e.g. "2023-07-01".
+        :param str end_day:         The optional last day.
+        """
+        if isinstance(by, str):
+            by = (by,)
+        invalid_columns = set(by) - {"project_name", "use_case", "day"}
+        if 0 < len(invalid_columns):
+            raise ValueError(f"Rollups by {', '.join(sorted(invalid_columns))} are not supported!")
+
+        conditions, parameters = [], []
+        for column, operator, value in [("project_name", "=", project_name), ("use_case", "=", use_case), ("day", ">=", start_day), ("day", "<=", end_day)]:
+            if None is not value:
+                conditions.append(f"{column} {operator} ?")
+                parameters.append(value)
+        where_statement = f"WHERE {' AND '.join(conditions)}" if 0 < len(conditions) else ""
+        group_list = ", ".join(by)
+        select_list = f"{group_list}, " if 0 < len(by) else ""
+        group_statement = f"GROUP BY {group_list} ORDER BY {group_list}" if 0 < len(by) else ""
+        return pd.read_sql_query(f"""
+            SELECT {select_list}SUM(runs) AS runs, SUM(duration) AS duration, SUM(emissions) AS emissions, SUM(energy_consumed) AS energy_consumed
+            FROM daily_rollups {where_statement} {group_statement};""", self._connection, params=parameters)
+
+    def runs(self, project_name: str=None, use_case: str=None, start_time: str=None, end_time: str=None) -> pd.DataFrame:
+        """
+        Returns the single runs of a project and use case within a time range using the indexes.
+        """
+        conditions, parameters = [], []
+        for column, operator, value in [("project_name", "=", project_name), ("use_case", "=", use_case), ("timestamp", ">=", start_time), ("timestamp", "<=", end_time)]:
+            if None is not value:
+                conditions.append(f"{column} {operator} ?")
+                parameters.append(value)
+        where_statement = f"WHERE {' AND '.join(conditions)}" if 0 < len(conditions) else ""
+        return pd.read_sql_query(f"""
+            SELECT timestamp, project_name, use_case, run_id, duration, emissions, energy_consumed
+            FROM emissions {where_statement} ORDER BY timestamp;""", self._connection, params=parameters)
+
+
+
+def _fingerprint(in_stream, offset: int) -> str:
+    """
+    Returns the SHA-256 hex digest of the bytes just before the offset.
+    """
+    start = max(0, offset - _FINGERPRINT_BYTES)
+    in_stream.seek(start)
+    return hashlib.sha256(in_stream.read(offset - start)).hexdigest()
@@ -0,0 +1,269 @@
+from collections import Counter
+import os
+import pandas as pd
+import sys
+import threading
+import time
+import tracemalloc
+
+# the peak of the traced memory can only be reset since Python 3.9
+_RESET_PEAK = hasattr(tracemalloc, "reset_peak")
+
+
+
+def _traced_memory():
+    """
+    Returns the current and peak traced memory, without resetting the peak only the current memory bounds a span.
+    """
+    current_memory, peak_memory = tracemalloc.get_traced_memory()
+    return current_memory, peak_memory if _RESET_PEAK else current_memory
+
+
+class _NullSpan(object):
+    """
+    Represents the span being returned while tracing is disabled.
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def add_rows(self, rows: int):
+        pass
+
+_NULL_SPAN = _NullSpan()
+
+class Span(object):
+    """
+    Represents one timed stage of the pipeline.
+    Spans being entered while another span is active are nested into it.
+    """
+    __slots__ = ("_tracer", "_name", "_path", "_rows", "_start_time", "_start_memory", "_peak_memory", "_child_duration")
+
+    def __init__(self, tracer, name: str, rows: int=None) -> None:
+        self._tracer = tracer
+        self._name = name
+        self._path = None
+        self._rows = rows
+        self._start_time = None
+        self._start_memory = 0
+        self._peak_memory = 0
+        self._child_duration = 0.0
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def path(self):
+        return self._path
+
+    def add_rows(self, rows: int):
+        """
+        Adds the number of processed rows.
+        """
+        self._rows = rows if None is self._rows else self._rows + rows
+
+    def __enter__(self):
+        self._tracer._enter(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._tracer._exit(self)
+        return False
+
+class Tracer(object):
+    """
+    Represents a tracer aggregating the nested spans of the pipeline stages by their path.
+    The traced memory and a sampling profiler are optional because both slow down the traced code.
+    """
+
+    def __init__(self, trace_memory: bool=False, profile: bool=False, profile_interval: float=0.005) -> None:
+        self._trace_memory = trace_memory
+        self._profile = profile
+        self._profile_interval = profile_interval
+        self._enabled = False
+        self._stacks = {}
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._samples = Counter()
+        self._profiled_thread_id = None
+        self._profiler_thread = None
+        self._profiler_stop = threading.Event()
+        self._started_tracemalloc = False
+
+    @property
+    def enabled(self) -> bool:
+        return self._enabled
+
+    def _stack(self) -> list:
+        # the stacks are keyed by thread so that the profiler can read the active span of another thread
+        return self._stacks.setdefault(threading.get_ident(), [])
+
+    def enable(self):
+        """
+        Enables tracing and starts the optional memory tracing and sampling profiler.
+        """
+        if self._enabled:
+            return self
+
+        if self._trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        if self._profile:
+            self._profiled_thread_id = threading.get_ident()
+            self._profiler_stop.clear()
+            self._profiler_thread = threading.Thread(target=self._sample, name="tracing-profiler", daemon=True)
+            self._profiler_thread.start()
+        self._enabled = True
+        return self
+
+    def disable(self):
+        """
+        Disables tracing and stops the memory tracing and sampling profiler.
+        """
+        if not self._enabled:
+            return self
+
+        self._enabled = False
+        if None is not self._profiler_thread:
+            self._profiler_stop.set()
+            self._profiler_thread.join()
+            self._profiler_thread = None
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+        return self
+
+    def clear(self):
+        """
+        Removes all recorded spans and samples.
+        """
+        with self._lock:
+            self._stages.clear()
+            self._samples.clear()
+        return self
+
+    def span(self, name: str, rows: int=None):
+        """
+        Returns a new span or a shared null span while tracing is disabled.
+        """
+        if not self._enabled:
+            return _NULL_SPAN
+        return Span(self, name, rows)
+
+    def _enter(self, span: Span):
+        stack = self._stack()
+        span._path = f"{stack[-1]._path}/{span._name}" if 0 < len(stack) else span._name
+        if self._trace_memory and tracemalloc.is_tracing():
+            current_memory, peak_memory = _traced_memory()
+            if 0 < len(stack):
+                stack[-1]._peak_memory = max(stack[-1]._peak_memory, peak_memory)
+            if _RESET_PEAK:
+                tracemalloc.reset_peak()
+            span._start_memory = current_memory
+            span._peak_memory = current_memory
+        stack.append(span)
+        span._start_time = time.perf_counter()
+
+    def _exit(self, span: Span):
+        duration = time.perf_counter() - span._start_time
+        stack = self._stack()
+        stack.pop()
+        peak_memory = 0
+        if self._trace_memory and tracemalloc.is_tracing():
+            span_peak_memory = max(span._peak_memory, _traced_memory()[1])
+            peak_memory = span_peak_memory - span._start_memory
+            if 0 < len(stack):
+                stack[-1]._peak_memory = max(stack[-1]._peak_memory, span_peak_memory)
+        if 0 < len(stack):
+            stack[-1]._child_duration += duration
+
+        with self._lock:
+            stage = self._stages.get(span._path)
+            if None is stage:
+                stage = self._stages[span._path] = {"calls": 0, "duration": 0.0, "self_duration": 0.0, "rows": None, "peak_memory": 0}
+            stage["calls"] += 1
+            stage["duration"] += duration
+            stage["self_duration"] += duration - span._child_duration
+            if None is not span._rows:
+                stage["rows"] = span._rows if None is stage["rows"] else stage["rows"] + span._rows
+            stage["peak_memory"] = max(stage["peak_memory"], peak_memory)
+
+    def _sample(self):
+        """
+        Samples the innermost function of the traced thread and attributes it to the active span.
+        """
+        while not self._profiler_stop.wait(self._profile_interval):
+            frame = sys._current_frames().get(self._profiled_thread_id)
+            if None is frame:
+                continue
+            stack = self._stacks.get(self._profiled_thread_id)
+            path = stack[-1]._path if stack else None
+            function = f"{frame.f_code.co_name} ({os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno})"
+            with self._lock:
+                self._samples[(path, function)] += 1
+
+    def summary(self, emissions: float=None) -> pd.DataFrame:
+        """
+        Returns the aggregated stages with their calls, durations, rows, rows per second and peak traced memory in bytes.
+        The emissions of a run are attributed to the stages by the share of their self duration.
+
+        :param float emissions: The emissions of the traced run in kg CO2 equivalent.
+        """
+        with self._lock:
+            stages_df = pd.DataFrame.from_dict(self._stages, orient="index")
+        if 0 == len(stages_df):
+            return pd.DataFrame(columns=["stage", "calls", "duration", "self_duration", "rows", "rows_per_second", "peak_memory"])
+
+        stages_df.index.name = "stage"
+        stages_df = stages_df.reset_index()
+        stages_df["rows_per_second"] = stages_df["rows"].astype("float64") / stages_df["duration"]
+        if None is not emissions:
+            total_self_duration = stages_df["self_duration"].sum()
+            stages_df["time_share"] = stages_df["self_duration"] / total_self_duration if 0 < total_self_duration else 0.0
+            stages_df["emissions"] = emissions * stages_df["time_share"]
+        return stages_df
+
+    def profile(self) -> pd.DataFrame:
+        """
+        Returns the number of profiler samples of every function per stage.
+        """
+        with self._lock:
+            samples = [(path, function, count) for (path, function), count in self._samples.items()]
+        profile_df = pd.DataFrame(samples, columns=["stage", "function", "samples"])
+        return profile_df.sort_values("samples", ascending=False, ignore_index=True)
+
+
+
+_default_tracer = Tracer()
+
+def get_tracer() -> Tracer:
+    """
+    Returns the tracer used by the pipeline stages.
+    """
+    return _default_tracer
+
+def enable_tracing(trace_memory: bool=False, profile: bool=False, profile_interval: float=0.005) -> Tracer:
+    """
+    Replaces the tracer used by the pipeline stages with a new enabled tracer.
+    """
+    global _default_tracer
+    _default_tracer.disable()
+    _default_tracer = Tracer(trace_memory, profile, profile_interval).enable()
+    return _default_tracer
+
+def disable_tracing() -> Tracer:
+    """
+    Disables the tracer used by the pipeline stages and returns it for summarizing.
+    """
+    return _default_tracer.disable()
+
+def span(name: str, rows: int=None):
+    """
+    Returns a span of the tracer used by the pipeline stages.
+    """
+    return _default_tracer.span(name, rows)
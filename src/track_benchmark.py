@@ -0,0 +1,92 @@
+import arcpy
+from configparser import ConfigParser
+import logging
+from measure.tools import MeasureTool
+import pandas as pd
+from patterns.tools import PatternsTool
+from spatialcarbon.benchmark import Benchmark, compare_benchmark, create_sqlite_samples, summarize_benchmark
+from traffic.read import read_sqlite_as_df, read_sqlite_to_featureclass, read_sqlite_as_featureclass, read_sqlite_as_featureclass_bulk
+
+# config.user anpassen
+
+workspace_dir = "/arcgis/home/traffic"
+select_statement = "SELECT * FROM agent_pos;"
+
+
+
+def read_sdf(traffic_filepath: str):
+    return int(arcpy.management.GetCount(read_sqlite_to_featureclass(traffic_filepath, select_statement))[0])
+
+def read_fc(traffic_filepath: str):
+    return int(arcpy.management.GetCount(read_sqlite_as_featureclass(traffic_filepath, select_statement))[0])
+
+def read_bulk(traffic_filepath: str):
+    return int(arcpy.management.GetCount(read_sqlite_as_featureclass_bulk(traffic_filepath, select_statement))[0])
+
+def read_df(traffic_filepath: str):
+    return read_sqlite_as_df(traffic_filepath, select_statement)
+
+def measure_cursor(traffic_filepath: str):
+    traffic_featureclass = read_sqlite_to_featureclass(traffic_filepath, select_statement)
+    MeasureTool().run(traffic_featureclass, workspace_dir)
+    return int(arcpy.management.GetCount(traffic_featureclass)[0])
+
+def measure_numpy(traffic_filepath: str):
+    traffic_featureclass = read_sqlite_to_featureclass(traffic_filepath, select_statement)
+    MeasureTool().run(traffic_featureclass, workspace_dir, engine="numpy")
+    return int(arcpy.management.GetCount(traffic_featureclass)[0])
+
+def patterns_arcpy(traffic_filepath: str):
+    traffic_featureclass = read_sqlite_to_featureclass(traffic_filepath, select_statement)
+    PatternsTool().run(traffic_featureclass, workspace_dir)
+    return int(arcpy.management.GetCount(traffic_featureclass)[0])
+
+def patterns_numpy(traffic_filepath: str):
+    traffic_featureclass = read_sqlite_to_featureclass(traffic_filepath, select_statement)
+    PatternsTool().run(traffic_featureclass, workspace_dir, engine="numpy")
+    return int(arcpy.management.GetCount(traffic_featureclass)[0])
+
+def create_benchmarks(sample_filepaths: dict, repetitions: int=5):
+    read_benchmark = Benchmark("Urban Digital Twin Bonn - Read", repetitions=repetitions)
+    read_benchmark.add_variant("SDF", read_sdf).add_variant("InsertCursor", read_fc).add_variant("NumPy", read_bulk).add_variant("DataFrame", read_df)
+
+    measure_benchmark = Benchmark("Urban Digital Twin Bonn - Measure", repetitions=repetitions)
+    measure_benchmark.add_variant("Cursor", measure_cursor).add_variant("NumPy", measure_numpy)
+
+    patterns_benchmark = Benchmark("Urban Digital Twin Bonn - Patterns", repetitions=repetitions)
+    patterns_benchmark.add_variant("ArcPy", patterns_arcpy).add_variant("NumPy", patterns_numpy)
+
+    benchmarks = [read_benchmark, measure_benchmark, patterns_benchmark]
+    for size, sample_filepath in sample_filepaths.items():
+        for benchmark in benchmarks:
+            benchmark.add_dataset(f"{size} rows", sample_filepath, size)
+    return benchmarks
+
+
+
+if __name__=="__main__":
+    logging.basicConfig()
+    logger = logging.getLogger("codecarbon")
+    
+    config = ConfigParser()
+    config.read("src/config.user")
+    
+    try:
+        traffic_file_path = config["DEFAULT"]["TrafficFilePath"]
+        if None is traffic_file_path:
+            raise ValueError("Traffic file path not specified!")
+
+        sample_filepaths = create_sqlite_samples(traffic_file_path, "log/benchmark", [10000, 100000, 1000000])
+        results = []
+        for benchmark in create_benchmarks(sample_filepaths):
+            results.append(benchmark.run())
+
+        results_df = pd.concat(results, ignore_index=True)
+        results_df.to_csv("log/benchmark-results.user", index=False)
+        summary_df = summarize_benchmark(results_df)
+        summary_df.to_csv("log/benchmark-summary.user", index=False)
+        for line in compare_benchmark(summary_df):
+            logging.getLogger("codecarbon").info(line)
+
+    except Exception as ex:
+        logging.getLogger("codecarbon").error(ex)
@@ -1,9 +1,11 @@
-from codecarbon import track_emissions
+from codecarbon import OfflineEmissionsTracker, track_emissions
 from configparser import ConfigParser
 from glob import glob
 import logging
+from measure.streaming import measure_sqlite_to_sink
 from measure.tools import MeasureTool
 import os
+from spatialcarbon.tracing import disable_tracing, enable_tracing, span
 from traffic.read import read_sqlite_to_featureclass
 
 # config.user anpassen
@@ -17,6 +19,31 @@ def track_measure(traffic_filepath: str):
     measure_tool.run(traffic_featureclass, workspace_dir)
     #MeasureTool.run(traffic_featureclass)
 
+def track_measure_stages(traffic_filepath: str, engine: str="cursor"):
+    tracer = enable_tracing(trace_memory=True, profile=True)
+    tracker = OfflineEmissionsTracker(project_name="Urban Digital Twin Bonn - Measure Stages", output_file="log/emissions-measure.user", country_iso_code="USA")
+    tracker.start()
+    try:
+        with span("track_measure"):
+            traffic_featureclass = read_sqlite_to_featureclass(traffic_filepath, "SELECT * FROM agent_pos;")
+            workspace_dir = "/arcgis/home/traffic"
+
+            measure_tool = MeasureTool()
+            measure_tool.run(traffic_featureclass, workspace_dir, engine)
+    finally:
+        emissions = tracker.stop()
+        disable_tracing()
+
+    # Emissions per stage by time share
+    tracer.summary(emissions).to_csv("log/trace-measure.user", index=False)
+    tracer.profile().to_csv("log/profile-measure.user", index=False)
+    return tracer
+
+@track_emissions(project_name="Urban Digital Twin Bonn - Measure Streaming", output_file="log/emissions-measure.user", offline=True, country_iso_code="USA")
+def track_measure_streaming(traffic_filepath: str):
+    # Constant memory, the enriched rows are written into the traffic_measured table
+    measure_sqlite_to_sink(traffic_filepath)
+
 
 
 if __name__=="__main__":
@@ -32,6 +59,8 @@ if __name__=="__main__":
             raise ValueError("Traffic file path not specified!")
         
         track_measure(traffic_file_path)
+        track_measure_stages(traffic_file_path)
+        track_measure_streaming(traffic_file_path)
 
     except Exception as ex:
         logging.getLogger("codecarbon").error(ex)
\ No newline at end of file
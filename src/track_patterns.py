@@ -16,6 +16,14 @@ def track_patterns():
     patterns_tool = PatternsTool()
     patterns_tool.run(traffic_featureclass, workspace_dir)
 
+@track_emissions(project_name="Urban Digital Twin Bonn - Patterns Native", output_file="log/emissions-patterns.user", offline=True, country_iso_code="USA")
+def track_patterns_native():
+    traffic_featureclass = "traffic_data"
+    workspace_dir = "/arcgis/home/traffic"
+    
+    patterns_tool = PatternsTool()
+    patterns_tool.run(traffic_featureclass, workspace_dir, engine="numpy")
+
 
 
 if __name__=="__main__":
@@ -24,6 +32,7 @@ if __name__=="__main__":
     
     try:
         track_patterns()
+        track_patterns_native()
 
     except Exception as ex:
         logging.getLogger("codecarbon").error(ex)
\ No newline at end of file
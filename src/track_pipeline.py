@@ -0,0 +1,40 @@
+from codecarbon import track_emissions
+from configparser import ConfigParser
+import logging
+from pipeline.stages import create_traffic_pipeline
+
+# config.user anpassen
+
+@track_emissions(project_name="Urban Digital Twin Bonn - Pipeline", output_file="log/emissions-pipeline.user", offline=True, country_iso_code="USA")
+def track_pipeline(traffic_filepath: str):
+    pipeline = create_traffic_pipeline(traffic_filepath, "log/artifacts")
+    pipeline.run()
+    return pipeline
+
+@track_emissions(project_name="Urban Digital Twin Bonn - Pipeline Patterns", output_file="log/emissions-pipeline.user", offline=True, country_iso_code="USA")
+def track_pipeline_patterns(traffic_filepath: str, distance_interval: int=100):
+    # Only the pattern stages are executed, read and measure are taken from the artifacts
+    pipeline = create_traffic_pipeline(traffic_filepath, "log/artifacts", distance_interval=distance_interval)
+    pipeline.run()
+    return pipeline
+
+
+
+if __name__=="__main__":
+    logging.basicConfig()
+    logger = logging.getLogger("codecarbon")
+    logger.setLevel(logging.INFO)
+    
+    config = ConfigParser()
+    config.read("src/config.user")
+    
+    try:
+        traffic_file_path = config["DEFAULT"]["TrafficFilePath"]
+        if None is traffic_file_path:
+            raise ValueError("Traffic file path not specified!")
+        
+        track_pipeline(traffic_file_path).report().to_csv("log/pipeline.user", index=False)
+        track_pipeline_patterns(traffic_file_path).report().to_csv("log/pipeline-patterns.user", index=False)
+
+    except Exception as ex:
+        logging.getLogger("codecarbon").error(ex)
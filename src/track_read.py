@@ -4,7 +4,7 @@ from glob import glob
 import logging
 from measure.tools import MeasureTool
 import os
-from traffic.read import read_sqlite_to_featureclass, read_sqlite_as_featureclass
+from traffic.read import create_traffic_indexes, read_sqlite_to_featureclass, read_sqlite_as_featureclass, read_sqlite_as_featureclass_bulk, TrafficQuery
 
 
 
@@ -16,6 +16,16 @@ def track_read_sdf(traffic_filepath: str):
 def track_read_fc(traffic_filepath: str):
     read_sqlite_as_featureclass(traffic_filepath, "SELECT * FROM agent_pos;")
 
+@track_emissions(project_name="Urban Digital Twin Bonn - Read Bulk", output_file="log/emissions-read.user", offline=True, country_iso_code="USA")
+def track_read_bulk(traffic_filepath: str):
+    read_sqlite_as_featureclass_bulk(traffic_filepath, "SELECT * FROM agent_pos;")
+
+@track_emissions(project_name="Urban Digital Twin Bonn - Read Query", output_file="log/emissions-read.user", offline=True, country_iso_code="USA")
+def track_read_query(traffic_filepath: str):
+    # Only the morning rush hour in the city center crosses the sqlite boundary
+    traffic_query = TrafficQuery(start_time="2023-07-07T07:00:00", end_time="2023-07-07T09:00:00", bbox=(7.08, 50.72, 7.12, 50.75))
+    read_sqlite_as_featureclass_bulk(traffic_filepath, traffic_query)
+
 
 
 if __name__=="__main__":
@@ -32,6 +42,9 @@ if __name__=="__main__":
         
         track_read_sdf(traffic_file_path)
         track_read_fc(traffic_file_path)
+        track_read_bulk(traffic_file_path)
+        create_traffic_indexes(traffic_file_path)
+        track_read_query(traffic_file_path)
 
     except Exception as ex:
         logging.getLogger("codecarbon").error(ex)
\ No newline at end of file
@@ -0,0 +1,145 @@
+import hashlib
+import os
+import pandas as pd
+import pyarrow as pa
+
+_CACHE_VERSION = 2
+_CACHE_SUFFIX = ".arrow"
+
+
+
+def file_digest(filepath: str, block_size: int=1 << 20) -> str:
+    """
+    Returns the SHA-256 hex digest of the file content.
+    The digest is memoized per path, size and modification time, so unchanged files are hashed only once per process.
+
+    :param str filepath:    The input file.
+    :param int block_size:  The number of bytes being read at once.
+    """
+    file_stat = os.stat(filepath)
+    memo_key = (os.path.abspath(filepath), file_stat.st_size, file_stat.st_mtime_ns)
+    digest = _file_digests.get(memo_key)
+    if None is digest:
+        file_hash = hashlib.sha256()
+        with open(filepath, "rb") as in_stream:
+            for block in iter(lambda: in_stream.read(block_size), b""):
+                file_hash.update(block)
+        digest = file_hash.hexdigest()
+        _file_digests[memo_key] = digest
+    return digest
+
+_file_digests = {}
+
+
+class TrafficCache(object):
+    """
+    Represents an on-disk cache of parsed traffic tables.
+    Every table is keyed on the content hash of its input file and the reader arguments
+    and stored as Arrow IPC file, which is loaded back memory-mapped.
+    The least recently used tables are evicted when the cache exceeds its maximum size.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int=2 * 1024 ** 3) -> None:
+        self._cache_dir = cache_dir
+        self._max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @property
+    def cache_dir(self):
+        return self._cache_dir
+
+    @property
+    def max_bytes(self):
+        return self._max_bytes
+
+    def create_key(self, filepath: str, *arguments) -> str:
+        """
+        Returns the cache key of an input file and the reader arguments e.g. the SQL statement or the column names.
+        """
+        key_hash = hashlib.sha256(file_digest(filepath).encode("ascii"))
+        key_hash.update(repr((_CACHE_VERSION,) + arguments).encode("utf8"))
+        return key_hash.hexdigest()
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self._cache_dir, f"{key}{_CACHE_SUFFIX}")
+
+    def load(self, key: str):
+        """
+        Returns the cached table as dataframe or None if the key is not cached.
+        """
+        entry_path = self._entry_path(key)
+        if not os.path.exists(entry_path):
+            return None
+
+        # mark the entry as recently used
+        os.utime(entry_path)
+        with pa.memory_map(entry_path, "r") as source:
+            table = pa.ipc.open_file(source).read_all()
+        return table.to_pandas(split_blocks=True)
+
+    def store(self, key: str, traffic_df: pd.DataFrame) -> str:
+        """
+        Stores the dataframe and evicts the least recently used entries if the cache is too large.
+        """
+        entry_path = self._entry_path(key)
+        temp_path = f"{entry_path}.{os.getpid()}.tmp"
+        table = pa.Table.from_pandas(traffic_df, preserve_index=False)
+        with pa.OSFile(temp_path, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(temp_path, entry_path)
+        self.evict()
+        return entry_path
+
+    def get_or_create(self, filepath: str, arguments: tuple, create_df):
+        """
+        Returns the cached table or creates, caches and returns it.
+
+        :param str filepath:    The input file.
+        :param tuple arguments: The reader arguments being part of the key.
+        :param create_df:       The function parsing the input file.
+        """
+        key = self.create_key(filepath, *arguments)
+        traffic_df = self.load(key)
+        if None is traffic_df:
+            traffic_df = create_df()
+            self.store(key, traffic_df)
+        return traffic_df
+
+    def info(self) -> pd.DataFrame:
+        """
+        Returns the cache entries with their size and last access ordered by the last access.
+        """
+        entries = []
+        for entry_name in os.listdir(self._cache_dir):
+            if entry_name.endswith(_CACHE_SUFFIX):
+                entry_stat = os.stat(os.path.join(self._cache_dir, entry_name))
+                entries.append((entry_name[:-len(_CACHE_SUFFIX)], entry_stat.st_size, pd.Timestamp(entry_stat.st_mtime, unit="s")))
+        entries_df = pd.DataFrame(entries, columns=["key", "size_bytes", "last_access"])
+        return entries_df.sort_values(by="last_access", ascending=False, ignore_index=True)
+
+    def evict(self, max_bytes: int=None) -> int:
+        """
+        Deletes the least recently used entries until the cache fits into the maximum size.
+        Returns the number of deleted entries.
+        """
+        if None is max_bytes:
+            max_bytes = self._max_bytes
+
+        entries_df = self.info()
+        cache_bytes = entries_df["size_bytes"].sum()
+        evicted_count = 0
+        for entry in entries_df[::-1].itertuples():
+            if cache_bytes <= max_bytes:
+                break
+
+            os.remove(self._entry_path(entry.key))
+            cache_bytes -= entry.size_bytes
+            evicted_count += 1
+        return evicted_count
+
+    def clear(self) -> int:
+        """
+        Deletes all entries.
+        """
+        return self.evict(max_bytes=0)
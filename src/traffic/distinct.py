@@ -0,0 +1,214 @@
+import numpy as np
+import pandas as pd
+from traffic.schema import apply_traffic_schema
+
+
+
+def _bit_length(values: np.ndarray) -> np.ndarray:
+    """
+    Returns the number of significant bits of unsigned 64-bit integers.
+    """
+    values = values.copy()
+    bit_lengths = np.zeros(values.shape, dtype=np.uint8)
+    for shift in (32, 16, 8, 4, 2, 1):
+        shift_mask = values >= np.uint64(1 << shift)
+        bit_lengths[shift_mask] += shift
+        values[shift_mask] >>= np.uint64(shift)
+    bit_lengths += (values > 0).astype(np.uint8)
+    return bit_lengths
+
+def _distinct_values(values) -> np.ndarray:
+    """
+    Returns the values without missing values, integral floats e.g. of a person column having missing values become integers again.
+    """
+    values = pd.Series(values).dropna().to_numpy()
+    if np.issubdtype(values.dtype, np.floating) and np.isfinite(values).all() and (values == np.floor(values)).all():
+        values = values.astype(np.int64)
+    return values
+
+
+class ExactDistinctCounter(object):
+    """
+    Counts distinct values exactly.
+    Small non-negative integers like person ids are collected in a bitmap, any other values in a set.
+    """
+
+    def __init__(self, max_bitmap_size: int=1 << 27) -> None:
+        self._bitmap = np.zeros(0, dtype=bool)
+        self._values = set()
+        self._max_bitmap_size = max_bitmap_size
+
+    def add(self, values):
+        values = _distinct_values(values)
+        if 0 == values.size:
+            return self
+
+        if np.issubdtype(values.dtype, np.integer) and 0 <= values.min() and values.max() < self._max_bitmap_size:
+            if self._bitmap.size <= values.max():
+                self._grow(int(values.max()) + 1)
+            self._bitmap[values] = True
+        else:
+            self._values.update(values.tolist())
+        return self
+
+    def _grow(self, size: int):
+        bitmap = np.zeros(min(max(size, 2 * self._bitmap.size), self._max_bitmap_size), dtype=bool)
+        bitmap[:self._bitmap.size] = self._bitmap
+        self._bitmap = bitmap
+
+    def merge(self, other):
+        if self._bitmap.size < other._bitmap.size:
+            self._grow(other._bitmap.size)
+        self._bitmap[:other._bitmap.size] |= other._bitmap
+        self._values.update(other._values)
+        return self
+
+    def count(self) -> int:
+        bitmap_values = np.flatnonzero(self._bitmap)
+        # integers might have been collected as set values too
+        return int(bitmap_values.size) + len(self._values.difference(bitmap_values.tolist()))
+
+    def __len__(self):
+        return self.count()
+
+
+class HyperLogLogCounter(object):
+    """
+    Estimates the number of distinct values using a HyperLogLog sketch of 2^precision registers.
+    The relative standard error of the estimate is 1.04 / sqrt(2^precision) e.g. 0.81 % for precision 14.
+    Sketches of the same precision can be merged across files, processes and time buckets.
+    """
+
+    def __init__(self, precision: int=14) -> None:
+        if precision < 4 or 18 < precision:
+            raise ValueError("The precision must be between 4 and 18!")
+
+        self._precision = precision
+        self._registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    @property
+    def precision(self):
+        return self._precision
+
+    @property
+    def relative_error(self) -> float:
+        return 1.04 / np.sqrt(self._registers.size)
+
+    def add(self, values):
+        values = _distinct_values(values)
+        if 0 == values.size:
+            return self
+
+        hashes = pd.util.hash_array(values)
+        rest_bits = 64 - self._precision
+        register_indices = (hashes >> np.uint64(rest_bits)).astype(np.intp)
+        rest_hashes = hashes & np.uint64((1 << rest_bits) - 1)
+        # position of the leftmost one bit within the remaining bits
+        ranks = (rest_bits + 1 - _bit_length(rest_hashes)).astype(np.uint8)
+        np.maximum.at(self._registers, register_indices, ranks)
+        return self
+
+    def merge(self, other):
+        if self._precision != other._precision:
+            raise ValueError("Only sketches having the same precision can be merged!")
+
+        np.maximum(self._registers, other._registers, out=self._registers)
+        return self
+
+    def count(self) -> int:
+        register_count = self._registers.size
+        alpha = 0.7213 / (1 + 1.079 / register_count)
+        estimate = alpha * register_count ** 2 / np.sum(np.ldexp(1.0, -self._registers.astype(np.int64)))
+        empty_registers = np.count_nonzero(0 == self._registers)
+        if estimate <= 2.5 * register_count and 0 < empty_registers:
+            # linear counting for small cardinalities
+            estimate = register_count * np.log(register_count / empty_registers)
+        return int(round(estimate))
+
+    def __len__(self):
+        return self.count()
+
+
+def create_distinct_counter(mode: str="exact", precision: int=14):
+    """
+    Creates a distinct counter.
+
+    :param str mode:        The mode "exact" or "hll" (HyperLogLog).
+    :param int precision:   The HyperLogLog precision.
+    """
+    if "exact" == mode:
+        return ExactDistinctCounter()
+    if "hll" == mode:
+        return HyperLogLogCounter(precision)
+    raise ValueError(f"Unknown distinct count mode {mode}!")
+
+
+class BucketedDistinctCounter(object):
+    """
+    Counts distinct values per time bucket e.g. unique persons per hour.
+    The buckets of different counters are merged bucket by bucket.
+    """
+
+    def __init__(self, frequency: str="1h", mode: str="exact", precision: int=14) -> None:
+        self._frequency = frequency
+        self._mode = mode
+        self._precision = precision
+        self._counters = {}
+
+    def add(self, values, times):
+        bucket_series = pd.Series(pd.to_datetime(times)).dt.floor(self._frequency)
+        for bucket, bucket_values in pd.Series(np.asarray(values)).groupby(bucket_series.to_numpy()):
+            self._counter(bucket).add(bucket_values.to_numpy())
+        return self
+
+    def _counter(self, bucket):
+        counter = self._counters.get(bucket)
+        if None is counter:
+            counter = create_distinct_counter(self._mode, self._precision)
+            self._counters[bucket] = counter
+        return counter
+
+    def merge(self, other):
+        for bucket, counter in other._counters.items():
+            self._counter(bucket).merge(counter)
+        return self
+
+    def counts(self) -> pd.Series:
+        """
+        Returns the distinct count per time bucket.
+        """
+        buckets = sorted(self._counters)
+        return pd.Series([self._counters[bucket].count() for bucket in buckets], index=pd.DatetimeIndex(buckets, name="bucket"), name="distinct_count", dtype=np.int64)
+
+    def total(self):
+        """
+        Returns the counter of all time buckets.
+        """
+        total_counter = create_distinct_counter(self._mode, self._precision)
+        for counter in self._counters.values():
+            total_counter.merge(counter)
+        return total_counter
+
+
+def count_distinct_csv(filepath: str, column: str="person", mode: str="exact", precision: int=14, time_column: str=None, frequency: str="1h", chunk_size: int=1000000):
+    """
+    Counts the distinct values of one column by reading only the needed columns chunk by chunk.
+    Returns a distinct counter or a bucketed distinct counter if a time column is specified.
+
+    :param str filepath:    The traffic file.
+    :param str column:      The column being counted.
+    :param str mode:        The mode "exact" or "hll" (HyperLogLog).
+    :param int precision:   The HyperLogLog precision.
+    :param str time_column: The optional time column for counting per time bucket e.g. "trip_time".
+    :param str frequency:   The time bucket frequency e.g. "1h".
+    :param int chunk_size:  The number of rows being read at once.
+    """
+    use_columns = [column] if None is time_column else [column, time_column]
+    counter = create_distinct_counter(mode, precision) if None is time_column else BucketedDistinctCounter(frequency, mode, precision)
+    for chunk_df in pd.read_csv(filepath, usecols=use_columns, chunksize=chunk_size):
+        chunk_df = apply_traffic_schema(chunk_df)
+        if None is time_column:
+            counter.add(chunk_df[column].to_numpy())
+        else:
+            counter.add(chunk_df[column].to_numpy(), chunk_df[time_column])
+    return counter
@@ -0,0 +1,192 @@
+from measure.geodesic import geodesic_inverse
+import numpy as np
+import os
+from traffic.proximity import PointOfInterest
+
+_INDEX_VERSION = 2
+_METERS_PER_DEGREE_LATITUDE = 111132.954
+_METERS_PER_DEGREE_LONGITUDE = 111319.491
+
+
+
+class GridIndex(object):
+    """
+    Represents a spatial index bucketing point locations into a uniform grid of cells.
+    Only the occupied cells are stored, the points are ordered by cell, so that every grid row of a query window is one contiguous slice.
+    The cell size in meters is converted into degrees at the mean latitude of the points.
+    Points having invalid coordinates are not indexed.
+    Bounding box, radius and k nearest neighbor queries return row indices into the indexed arrays.
+    """
+
+    def __init__(self, longitude, latitude, cell_size: float=100.0, source_digest: str=None) -> None:
+        self._longitude = np.ascontiguousarray(longitude, dtype=np.float64)
+        self._latitude = np.ascontiguousarray(latitude, dtype=np.float64)
+        self._cell_size = float(cell_size)
+        self._source_digest = source_digest
+        with np.errstate(invalid="ignore"):
+            valid = (np.abs(self._longitude) <= 180.0) & (np.abs(self._latitude) <= 90.0)
+        valid_points = np.flatnonzero(valid)
+        if 0 == valid_points.size:
+            self._origin = (0.0, 0.0)
+            self._cell_degrees = (1.0, 1.0)
+            self._shape = (1, 1)
+        else:
+            valid_longitude, valid_latitude = self._longitude[valid_points], self._latitude[valid_points]
+            mean_latitude = float(np.mean(valid_latitude))
+            self._origin = (float(valid_longitude.min()), float(valid_latitude.min()))
+            self._cell_degrees = (self._cell_size / (_METERS_PER_DEGREE_LONGITUDE * np.cos(np.radians(min(abs(mean_latitude), 89.9)))),
+                                  self._cell_size / _METERS_PER_DEGREE_LATITUDE)
+            self._shape = (int((valid_latitude.max() - self._origin[1]) // self._cell_degrees[1]) + 1,
+                           int((valid_longitude.max() - self._origin[0]) // self._cell_degrees[0]) + 1)
+
+        point_cell_ids = self._cell_ids(self._longitude[valid_points], self._latitude[valid_points])
+        cell_order = np.argsort(point_cell_ids, kind="stable")
+        self._order = valid_points[cell_order]
+        # the points of the occupied cell i are located between offsets[i] and offsets[i + 1]
+        self._cell_ids, cell_starts = np.unique(point_cell_ids[cell_order], return_index=True)
+        self._offsets = np.append(cell_starts, valid_points.size).astype(np.int64)
+
+    @property
+    def cell_size(self):
+        return self._cell_size
+
+    @property
+    def source_digest(self):
+        return self._source_digest
+
+    def __len__(self):
+        return self._longitude.size
+
+    def _cell_ids(self, longitude, latitude):
+        rows, columns = self._cells(longitude, latitude)
+        return rows * self._shape[1] + columns
+
+    def _cells(self, longitude, latitude):
+        columns = np.clip(((longitude - self._origin[0]) // self._cell_degrees[0]).astype(np.int64), 0, self._shape[1] - 1)
+        rows = np.clip(((latitude - self._origin[1]) // self._cell_degrees[1]).astype(np.int64), 0, self._shape[0] - 1)
+        return rows, columns
+
+    def _window_ranges(self, min_row: int, max_row: int, min_column: int, max_column: int):
+        """
+        Returns the start and end positions of the occupied cells of every grid row of the window.
+        """
+        min_row, min_column = max(min_row, 0), max(min_column, 0)
+        max_row, max_column = min(max_row, self._shape[0] - 1), min(max_column, self._shape[1] - 1)
+        if max_row < min_row or max_column < min_column:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+        row_ids = np.arange(min_row, max_row + 1, dtype=np.int64) * self._shape[1]
+        starts = self._offsets[np.searchsorted(self._cell_ids, row_ids + min_column)]
+        ends = self._offsets[np.searchsorted(self._cell_ids, row_ids + max_column + 1)]
+        return starts, ends
+
+    def _window(self, min_row: int, max_row: int, min_column: int, max_column: int) -> np.ndarray:
+        starts, ends = self._window_ranges(min_row, max_row, min_column, max_column)
+        lengths = ends - starts
+        occupied = 0 < lengths
+        starts, lengths = starts[occupied], lengths[occupied]
+        positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        return self._order[positions]
+
+    def _window_count(self, min_row: int, max_row: int, min_column: int, max_column: int) -> int:
+        starts, ends = self._window_ranges(min_row, max_row, min_column, max_column)
+        return int((ends - starts).sum())
+
+    def _window_of_box(self, min_longitude: float, min_latitude: float, max_longitude: float, max_latitude: float) -> np.ndarray:
+        min_column = int((min_longitude - self._origin[0]) // self._cell_degrees[0])
+        max_column = int((max_longitude - self._origin[0]) // self._cell_degrees[0])
+        min_row = int((min_latitude - self._origin[1]) // self._cell_degrees[1])
+        max_row = int((max_latitude - self._origin[1]) // self._cell_degrees[1])
+        # points outside of the grid were clipped into the border cells
+        if max_column < 0 or max_row < 0 or self._shape[1] <= min_column or self._shape[0] <= min_row:
+            return np.zeros(0, dtype=np.int64)
+        return self._window(min_row, max_row, min_column, max_column)
+
+    def query_bbox(self, min_longitude: float, min_latitude: float, max_longitude: float, max_latitude: float) -> np.ndarray:
+        """
+        Returns the ascending row indices of all points within the bounding box in degrees.
+        """
+        candidates = self._window_of_box(min_longitude, min_latitude, max_longitude, max_latitude)
+        candidate_longitude = self._longitude[candidates]
+        candidate_latitude = self._latitude[candidates]
+        inside = ((min_longitude <= candidate_longitude) & (candidate_longitude <= max_longitude)
+                  & (min_latitude <= candidate_latitude) & (candidate_latitude <= max_latitude))
+        return np.sort(candidates[inside])
+
+    def query_radius(self, longitude: float, latitude: float, radius: float) -> np.ndarray:
+        """
+        Returns the ascending row indices of all points within the geodesic radius in meters.
+        """
+        candidates = self._window_of_box(*PointOfInterest(None, longitude, latitude, radius).bounding_box())
+        _, distance = geodesic_inverse(longitude, latitude, self._longitude[candidates], self._latitude[candidates])
+        return np.sort(candidates[distance <= radius])
+
+    def query_nearest(self, longitude: float, latitude: float, k: int=1):
+        """
+        Returns the row indices and geodesic distances in meters of the k nearest points ordered by distance.
+        The search grows ring by ring around the cell of the location until the k-th distance is covered.
+        """
+        k = min(k, self._order.size)
+        if k < 1:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+
+        # the cell of the location might be outside of the grid
+        column = int((longitude - self._origin[0]) // self._cell_degrees[0])
+        row = int((latitude - self._origin[1]) // self._cell_degrees[1])
+        # the smallest cell extent in meters bounds the distance covered by the rings
+        max_latitude = max(abs(self._origin[1]), abs(self._origin[1] + self._shape[0] * self._cell_degrees[1]))
+        min_cell_meters = min(self._cell_degrees[0] * _METERS_PER_DEGREE_LONGITUDE * 0.99 * np.cos(np.radians(min(max_latitude, 89.9))),
+                              self._cell_degrees[1] * 110574.0)
+        max_ring = max(row, self._shape[0] - 1 - row, column, self._shape[1] - 1 - column)
+        # the rings double around the cell of the location until they contain k points
+        ring = 0
+        while ring < max_ring and self._window_count(row - ring, row + ring, column - ring, column + ring) < k:
+            ring = min(max_ring, max(1, 2 * ring))
+        while True:
+            candidates = self._window(row - ring, row + ring, column - ring, column + ring)
+            _, distance = geodesic_inverse(longitude, latitude, self._longitude[candidates], self._latitude[candidates])
+            nearest = np.argsort(distance, kind="stable")[:k]
+            if max_ring <= ring or distance[nearest[-1]] <= ring * min_cell_meters:
+                return candidates[nearest], distance[nearest]
+            # the k-th candidate might be beaten by points of the next rings
+            ring = min(max_ring, max(ring + 1, int(np.ceil(distance[nearest[-1]] / min_cell_meters))))
+
+    def save(self, index_filepath: str):
+        """
+        Serializes the index as uncompressed numpy archive.
+        """
+        with open(index_filepath, "wb") as out_stream:
+            np.savez(out_stream, version=_INDEX_VERSION, longitude=self._longitude, latitude=self._latitude,
+                     cell_size=self._cell_size, source_digest="" if None is self._source_digest else self._source_digest,
+                     origin=self._origin, cell_degrees=self._cell_degrees, shape=self._shape,
+                     order=self._order, cell_ids=self._cell_ids, offsets=self._offsets)
+        return index_filepath
+
+    @classmethod
+    def load(cls, index_filepath: str, source_digest: str=None, cell_size: float=None):
+        """
+        Deserializes the index or returns None if it does not exist or does not match the source digest and cell size.
+        """
+        if not os.path.exists(index_filepath):
+            return None
+
+        with np.load(index_filepath) as archive:
+            if _INDEX_VERSION != int(archive["version"]):
+                return None
+            if None is not source_digest and source_digest != str(archive["source_digest"]):
+                return None
+            if None is not cell_size and float(cell_size) != float(archive["cell_size"]):
+                return None
+
+            index = cls.__new__(cls)
+            index._longitude = archive["longitude"]
+            index._latitude = archive["latitude"]
+            index._cell_size = float(archive["cell_size"])
+            index._source_digest = str(archive["source_digest"]) or None
+            index._origin = tuple(archive["origin"].tolist())
+            index._cell_degrees = tuple(archive["cell_degrees"].tolist())
+            index._shape = tuple(archive["shape"].tolist())
+            index._order = archive["order"]
+            index._cell_ids = archive["cell_ids"]
+            index._offsets = archive["offsets"]
+        return index
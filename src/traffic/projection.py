@@ -0,0 +1,144 @@
+from functools import lru_cache
+import numpy as np
+
+# GRS 1980 ellipsoid of ETRS89, WGS 84 differs by less than a millimeter in UTM coordinates
+GRS80_SEMI_MAJOR_AXIS = 6378137.0
+GRS80_FLATTENING = 1 / 298.257222101
+
+
+
+class TransverseMercator(object):
+    """
+    Represents a transverse Mercator projection using the Krüger series of sixth order in the third flattening.
+    The series is accurate to a few millimeters within 3900 kilometers of the central meridian.
+    """
+
+    def __init__(self, central_meridian: float, scale_factor: float=0.9996, false_easting: float=500000.0, false_northing: float=0.0,
+                 semi_major_axis: float=GRS80_SEMI_MAJOR_AXIS, flattening: float=GRS80_FLATTENING) -> None:
+        self._central_meridian = central_meridian
+        self._scale_factor = scale_factor
+        self._false_easting = false_easting
+        self._false_northing = false_northing
+
+        n = flattening / (2 - flattening)
+        self._eccentricity = np.sqrt(flattening * (2 - flattening))
+        self._rectifying_radius = semi_major_axis / (1 + n) * (1 + n ** 2 / 4 + n ** 4 / 64 + n ** 6 / 256)
+        self._alpha = np.array([
+            n / 2 - 2 * n ** 2 / 3 + 5 * n ** 3 / 16 + 41 * n ** 4 / 180 - 127 * n ** 5 / 288 + 7891 * n ** 6 / 37800,
+            13 * n ** 2 / 48 - 3 * n ** 3 / 5 + 557 * n ** 4 / 1440 + 281 * n ** 5 / 630 - 1983433 * n ** 6 / 1935360,
+            61 * n ** 3 / 240 - 103 * n ** 4 / 140 + 15061 * n ** 5 / 26880 + 167603 * n ** 6 / 181440,
+            49561 * n ** 4 / 161280 - 179 * n ** 5 / 168 + 6601661 * n ** 6 / 7257600,
+            34729 * n ** 5 / 80640 - 3418889 * n ** 6 / 1995840,
+            212378941 * n ** 6 / 319334400])
+        self._beta = np.array([
+            n / 2 - 2 * n ** 2 / 3 + 37 * n ** 3 / 96 - n ** 4 / 360 - 81 * n ** 5 / 512 + 96199 * n ** 6 / 604800,
+            n ** 2 / 48 + n ** 3 / 15 - 437 * n ** 4 / 1440 + 46 * n ** 5 / 105 - 1118711 * n ** 6 / 3870720,
+            17 * n ** 3 / 480 - 37 * n ** 4 / 840 - 209 * n ** 5 / 4480 + 5569 * n ** 6 / 90720,
+            4397 * n ** 4 / 161280 - 11 * n ** 5 / 504 - 830251 * n ** 6 / 7257600,
+            4583 * n ** 5 / 161280 - 108847 * n ** 6 / 3991680,
+            20648693 * n ** 6 / 638668800])
+
+    def forward(self, longitude, latitude):
+        """
+        Returns the projected x and y coordinates in meters of longitudes and latitudes in degrees.
+        """
+        latitude = np.radians(np.asarray(latitude, dtype=np.float64))
+        delta_longitude = np.radians(np.asarray(longitude, dtype=np.float64) - self._central_meridian)
+
+        # tangent of the conformal latitude
+        sin_latitude = np.sin(latitude)
+        tau = np.sinh(np.arctanh(sin_latitude) - self._eccentricity * np.arctanh(self._eccentricity * sin_latitude))
+        xi_prime = np.arctan2(tau, np.cos(delta_longitude))
+        eta_prime = np.arctanh(np.sin(delta_longitude) / np.sqrt(1 + tau ** 2))
+
+        xi = xi_prime.copy()
+        eta = eta_prime.copy()
+        for order, alpha in enumerate(self._alpha, start=1):
+            xi += alpha * np.sin(2 * order * xi_prime) * np.cosh(2 * order * eta_prime)
+            eta += alpha * np.cos(2 * order * xi_prime) * np.sinh(2 * order * eta_prime)
+
+        x = self._false_easting + self._scale_factor * self._rectifying_radius * eta
+        y = self._false_northing + self._scale_factor * self._rectifying_radius * xi
+        return x, y
+
+    def inverse(self, x, y, iterations: int=5):
+        """
+        Returns the longitudes and latitudes in degrees of projected x and y coordinates in meters.
+        """
+        xi = (np.asarray(y, dtype=np.float64) - self._false_northing) / (self._scale_factor * self._rectifying_radius)
+        eta = (np.asarray(x, dtype=np.float64) - self._false_easting) / (self._scale_factor * self._rectifying_radius)
+
+        xi_prime = xi.copy()
+        eta_prime = eta.copy()
+        for order, beta in enumerate(self._beta, start=1):
+            xi_prime -= beta * np.sin(2 * order * xi) * np.cosh(2 * order * eta)
+            eta_prime -= beta * np.cos(2 * order * xi) * np.sinh(2 * order * eta)
+
+        sinh_eta_prime = np.sinh(eta_prime)
+        cos_xi_prime = np.cos(xi_prime)
+        tau_prime = np.sin(xi_prime) / np.hypot(sinh_eta_prime, cos_xi_prime)
+        delta_longitude = np.arctan2(sinh_eta_prime, cos_xi_prime)
+
+        # solve the conformal latitude for the geodetic latitude using Newton's method
+        e = self._eccentricity
+        tau = tau_prime.copy()
+        for _ in range(iterations):
+            sigma = np.sinh(e * np.arctanh(e * tau / np.sqrt(1 + tau ** 2)))
+            tau_prime_i = tau * np.sqrt(1 + sigma ** 2) - sigma * np.sqrt(1 + tau ** 2)
+            derivative = (1 - e ** 2) * np.sqrt(1 + tau_prime_i ** 2) * np.sqrt(1 + tau ** 2) / (1 + (1 - e ** 2) * tau ** 2)
+            tau += (tau_prime - tau_prime_i) / derivative
+
+        longitude = self._central_meridian + np.degrees(delta_longitude)
+        latitude = np.degrees(np.arctan(tau))
+        return longitude, latitude
+
+
+@lru_cache(maxsize=None)
+def get_transformer(epsg: int=25832) -> TransverseMercator:
+    """
+    Returns the cached transverse Mercator projection of an UTM coordinate system
+    e.g. 25832 for ETRS89 / UTM zone 32N or 32632 for WGS 84 / UTM zone 32N.
+    """
+    if 25828 <= epsg <= 25838:
+        zone, false_northing = epsg - 25800, 0.0
+    elif 32601 <= epsg <= 32660:
+        zone, false_northing = epsg - 32600, 0.0
+    elif 32701 <= epsg <= 32760:
+        zone, false_northing = epsg - 32700, 10000000.0
+    else:
+        raise ValueError(f"Unsupported spatial reference {epsg}!")
+    return TransverseMercator(central_meridian=6 * zone - 183, false_northing=false_northing)
+
+def project_points(longitude, latitude, epsg: int=25832):
+    """
+    Projects longitudes and latitudes in degrees (WGS 84) into x and y coordinates in meters.
+    """
+    return get_transformer(epsg).forward(longitude, latitude)
+
+def unproject_points(x, y, epsg: int=25832):
+    """
+    Returns the longitudes and latitudes in degrees (WGS 84) of projected x and y coordinates in meters.
+    """
+    return get_transformer(epsg).inverse(x, y)
+
+def project_polylines(polylines: list, epsg: int=25832) -> list:
+    """
+    Projects the paths of polylines in degrees using one vectorized transform of all vertices.
+
+    :param list polylines:  The polylines as lists of paths, every path is a sequence of longitude and latitude pairs.
+    """
+    paths = [np.asarray(path, dtype=np.float64)[:, :2].reshape(-1, 2) for polyline in polylines for path in polyline]
+    if 0 == len(paths):
+        return [[] for _ in polylines]
+
+    vertices = np.vstack(paths)
+    projected_vertices = np.column_stack(project_points(vertices[:, 0], vertices[:, 1], epsg))
+    projected_paths = iter(np.split(projected_vertices, np.cumsum([path.shape[0] for path in paths])[:-1]))
+    return [[next(projected_paths) for _ in polyline] for polyline in polylines]
+
+def add_projected_columns(traffic_df, epsg: int=25832, x_column: str='longitude', y_column: str='latitude', projected_x_column: str='x', projected_y_column: str='y'):
+    """
+    Adds the projected x and y columns of the whole traffic table in one vectorized call.
+    """
+    traffic_df[projected_x_column], traffic_df[projected_y_column] = project_points(traffic_df[x_column].to_numpy(), traffic_df[y_column].to_numpy(), epsg)
+    return traffic_df
@@ -0,0 +1,109 @@
+from measure.geodesic import geodesic_inverse
+import numpy as np
+from traffic.distinct import create_distinct_counter
+
+# conservative lengths of one degree on the WGS 84 ellipsoid
+_MIN_METERS_PER_DEGREE_LATITUDE = 110574.0
+_MAX_METERS_PER_DEGREE_LONGITUDE = 111320.0
+
+
+
+class PointOfInterest(object):
+    """
+    Represents a location of interest and its search radius in meters.
+    """
+
+    def __init__(self, name: str, longitude: float, latitude: float, radius: float) -> None:
+        self._name = name
+        self._longitude = longitude
+        self._latitude = latitude
+        self._radius = radius
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def longitude(self):
+        return self._longitude
+
+    @property
+    def latitude(self):
+        return self._latitude
+
+    @property
+    def radius(self):
+        return self._radius
+
+    def bounding_box(self):
+        """
+        Returns a bounding box in degrees enclosing the search radius.
+        """
+        delta_latitude = self._radius / _MIN_METERS_PER_DEGREE_LATITUDE
+        pole_latitude = min(89.9, abs(self._latitude) + delta_latitude)
+        delta_longitude = self._radius / (_MAX_METERS_PER_DEGREE_LONGITUDE * np.cos(np.radians(pole_latitude)))
+        return (self._longitude - delta_longitude, self._latitude - delta_latitude,
+                self._longitude + delta_longitude, self._latitude + delta_latitude)
+
+
+class RadiusQuery(object):
+    """
+    Queries point locations within the radius of points of interest.
+    The points are sorted by latitude once, every query selects the latitude band by binary search,
+    filters the band by longitude and tests the remaining candidates using the exact geodesic distance.
+    """
+
+    def __init__(self, longitude, latitude) -> None:
+        self._longitude = np.asarray(longitude, dtype=np.float64)
+        self._latitude = np.asarray(latitude, dtype=np.float64)
+        self._latitude_order = np.argsort(self._latitude, kind="stable")
+        self._sorted_latitude = self._latitude[self._latitude_order]
+
+    def query(self, point_of_interest: PointOfInterest) -> np.ndarray:
+        """
+        Returns the ascending row indices of all points within the radius.
+        """
+        min_longitude, min_latitude, max_longitude, max_latitude = point_of_interest.bounding_box()
+        band_start = np.searchsorted(self._sorted_latitude, min_latitude, side="left")
+        band_end = np.searchsorted(self._sorted_latitude, max_latitude, side="right")
+        candidates = self._latitude_order[band_start:band_end]
+        candidate_longitude = self._longitude[candidates]
+        candidates = candidates[(min_longitude <= candidate_longitude) & (candidate_longitude <= max_longitude)]
+
+        _, distance = geodesic_inverse(point_of_interest.longitude, point_of_interest.latitude,
+                                       self._longitude[candidates], self._latitude[candidates])
+        return np.sort(candidates[distance <= point_of_interest.radius])
+
+    def query_many(self, points_of_interest) -> dict:
+        """
+        Returns the row indices within the radius of every point of interest by name.
+        """
+        return {point_of_interest.name: self.query(point_of_interest) for point_of_interest in points_of_interest}
+
+
+def query_radius(longitude, latitude, points_of_interest) -> dict:
+    """
+    Returns the row indices of all points within the radius of every point of interest by name.
+
+    :param longitude:           The longitudes in degrees.
+    :param latitude:            The latitudes in degrees.
+    :param points_of_interest:  The points of interest.
+    """
+    return RadiusQuery(longitude, latitude).query_many(points_of_interest)
+
+def count_distinct_near(longitude, latitude, values, points_of_interest, mode: str="exact") -> dict:
+    """
+    Returns a distinct counter of the values e.g. persons within the radius of every point of interest by name.
+    The counters can be merged across files.
+
+    :param longitude:           The longitudes in degrees.
+    :param latitude:            The latitudes in degrees.
+    :param values:              The values being counted.
+    :param points_of_interest:  The points of interest.
+    :param str mode:            The distinct count mode "exact" or "hll" (HyperLogLog).
+    """
+    values = np.asarray(values)
+    counters = {}
+    for name, indices in query_radius(longitude, latitude, points_of_interest).items():
+        counters[name] = create_distinct_counter(mode).add(values[indices])
+    return counters
@@ -1,52 +1,419 @@
-from arcgis.features import GeoAccessor
-import arcpy
-from arcpy.management import AddFields, CreateFeatureclass, ClearWorkspaceCache
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 import csv
 from datetime import datetime, timezone
+from glob import glob
+import hashlib
+import logging
 import numpy as np
 import os
 import pandas as pd
+from spatialcarbon.tracing import span
 import sqlite3 as sql
+from traffic.cache import file_digest
+from traffic.index import GridIndex
+from traffic.projection import add_projected_columns
+from traffic.schema import apply_traffic_schema, concat_traffic, traffic_field_descriptions, TRIP_TIME_FORMAT
+from traffic.sink import FeatureClassSink
 
-def read_traffic_as_df(filepath: str) -> pd.DataFrame:
+try:
+    from arcgis.features import GeoAccessor
+    import arcpy
+    from arcpy.management import AddFields, CreateFeatureclass, ClearWorkspaceCache
+except ImportError:
+    # the columnar readers and writers do not need arcpy e.g. for benchmarking on plain Linux
+    GeoAccessor = None
+    arcpy = None
+
+
+class TrafficQuery(object):
+    """
+    Represents a selection of traffic rows being compiled into one parameterized SQL statement,
+    so that only the matching rows cross the sqlite boundary.
+    The times refer to the trip times stored in the database, the time range includes the start and excludes the end.
+    The bounding box uses the R*Tree created by create_traffic_indexes if it exists.
+    """
+
+    def __init__(self, table: str="agent_pos", columns=None, start_time=None, end_time=None, bbox=None, vehicle_types=None) -> None:
+        """
+        :param str table:       The table name.
+        :param columns:         The column names being read, all columns if None.
+        :param start_time:      The first trip time.
+        :param end_time:        The trip time after the last one.
+        :param bbox:            The bounding box as (min longitude, min latitude, max longitude, max latitude).
+        :param vehicle_types:   The vehicle types being read, None selects missing vehicle types.
+        """
+        if None is not bbox and 4 != len(bbox):
+            raise ValueError("The bounding box needs four coordinates!")
+        if None is not vehicle_types and 0 == len(vehicle_types):
+            raise ValueError("At least one vehicle type must be selected!")
+
+        self._table = table
+        self._columns = None if None is columns else tuple(columns)
+        self._start_time = None if None is start_time else pd.Timestamp(start_time).strftime(TRIP_TIME_FORMAT)
+        self._end_time = None if None is end_time else pd.Timestamp(end_time).strftime(TRIP_TIME_FORMAT)
+        self._bbox = None if None is bbox else tuple(float(coordinate) for coordinate in bbox)
+        self._vehicle_types = None if None is vehicle_types else tuple(vehicle_types)
+
+    def __repr__(self):
+        return (f"TrafficQuery(table={self._table!r}, columns={self._columns!r}, start_time={self._start_time!r}, "
+                f"end_time={self._end_time!r}, bbox={self._bbox!r}, vehicle_types={self._vehicle_types!r})")
+
+    @property
+    def table(self):
+        return self._table
+
+    def compile(self, rtree_table: str=None):
+        """
+        Returns the SQL statement and its parameters.
+
+        :param str rtree_table: The R*Tree of the longitudes and latitudes used for the bounding box.
+        """
+        column_list = "*" if None is self._columns else ", ".join(f'"{self._table}"."{column}"' for column in self._columns)
+        if "*" == column_list and None is not rtree_table and None is not self._bbox:
+            column_list = f'"{self._table}".*'
+        statement = f'SELECT {column_list} FROM "{self._table}"'
+        conditions = []
+        parameters = []
+        if None is not self._start_time:
+            conditions.append("trip_time >= ?")
+            parameters.append(self._start_time)
+        if None is not self._end_time:
+            conditions.append("trip_time < ?")
+            parameters.append(self._end_time)
+        if None is not self._bbox:
+            min_x, min_y, max_x, max_y = self._bbox
+            if None is not rtree_table:
+                # the R*Tree stores rounded 32 bit floats, the exact comparisons below remove the false positives
+                statement += f' JOIN "{rtree_table}" ON "{self._table}".rowid = "{rtree_table}".id'
+                conditions.append(f'"{rtree_table}".min_x <= ? AND "{rtree_table}".max_x >= ? AND "{rtree_table}".min_y <= ? AND "{rtree_table}".max_y >= ?')
+                parameters.extend((max_x, min_x, max_y, min_y))
+            conditions.append("longitude BETWEEN ? AND ? AND latitude BETWEEN ? AND ?")
+            parameters.extend((min_x, max_x, min_y, max_y))
+        if None is not self._vehicle_types:
+            vehicle_types = [vehicle_type for vehicle_type in self._vehicle_types if None is not vehicle_type]
+            vehicle_conditions = []
+            if 0 < len(vehicle_types):
+                vehicle_conditions.append(f"vehicle_type IN ({', '.join('?' * len(vehicle_types))})")
+                parameters.extend(vehicle_types)
+            if len(vehicle_types) < len(self._vehicle_types):
+                vehicle_conditions.append("vehicle_type IS NULL")
+            conditions.append(f"({' OR '.join(vehicle_conditions)})")
+
+        if 0 < len(conditions):
+            statement += f" WHERE {' AND '.join(conditions)}"
+        return f"{statement};", tuple(parameters)
+
+
+def _rtree_table(table: str) -> str:
+    return f"{table}_rtree"
+
+def create_traffic_indexes(db_filepath: str, table: str="agent_pos", rtree: bool=True) -> None:
+    """
+    Creates the B-tree indexes on trip time, trip and person and the R*Tree of the longitudes and latitudes.
+    Existing indexes are kept, an R*Tree whose row count differs from the table is rebuilt.
+    Building the R*Tree takes most of the time, it inserts every point one by one.
+
+    :param str db_filepath:     The traffic sqlite file.
+    :param str table:           The table name.
+    :param bool rtree:          Creates the R*Tree used for bounding box queries.
+    """
+    with span("read.create_indexes"), sql.connect(db_filepath) as connection:
+        # the trip index also orders the trip points for the streaming measure
+        connection.execute(f'CREATE INDEX IF NOT EXISTS "{table}_trip_time" ON "{table}" (trip, trip_time);')
+        connection.execute(f'CREATE INDEX IF NOT EXISTS "{table}_time" ON "{table}" (trip_time);')
+        connection.execute(f'CREATE INDEX IF NOT EXISTS "{table}_person" ON "{table}" (person);')
+        if rtree:
+            # the R*Tree nodes are updated randomly, a larger page cache avoids reading them again and again
+            connection.execute("PRAGMA cache_size = -262144;")
+            rtree_table = _rtree_table(table)
+            connection.execute(f'CREATE VIRTUAL TABLE IF NOT EXISTS "{rtree_table}" USING rtree(id, min_x, max_x, min_y, max_y);')
+            rtree_count = connection.execute(f'SELECT COUNT(*) FROM "{rtree_table}";').fetchone()[0]
+            table_count = connection.execute(f'SELECT COUNT(*) FROM "{table}";').fetchone()[0]
+            if rtree_count != table_count:
+                connection.execute(f'DELETE FROM "{rtree_table}";')
+                connection.execute(f'INSERT INTO "{rtree_table}" SELECT rowid, longitude, longitude, latitude, latitude FROM "{table}" WHERE longitude IS NOT NULL AND latitude IS NOT NULL;')
+        connection.execute("ANALYZE;")
+
+def _compile_query(connection, query: TrafficQuery):
+    rtree_table = _rtree_table(query.table)
+    rtree_exists = connection.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = ?;", (rtree_table,)).fetchone()[0]
+    return query.compile(rtree_table if 0 < rtree_exists else None)
+
+def read_traffic_as_df(filepath: str, cache=None, epsg: int=None, columns=None) -> pd.DataFrame:
     """
     Reads the traffic file as pandas dataframe.
 
     :param str filepath:
+    :param cache:           The optional TrafficCache of parsed tables.
+    :param int epsg:        The optional UTM spatial reference e.g. 25832 adding projected x and y columns.
+    :param columns:         The column names being read, all columns if None.
     """
-    traffic_df = pd.read_csv(filepath)
-    traffic_df["trip_time"] = pd.to_datetime(traffic_df["trip_time"])
+    if None is not cache:
+        return cache.get_or_create(filepath, ("read_traffic_as_df", epsg, columns), lambda: read_traffic_as_df(filepath, epsg=epsg, columns=columns))
+
+    with span("read.csv") as read_span:
+        traffic_df = apply_traffic_schema(pd.read_csv(filepath, usecols=columns, dtype={"vehicle_type": "category"}))
+        read_span.add_rows(traffic_df.shape[0])
+    if None is not epsg:
+        with span("read.project", traffic_df.shape[0]):
+            add_projected_columns(traffic_df, epsg)
     return traffic_df
 
-def read_traffic_as_sdf(filepath: str) -> GeoAccessor:
+def _result_bytes(result) -> int:
+    # the size of the results waiting for their consumer
+    if isinstance(result, pd.DataFrame):
+        return int(result.memory_usage(index=False).sum())
+    if isinstance(result, np.ndarray):
+        return result.nbytes
+    return 0
+
+def iter_traffic_many(filepaths, reader=read_traffic_as_df, processes: int=None, read_ahead: int=None, max_bytes: int=None, ordered: bool=True):
+    """
+    Reads many traffic files on a process pool and yields the file path and the result of every file.
+    At most read_ahead files are read or wait for their consumer at the same time,
+    so the next files are parsed while the current one is processed.
+    The memory ceiling estimates the pending files by their size and the ratio of table size to file size seen so far,
+    at least one file is always pending.
+
+    :param filepaths:           The traffic files or a file pattern e.g. "data/2023-*.csv".
+    :param reader:              The picklable function reading one file e.g. functools.partial(read_traffic_as_df, columns=["person"]).
+    :param int processes:       The number of worker processes, by default the number of CPUs.
+    :param int read_ahead:      The maximum number of pending files, by default twice the number of processes.
+    :param int max_bytes:       The memory ceiling of the pending results in bytes.
+    :param bool ordered:        Yields the results in the order of the files instead of as completed.
+    """
+    if isinstance(filepaths, str):
+        filepaths = sorted(glob(filepaths))
+    else:
+        filepaths = list(filepaths)
+    if None is processes:
+        processes = os.cpu_count() or 1
+    if processes < 1:
+        raise ValueError("The number of processes must be positive!")
+    if None is read_ahead:
+        read_ahead = 2 * processes
+    if read_ahead < 1:
+        raise ValueError("The read ahead must be positive!")
+
+    if 1 == processes:
+        for filepath in filepaths:
+            yield filepath, reader(filepath)
+        return
+
+    logger = logging.getLogger("codecarbon")
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        pending = dict()
+        completed = dict()
+        next_index = 0
+        next_yield = 0
+        file_bytes = 0
+        table_bytes = 0
+        while next_yield < len(filepaths):
+            # submits the next files while the read ahead and the memory ceiling allow it
+            while next_index < len(filepaths) and len(pending) + len(completed) < read_ahead:
+                if None is not max_bytes and 0 < len(pending) + len(completed):
+                    expansion = table_bytes / file_bytes if 0 < file_bytes else 1.0
+                    pending_bytes = sum(expansion * os.path.getsize(filepaths[index]) for index in pending.values())
+                    pending_bytes += sum(result_bytes for _, result_bytes in completed.values())
+                    if max_bytes < pending_bytes + expansion * os.path.getsize(filepaths[next_index]):
+                        break
+
+                pending[executor.submit(reader, filepaths[next_index])] = next_index
+                next_index += 1
+
+            if ordered and next_yield in completed:
+                result, _ = completed.pop(next_yield)
+                yield filepaths[next_yield], result
+                next_yield += 1
+                continue
+
+            done_futures, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done_futures:
+                index = pending.pop(future)
+                result = future.result()
+                result_bytes = _result_bytes(result)
+                file_bytes += os.path.getsize(filepaths[index])
+                table_bytes += result_bytes
+                logger.debug(f"Read {filepaths[index]} using {result_bytes / 1024 ** 2:.1f} MB.")
+                if ordered:
+                    completed[index] = (result, result_bytes)
+                else:
+                    yield filepaths[index], result
+                    next_yield += 1
+
+def read_traffic_many(filepaths, reader=read_traffic_as_df, processes: int=None, read_ahead: int=None, max_bytes: int=None) -> pd.DataFrame:
+    """
+    Reads many traffic files on a process pool into one typed table in the order of the files.
+
+    :param filepaths:           The traffic files or a file pattern e.g. "data/2023-*.csv".
+    :param reader:              The picklable function reading one file into a dataframe.
+    :param int processes:       The number of worker processes, by default the number of CPUs.
+    :param int read_ahead:      The maximum number of pending files, by default twice the number of processes.
+    :param int max_bytes:       The memory ceiling of the pending results in bytes.
+    """
+    with span("read.many") as read_span:
+        traffic_df = concat_traffic(traffic_df for _, traffic_df in iter_traffic_many(filepaths, reader, processes, read_ahead, max_bytes))
+        read_span.add_rows(traffic_df.shape[0])
+    return traffic_df
+
+def read_traffic_as_sdf(filepath: str, cache=None) -> GeoAccessor:
     """
     Reads the traffic file as spatially enabled dataframe.
 
     :param str filepath:
+    :param cache:           The optional TrafficCache of parsed tables.
     """
-    traffic_df = read_traffic_as_df(filepath)
+    traffic_df = read_traffic_as_df(filepath, cache)
     return GeoAccessor.from_xy(traffic_df, x_column="longitude", y_column="latitude")
 
-def read_sqlite_as_df(db_filepath: str, select_statement: str, x_column: str='longitude', y_column: str='latitude') -> GeoAccessor:
+def read_traffic_spatial_index(filepath: str, cell_size: float=100.0, cache=None) -> GridIndex:
     """
-    Reads the data from a sqlite database into main memory using a SQL statement.
+    Returns the spatial index of the traffic file.
+    The index is built once and serialized next to the traffic file, the row indices refer to read_traffic_as_df.
+
+    :param str filepath:
+    :param float cell_size: The grid cell size in meters.
+    :param cache:           The optional TrafficCache of parsed tables.
+    """
+    return _load_or_build_spatial_index(filepath, f"{filepath}.gridindex.npz", cell_size,
+                                        lambda: read_traffic_as_df(filepath, cache))
+
+def read_sqlite_spatial_index(db_filepath: str, select_statement: str, cell_size: float=100.0, x_column: str='longitude', y_column: str='latitude', cache=None) -> GridIndex:
+    """
+    Returns the spatial index of the data selected from a sqlite database.
+    The index is built once per SQL statement and serialized next to the database, the row indices refer to read_sqlite_as_df.
+    """
+    statement_digest = hashlib.sha256(str(select_statement).encode("utf8")).hexdigest()[:16]
+    return _load_or_build_spatial_index(db_filepath, f"{db_filepath}.{statement_digest}.gridindex.npz", cell_size,
+                                        lambda: read_sqlite_as_df(db_filepath, select_statement, cache=cache), x_column, y_column)
+
+def _load_or_build_spatial_index(filepath: str, index_filepath: str, cell_size: float, read_df, x_column: str='longitude', y_column: str='latitude') -> GridIndex:
+    source_digest = file_digest(filepath)
+    spatial_index = GridIndex.load(index_filepath, source_digest, cell_size)
+    if None is spatial_index:
+        traffic_df = read_df()
+        spatial_index = GridIndex(traffic_df[x_column], traffic_df[y_column], cell_size, source_digest)
+        spatial_index.save(index_filepath)
+    return spatial_index
+
+def read_sqlite_as_df(db_filepath: str, select_statement, x_column: str='longitude', y_column: str='latitude', cache=None, epsg: int=None) -> GeoAccessor:
+    """
+    Reads the data from a sqlite database into main memory using a SQL statement or a TrafficQuery.
+    The optional TrafficCache returns the table of an unchanged database and statement without querying.
+    The optional UTM spatial reference e.g. 25832 adds projected x and y columns.
+    """
+    if None is not cache:
+        return cache.get_or_create(db_filepath, ("read_sqlite_as_df", select_statement, epsg),
+                                   lambda: read_sqlite_as_df(db_filepath, select_statement, x_column, y_column, epsg=epsg))
+
+    with span("read.sqlite") as read_span:
+        with sql.connect(db_filepath) as connection:
+            if isinstance(select_statement, TrafficQuery):
+                query_statement, query_parameters = _compile_query(connection, select_statement)
+                traffic_df = pd.read_sql_query(query_statement, connection, params=query_parameters)
+            else:
+                traffic_df = pd.read_sql_query(select_statement, connection)
+        read_span.add_rows(traffic_df.shape[0])
+    traffic_df = apply_traffic_schema(traffic_df)
+    if None is not epsg:
+        with span("read.project", traffic_df.shape[0]):
+            add_projected_columns(traffic_df, epsg, x_column, y_column)
+    return traffic_df
+
+def iter_sqlite_chunks(db_filepath: str, table: str="agent_pos", chunk_size: int=100000, key_columns=("id",), columns=None, as_array: bool=False):
     """
+    Reads the data from a sqlite database chunk by chunk using keyset pagination.
+    Every chunk is queried with a new "WHERE (key_columns, rowid) > (last values)" statement,
+    so that only one chunk is held in main memory and the database never has to skip rows.
+    A NULL key never compares greater, so the rows having a NULL key are read afterwards ordered by rowid.
+
+    :param str db_filepath:     The traffic sqlite file.
+    :param str table:           The table name.
+    :param int chunk_size:      The maximum number of rows per chunk.
+    :param key_columns:         The column name or names defining the chunk order e.g. "id" or "trip".
+    :param columns:             The column names being read, all columns if None.
+    :param bool as_array:       Yields numpy record arrays instead of dataframes.
+    """
+    if chunk_size < 1:
+        raise ValueError("The chunk size must be positive!")
+    
+    if isinstance(key_columns, str):
+        key_columns = (key_columns,)
+
+    # the rowid breaks ties of non-unique keys like trip
+    order_columns = tuple(key_columns) + ("rowid",)
+    key_aliases = [f"_key_{index}" for index in range(len(order_columns))]
+    column_list = "*" if columns is None else ", ".join(columns)
+    key_list = ", ".join(f"{order_column} AS {key_alias}" for order_column, key_alias in zip(order_columns, key_aliases))
+    select_statement = f"SELECT {column_list}, {key_list} FROM {table}"
+    # the key columns, their aliases and the condition of every pass
+    passes = ((order_columns, key_aliases, " AND ".join(f"{key_column} IS NOT NULL" for key_column in key_columns)),
+              (("rowid",), key_aliases[-1:], "(" + " OR ".join(f"{key_column} IS NULL" for key_column in key_columns) + ")"))
+
     with sql.connect(db_filepath) as connection:
-        return pd.read_sql_query(select_statement, connection)
+        for pass_columns, pass_aliases, condition in passes:
+            order_statement = f"ORDER BY {', '.join(pass_columns)} LIMIT ?"
+            keyset_statement = f"AND ({', '.join(pass_columns)}) > ({', '.join('?' * len(pass_columns))})"
+            last_keys = None
+            while True:
+                # the span must not cover the consumer of the chunk
+                with span("read.sqlite_chunk") as chunk_span:
+                    if None is last_keys:
+                        chunk_df = pd.read_sql_query(f"{select_statement} WHERE {condition} {order_statement};", connection, params=(chunk_size,))
+                    else:
+                        chunk_df = pd.read_sql_query(f"{select_statement} WHERE {condition} {keyset_statement} {order_statement};", connection,
+                                                     params=last_keys + (chunk_size,))
+                    chunk_span.add_rows(chunk_df.shape[0])
+
+                if chunk_df.empty:
+                    break
+
+                last_keys = tuple(chunk_df[key_alias].iloc[-1:].tolist()[0] for key_alias in pass_aliases)
+                chunk_df = apply_traffic_schema(chunk_df.drop(columns=key_aliases))
+                yield chunk_df.to_records(index=False) if as_array else chunk_df
+                if chunk_df.shape[0] < chunk_size:
+                    break
 
-def read_sqlite_as_sdf(db_filepath: str, select_statement: str, x_column: str='longitude', y_column: str='latitude') -> GeoAccessor:
+def read_sqlite_as_sdf(db_filepath: str, select_statement: str, x_column: str='longitude', y_column: str='latitude', cache=None) -> GeoAccessor:
     """
     Reads the data from a sqlite database into main memory using a SQL statement.
     """
-    df = read_sqlite_as_df(db_filepath, select_statement, x_column, y_column)
-    return GeoAccessor.from_xy(df, x_column, y_column)
+    df = read_sqlite_as_df(db_filepath, select_statement, x_column, y_column, cache)
+    with span("read.from_xy", df.shape[0]):
+        return GeoAccessor.from_xy(df, x_column, y_column)
         
-def read_sqlite_to_featureclass(db_filepath: str, select_statement: str, x_column: str='longitude', y_column: str='latitude') -> GeoAccessor:
+def read_sqlite_to_featureclass(db_filepath: str, select_statement: str, x_column: str='longitude', y_column: str='latitude', cache=None) -> GeoAccessor:
     """
     Reads the data from a sqlite database as an in memory feature class using a SQL statement.
     """
-    sdf = read_sqlite_as_sdf(db_filepath, select_statement, x_column, y_column)
-    featureclass = sdf.spatial.to_featureclass("memory/traffic_data")
+    sdf = read_sqlite_as_sdf(db_filepath, select_statement, x_column, y_column, cache)
+    with span("read.to_featureclass", sdf.shape[0]):
+        featureclass = sdf.spatial.to_featureclass("memory/traffic_data")
+        arcpy.management.ClearWorkspaceCache()
+    return featureclass
+
+def read_sqlite_chunks_to_featureclass(db_filepath: str, table: str="agent_pos", chunk_size: int=100000, key_columns=("id",), x_column: str='longitude', y_column: str='latitude', workspace: str="memory"):
+    """
+    Reads the data from a sqlite database chunk by chunk as a feature class using spatially enabled dataframes.
+    Only one chunk is held in main memory, every further chunk is appended to the feature class.
+
+    :param str db_filepath:     The traffic sqlite file.
+    :param str table:           The table name.
+    :param int chunk_size:      The maximum number of rows per chunk.
+    :param key_columns:         The column name or names defining the chunk order.
+    :param str workspace:       The output feature workspace.
+    """
+    arcpy.env.overwriteOutput = True
+    featureclass = None
+    for chunk_df in iter_sqlite_chunks(db_filepath, table, chunk_size, key_columns):
+        chunk_sdf = GeoAccessor.from_xy(chunk_df, x_column, y_column)
+        if None is featureclass:
+            featureclass = chunk_sdf.spatial.to_featureclass(f"{workspace}/traffic_data")
+        else:
+            chunk_featureclass = chunk_sdf.spatial.to_featureclass("memory/traffic_data_chunk")
+            arcpy.management.Append(chunk_featureclass, featureclass, schema_type="NO_TEST")
+            arcpy.management.Delete(chunk_featureclass)
+
     arcpy.management.ClearWorkspaceCache()
     return featureclass
 
@@ -67,8 +434,9 @@ def _read_traffic_to_featureclass(traffic_sdf: GeoAccessor, workspace: str):
     :param str traffic_sdf: The traffic spatial dataframe.
     :param str workspace:   The output feature workspace.
     """
-    featureclass = traffic_sdf.spatial.to_featureclass(f"{workspace}/traffic_data")
-    arcpy.management.ClearWorkspaceCache()
+    with span("read.to_featureclass", traffic_sdf.shape[0]):
+        featureclass = traffic_sdf.spatial.to_featureclass(f"{workspace}/traffic_data")
+        arcpy.management.ClearWorkspaceCache()
     return featureclass
 
 def read_traffic_as_featureclass(filepath: str, workspace: str):
@@ -81,39 +449,76 @@ def read_traffic_as_featureclass(filepath: str, workspace: str):
     traffic_df = read_traffic_as_df(filepath)
     return _read_traffic_as_featureclass(traffic_df, workspace)
 
-def read_sqlite_as_featureclass(db_filepath: str, select_statement: str):
+def read_sqlite_as_featureclass(db_filepath: str, select_statement: str, cache=None):
     """
     Inserts the traffic data into an in memory feature class.
 
     :param str db_filepath:         The traffic sqlite file.
-    :param str select_statement:    The SQL select statement.
+    :param select_statement:        The SQL select statement or a TrafficQuery.
+    :param cache:                   The optional TrafficCache of parsed tables.
     """
-    traffic_df = read_sqlite_as_df(db_filepath, select_statement)
+    traffic_df = read_sqlite_as_df(db_filepath, select_statement, cache=cache)
     return _read_traffic_as_featureclass(traffic_df, "memory")
 
+def read_sqlite_chunks_as_featureclass(db_filepath: str, table: str="agent_pos", chunk_size: int=100000, key_columns=("id",), workspace: str="memory"):
+    """
+    Inserts the traffic data into a feature class chunk by chunk.
+    Only one chunk is held in main memory.
+
+    :param str db_filepath:     The traffic sqlite file.
+    :param str table:           The table name.
+    :param int chunk_size:      The maximum number of rows per chunk.
+    :param key_columns:         The column name or names defining the chunk order.
+    :param str workspace:       The output feature workspace.
+    """
+    feature_class = _create_traffic_featureclass(workspace)
+    for chunk_df in iter_sqlite_chunks(db_filepath, table, chunk_size, key_columns):
+        _insert_traffic_records(feature_class, chunk_df)
+
+    # Release schema lock
+    ClearWorkspaceCache()
+
+    return feature_class
+
 def _read_traffic_as_featureclass(traffic_df: pd.DataFrame, workspace: str):
     """
     Inserts the traffic data into a feature class.
 
     :param str traffic_df:  The traffic dataframe.
+    :param str workspace:   The output feature workspace. 
+    """
+    feature_class = _create_traffic_featureclass(workspace)
+    _insert_traffic_records(feature_class, traffic_df)
+    
+    # Release schema lock
+    ClearWorkspaceCache()
+    
+    return feature_class
+
+def _create_traffic_featureclass(workspace: str):
+    """
+    Creates the traffic feature class.
+
     :param str workspace:   The output feature workspace. 
     """
     arcpy.env.overwriteOutput = True
-    feature_class_result = CreateFeatureclass(workspace, "traffic_data", geometry_type="POINT", spatial_reference=4326)
-    feature_class = feature_class_result[0]
+    with span("read.create_featureclass"):
+        feature_class_result = CreateFeatureclass(workspace, "traffic_data", geometry_type="POINT", spatial_reference=4326)
+        feature_class = feature_class_result[0]
+        
+        AddFields(feature_class, traffic_field_descriptions())
     
-    AddFields(feature_class,
-        [["id", "LONG"],
-        ["trip" , "LONG"],
-        ["person", "LONG"],
-        ["vehicle_type", "TEXT", "vehicle_type", 256],
-        ["distance_crossed", "LONG"],
-        ["longitude", "DOUBLE"],
-        ["latitude", "DOUBLE"],
-        ["trip_time", "DATE"]])
+    return feature_class
+
+def _insert_traffic_records(feature_class: str, traffic_df: pd.DataFrame):
+    """
+    Inserts the traffic records into the traffic feature class.
 
+    :param str feature_class:   The traffic feature class.
+    :param str traffic_df:      The traffic dataframe.
+    """
     field_names = ["id", "trip", "person", "vehicle_type", "distance_crossed", "longitude", "latitude", "trip_time", "SHAPE@XY"]
-    with arcpy.da.InsertCursor(feature_class, field_names) as insert_cursor:
+    with span("read.insert_cursor", traffic_df.shape[0]), arcpy.da.InsertCursor(feature_class, field_names) as insert_cursor:
         # traffic records as features
 
         for record in traffic_df.to_records(index=False):
@@ -127,8 +532,69 @@ def _read_traffic_as_featureclass(traffic_df: pd.DataFrame, workspace: str):
             # geometry (SHAPE@XY) must be a tuple
             values_tuple += ((record[5], record[6]), )
             insert_cursor.insertRow(values_tuple)
-    
-    # Release schema lock
-    ClearWorkspaceCache()
-    
-    return feature_class
\ No newline at end of file
+
+def to_traffic_array(traffic_df: pd.DataFrame, datetime_columns=("trip_time",)) -> np.ndarray:
+    """
+    Converts the traffic dataframe into a typed structured array in one shot.
+    Datetime columns become datetime64, text columns fixed width unicode and missing text an empty string.
+
+    :param traffic_df:          The traffic dataframe.
+    :param datetime_columns:    The column names being converted to datetime64 e.g. trip time strings from sqlite.
+    """
+    columns = []
+    for column_name in traffic_df.columns:
+        column = traffic_df[column_name]
+        if column_name in datetime_columns or pd.api.types.is_datetime64_any_dtype(column):
+            column_values = pd.to_datetime(column).to_numpy(dtype="datetime64[us]")
+        elif pd.api.types.is_numeric_dtype(column) and not isinstance(column.dtype, pd.CategoricalDtype):
+            column_values = column.to_numpy()
+        else:
+            text_values = column.astype(object).where(column.notna(), "").astype(str).to_numpy()
+            column_values = text_values.astype(f"U{max(1, max((len(value) for value in text_values), default=1))}")
+        columns.append((str(column_name), column_values))
+
+    traffic_array = np.empty(traffic_df.shape[0], dtype=[(column_name, column_values.dtype) for column_name, column_values in columns])
+    for column_name, column_values in columns:
+        traffic_array[column_name] = column_values
+    return traffic_array
+
+def write_traffic_bulk(traffic_df: pd.DataFrame, sink, batch_size: int=500000):
+    """
+    Writes the traffic data into a sink using a typed structured array and batches instead of inserting row by row.
+
+    :param traffic_df:      The traffic dataframe.
+    :param sink:            The sink e.g. a FeatureClassSink, SqliteSink or GeoPackageSink.
+    :param int batch_size:  The maximum number of rows per batch.
+    """
+    if batch_size < 1:
+        raise ValueError("The batch size must be positive!")
+
+    with span("read.to_array", traffic_df.shape[0]):
+        traffic_array = to_traffic_array(traffic_df)
+    for batch_start in range(0, traffic_array.shape[0], batch_size):
+        with span("read.write_batch", min(batch_size, traffic_array.shape[0] - batch_start)):
+            sink.write(traffic_array[batch_start:batch_start + batch_size])
+    with span("read.close_sink"):
+        return sink.close()
+
+def read_traffic_as_featureclass_bulk(filepath: str, workspace: str, batch_size: int=500000):
+    """
+    Writes the traffic data into a feature class using a typed structured array.
+
+    :param str filepath:    The traffic file.
+    :param str workspace:   The output feature workspace.
+    :param int batch_size:  The maximum number of rows per batch.
+    """
+    traffic_df = read_traffic_as_df(filepath)
+    return write_traffic_bulk(traffic_df, FeatureClassSink(workspace), batch_size)
+
+def read_sqlite_as_featureclass_bulk(db_filepath: str, select_statement: str, batch_size: int=500000):
+    """
+    Writes the traffic data into an in memory feature class using a typed structured array.
+
+    :param str db_filepath:         The traffic sqlite file.
+    :param select_statement:        The SQL select statement or a TrafficQuery.
+    :param int batch_size:          The maximum number of rows per batch.
+    """
+    traffic_df = read_sqlite_as_df(db_filepath, select_statement)
+    return write_traffic_bulk(traffic_df, FeatureClassSink("memory"), batch_size)
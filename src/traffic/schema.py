@@ -0,0 +1,135 @@
+import logging
+import numpy as np
+import pandas as pd
+
+TRIP_TIME_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+# name, dtype and feature class field type, the LONG fields already limit the identifiers to 32 bit integers
+TRAFFIC_SCHEMA = (("id", "int32", "LONG"),
+                  ("trip", "int32", "LONG"),
+                  ("person", "int32", "LONG"),
+                  ("vehicle_type", "category", "TEXT"),
+                  ("distance_crossed", "int32", "LONG"),
+                  ("longitude", "float64", "DOUBLE"),
+                  ("latitude", "float64", "DOUBLE"),
+                  ("trip_time", "datetime64[ns]", "DATE"))
+
+_TEXT_LENGTH = 256
+_MAPPING_TYPES = {"LONG": "Long", "DOUBLE": "Double", "TEXT": "Text"}
+
+
+
+def parse_trip_time(trip_time_values, format_string: str=TRIP_TIME_FORMAT, shift_hours: int=-1) -> np.ndarray:
+    """
+    Parses the trip time strings into datetime64 values and applies the same hour shift the measure tool applies.
+    Already parsed trip times are only shifted.
+
+    :param trip_time_values:    The trip time strings or datetime values.
+    :param str format_string:   The fixed trip time format.
+    :param int shift_hours:     The hours being added to every trip time.
+    """
+    trip_time = pd.Series(trip_time_values)
+    if not pd.api.types.is_datetime64_any_dtype(trip_time):
+        trip_time = pd.to_datetime(trip_time, format=format_string)
+    if 0 != shift_hours:
+        trip_time = trip_time + pd.Timedelta(hours=shift_hours)
+    return trip_time.to_numpy(dtype="datetime64[ns]")
+
+def _to_integer(column: pd.Series, dtype: str) -> pd.Series:
+    if column.isna().any():
+        # missing values need the nullable integer type
+        dtype = dtype.capitalize()
+    elif 0 < column.size:
+        integer_info = np.iinfo(dtype)
+        if column.min() < integer_info.min or integer_info.max < column.max():
+            raise ValueError(f"The {column.name} values exceed the {dtype} range!")
+    return column.astype(dtype)
+
+def apply_traffic_schema(traffic_df: pd.DataFrame, shift_hours: int=0) -> pd.DataFrame:
+    """
+    Returns the traffic table using the schema types, columns not being part of the schema remain unchanged.
+    The trip times are parsed using the fixed format and are not shifted by default.
+
+    :param traffic_df:          The traffic dataframe.
+    :param int shift_hours:     The hours being added to every trip time.
+    """
+    typed_columns = {}
+    for name, dtype, _ in TRAFFIC_SCHEMA:
+        if not name in traffic_df.columns:
+            continue
+
+        column = traffic_df[name]
+        if "category" == dtype:
+            typed_columns[name] = column.astype("category")
+        elif "trip_time" == name:
+            typed_columns[name] = parse_trip_time(column, shift_hours=shift_hours)
+        elif np.issubdtype(np.dtype(dtype), np.integer):
+            typed_columns[name] = _to_integer(column, dtype)
+        else:
+            typed_columns[name] = column.astype(dtype)
+
+    typed_df = traffic_df.assign(**typed_columns)
+    logger = logging.getLogger("codecarbon")
+    if logger.isEnabledFor(logging.INFO):
+        report_df = memory_report(traffic_df, typed_df)
+        logger.info(f"The typed traffic table uses {report_df['typed_bytes'].sum() / 1024 ** 2:.1f} MB, "
+                    f"{report_df['saved_bytes'].sum() / 1024 ** 2:.1f} MB less than before.")
+    return typed_df
+
+def memory_report(traffic_df: pd.DataFrame, typed_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Returns the memory usage of every column before and after applying the schema in bytes.
+    """
+    original_bytes = traffic_df.memory_usage(index=False, deep=True)
+    typed_bytes = typed_df.memory_usage(index=False, deep=True)
+    report_df = pd.DataFrame({"column": original_bytes.index,
+                              "original_bytes": original_bytes.to_numpy(),
+                              "typed_bytes": typed_bytes.reindex(original_bytes.index).to_numpy()})
+    report_df["saved_bytes"] = report_df["original_bytes"] - report_df["typed_bytes"]
+    return report_df
+
+def concat_traffic(traffic_dfs) -> pd.DataFrame:
+    """
+    Concatenates typed traffic tables, the categories of the vehicle types are united instead of falling back to text.
+    """
+    traffic_dfs = [traffic_df for traffic_df in traffic_dfs]
+    if 0 == len(traffic_dfs):
+        return pd.DataFrame(columns=[name for name, _, _ in TRAFFIC_SCHEMA])
+
+    categorical_columns = [name for name, dtype, _ in TRAFFIC_SCHEMA if "category" == dtype and name in traffic_dfs[0].columns]
+    for name in categorical_columns:
+        categories = pd.api.types.union_categoricals([pd.Categorical(traffic_df[name]) for traffic_df in traffic_dfs]).categories
+        traffic_dfs = [traffic_df.assign(**{name: traffic_df[name].astype(pd.CategoricalDtype(categories))}) for traffic_df in traffic_dfs]
+    return pd.concat(traffic_dfs, ignore_index=True)
+
+def traffic_field_descriptions() -> list:
+    """
+    Returns the field descriptions of the traffic feature class for AddFields.
+    """
+    field_descriptions = []
+    for name, _, field_type in TRAFFIC_SCHEMA:
+        if "TEXT" == field_type:
+            field_descriptions.append([name, field_type, name, _TEXT_LENGTH])
+        else:
+            field_descriptions.append([name, field_type])
+    return field_descriptions
+
+def traffic_field_mapping(source: str="traffic_data", renamed_fields: dict=None) -> str:
+    """
+    Returns the field mapping of the traffic feature class for ExportFeatures.
+    The trip times of the source are text, the renamed fields e.g. {"trip_time": "trip_time_old"} get a new name.
+
+    :param str source:          The name of the source feature class.
+    :param dict renamed_fields: The new field names by source field name.
+    """
+    if None is renamed_fields:
+        renamed_fields = dict()
+
+    field_maps = []
+    for name, _, field_type in TRAFFIC_SCHEMA:
+        output_name = renamed_fields.get(name, name)
+        if "DATE" == field_type or "TEXT" == field_type:
+            field_maps.append(f'{output_name} "{output_name}" true true false {_TEXT_LENGTH} Text 0 0,First,#,{source},{name},0,{_TEXT_LENGTH}')
+        else:
+            field_maps.append(f'{output_name} "{output_name}" true true false 0 {_MAPPING_TYPES[field_type]} 0 0,First,#,{source},{name},-1,-1')
+    return ";".join(field_maps)
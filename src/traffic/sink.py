@@ -0,0 +1,258 @@
+import numpy as np
+import pyarrow as pa
+import sqlite3 as sql
+from traffic.schema import TRAFFIC_SCHEMA
+
+try:
+    import arcpy
+except ImportError:
+    # plain Python environments can still write into sqlite and GeoPackage files
+    arcpy = None
+
+
+
+def _sqlite_type(dtype: np.dtype) -> str:
+    """
+    Returns the sqlite column type of a numpy dtype.
+    """
+    if np.issubdtype(dtype, np.integer) or np.issubdtype(dtype, np.bool_):
+        return "INTEGER"
+    if np.issubdtype(dtype, np.floating):
+        return "REAL"
+    return "TEXT"
+
+def _arrow_integer_types() -> dict:
+    """
+    Returns the Arrow types of the integer columns of the traffic schema.
+    """
+    return {name: pa.from_numpy_dtype(np.dtype(dtype)) for name, dtype, _ in TRAFFIC_SCHEMA if "category" != dtype and np.issubdtype(np.dtype(dtype), np.integer)}
+
+def _sqlite_columns(array: np.ndarray) -> list:
+    """
+    Returns the columns of a structured array as lists of sqlite compatible values.
+    """
+    columns = []
+    for field_name in array.dtype.names:
+        column = array[field_name]
+        if np.issubdtype(column.dtype, np.datetime64):
+            # ISO 8601 text like the agent_pos table, missing times become NULL
+            column_values = np.datetime_as_string(column, unit="s").tolist()
+            columns.append([None if "NaT" == value else value for value in column_values])
+        else:
+            columns.append(column.tolist())
+    return columns
+
+
+class FeatureClassSink(object):
+    """
+    Writes structured traffic arrays into a point feature class using arcpy.
+    The first batch creates the feature class, every further batch is appended.
+    """
+
+    def __init__(self, workspace: str, name: str="traffic_data", x_column: str="longitude", y_column: str="latitude", spatial_reference: int=4326) -> None:
+        if None is arcpy:
+            raise RuntimeError("The feature class sink requires arcpy!")
+
+        self._feature_class = f"{workspace}/{name}"
+        self._shape_fields = (x_column, y_column)
+        self._spatial_reference = arcpy.SpatialReference(spatial_reference)
+        self._created = False
+
+    def write(self, array: np.ndarray):
+        arcpy.env.overwriteOutput = True
+        if not self._created:
+            arcpy.da.NumPyArrayToFeatureClass(array, self._feature_class, self._shape_fields, self._spatial_reference)
+            self._created = True
+        else:
+            batch_feature_class = "memory/traffic_data_batch"
+            arcpy.da.NumPyArrayToFeatureClass(array, batch_feature_class, self._shape_fields, self._spatial_reference)
+            arcpy.management.Append(batch_feature_class, self._feature_class, schema_type="NO_TEST")
+            arcpy.management.Delete(batch_feature_class)
+
+    def close(self):
+        # Release schema lock
+        arcpy.management.ClearWorkspaceCache()
+        return self._feature_class
+
+
+class SqliteSink(object):
+    """
+    Writes structured traffic arrays into a sqlite table.
+    The table is recreated by the first batch.
+    """
+
+    def __init__(self, db_filepath: str, table: str="traffic_data") -> None:
+        self._db_filepath = db_filepath
+        self._table = table
+        self._connection = None
+        self._field_names = None
+
+    def _create_table(self, connection, array: np.ndarray):
+        column_definitions = ", ".join(f'"{field_name}" {_sqlite_type(array.dtype[field_name])}' for field_name in array.dtype.names)
+        connection.execute(f'DROP TABLE IF EXISTS "{self._table}";')
+        connection.execute(f'CREATE TABLE "{self._table}" ({column_definitions});')
+
+    def _insert_statement(self) -> str:
+        column_list = ", ".join(f'"{field_name}"' for field_name in self._field_names)
+        return f'INSERT INTO "{self._table}" ({column_list}) VALUES ({", ".join("?" * len(self._field_names))});'
+
+    def _rows(self, array: np.ndarray):
+        return zip(*_sqlite_columns(array))
+
+    def write(self, array: np.ndarray):
+        if None is self._connection:
+            self._connection = sql.connect(self._db_filepath)
+            self._field_names = array.dtype.names
+            self._create_table(self._connection, array)
+
+        with self._connection:
+            self._connection.executemany(self._insert_statement(), self._rows(array))
+
+    def close(self):
+        if None is not self._connection:
+            self._connection.close()
+            self._connection = None
+        return f"{self._db_filepath}/{self._table}"
+
+
+class GeoPackageSink(SqliteSink):
+    """
+    Writes structured traffic arrays into a GeoPackage point layer.
+    The point geometries are encoded as GeoPackage binaries from the x and y columns.
+    """
+
+    _WGS84_DEFINITION = 'GEOGCS["WGS 84",DATUM["WGS_1984",SPHEROID["WGS 84",6378137,298.257223563]],PRIMEM["Greenwich",0],UNIT["degree",0.0174532925199433],AUTHORITY["EPSG","4326"]]'
+    _ETRS89_DEFINITION = 'GEOGCS["ETRS89",DATUM["European_Terrestrial_Reference_System_1989",SPHEROID["GRS 1980",6378137,298.257222101]],PRIMEM["Greenwich",0],UNIT["degree",0.0174532925199433],AUTHORITY["EPSG","4258"]]'
+    # UTM zones of the projected spatial references e.g. 25832 for ETRS89 / UTM zone 32N
+    _UTM_DEFINITION = ('PROJCS["{name}",{geographic},PROJECTION["Transverse_Mercator"],PARAMETER["latitude_of_origin",0],'
+                       'PARAMETER["central_meridian",{central_meridian}],PARAMETER["scale_factor",0.9996],PARAMETER["false_easting",500000],'
+                       'PARAMETER["false_northing",{false_northing}],UNIT["metre",1],AXIS["Easting",EAST],AXIS["Northing",NORTH],AUTHORITY["EPSG","{srs_id}"]]')
+
+    # GeoPackage binary header without envelope followed by a little endian WKB point
+    _POINT_DTYPE = np.dtype([("magic", "S2"), ("version", "u1"), ("flags", "u1"), ("srs_id", "<i4"),
+                             ("byte_order", "u1"), ("geometry_type", "<u4"), ("x", "<f8"), ("y", "<f8")])
+
+    def __init__(self, db_filepath: str, table: str="traffic_data", x_column: str="longitude", y_column: str="latitude", spatial_reference: int=4326) -> None:
+        super().__init__(db_filepath, table)
+        self._x_column = x_column
+        self._y_column = y_column
+        self._srs_id = spatial_reference
+        self._srs_name, self._srs_definition = self._spatial_reference_definition(spatial_reference)
+
+    @classmethod
+    def _spatial_reference_definition(cls, srs_id: int):
+        """
+        Returns the name and the well-known text of WGS 84 or an ETRS89 or WGS 84 UTM zone.
+        """
+        if 4326 == srs_id:
+            return "WGS 84 geodetic", cls._WGS84_DEFINITION
+        if 25828 <= srs_id <= 25838:
+            datum_name, geographic, zone, hemisphere, false_northing = "ETRS89", cls._ETRS89_DEFINITION, srs_id - 25800, "N", 0
+        elif 32601 <= srs_id <= 32660:
+            datum_name, geographic, zone, hemisphere, false_northing = "WGS 84", cls._WGS84_DEFINITION, srs_id - 32600, "N", 0
+        elif 32701 <= srs_id <= 32760:
+            datum_name, geographic, zone, hemisphere, false_northing = "WGS 84", cls._WGS84_DEFINITION, srs_id - 32700, "S", 10000000
+        else:
+            raise ValueError(f"Unsupported spatial reference {srs_id}!")
+        name = f"{datum_name} / UTM zone {zone}{hemisphere}"
+        return name, cls._UTM_DEFINITION.format(name=name, geographic=geographic, central_meridian=6 * zone - 183,
+                                                false_northing=false_northing, srs_id=srs_id)
+
+    def _create_table(self, connection, array: np.ndarray):
+        connection.execute("PRAGMA application_id = 1196444487;")
+        connection.execute("PRAGMA user_version = 10300;")
+        connection.execute("""CREATE TABLE IF NOT EXISTS gpkg_spatial_ref_sys (srs_name TEXT NOT NULL, srs_id INTEGER NOT NULL PRIMARY KEY,
+                           organization TEXT NOT NULL, organization_coordsys_id INTEGER NOT NULL, definition TEXT NOT NULL, description TEXT);""")
+        connection.execute("""CREATE TABLE IF NOT EXISTS gpkg_contents (table_name TEXT NOT NULL PRIMARY KEY, data_type TEXT NOT NULL,
+                           identifier TEXT UNIQUE, description TEXT DEFAULT '', last_change DATETIME NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ','now')),
+                           min_x DOUBLE, min_y DOUBLE, max_x DOUBLE, max_y DOUBLE, srs_id INTEGER);""")
+        connection.execute("""CREATE TABLE IF NOT EXISTS gpkg_geometry_columns (table_name TEXT NOT NULL, column_name TEXT NOT NULL,
+                           geometry_type_name TEXT NOT NULL, srs_id INTEGER NOT NULL, z TINYINT NOT NULL, m TINYINT NOT NULL,
+                           CONSTRAINT pk_geom_cols PRIMARY KEY (table_name, column_name));""")
+        connection.executemany("INSERT OR IGNORE INTO gpkg_spatial_ref_sys VALUES (?, ?, ?, ?, ?, ?);",
+                               [("Undefined cartesian SRS", -1, "NONE", -1, "undefined", None),
+                                ("Undefined geographic SRS", 0, "NONE", 0, "undefined", None),
+                                ("WGS 84 geodetic", 4326, "EPSG", 4326, self._WGS84_DEFINITION, None),
+                                (self._srs_name, self._srs_id, "EPSG", self._srs_id, self._srs_definition, None)])
+        connection.execute("DELETE FROM gpkg_contents WHERE table_name = ?;", (self._table,))
+        connection.execute("DELETE FROM gpkg_geometry_columns WHERE table_name = ?;", (self._table,))
+        connection.execute("INSERT INTO gpkg_contents (table_name, data_type, identifier, srs_id) VALUES (?, 'features', ?, ?);",
+                           (self._table, self._table, self._srs_id))
+        connection.execute("INSERT INTO gpkg_geometry_columns VALUES (?, 'geom', 'POINT', ?, 0, 0);", (self._table, self._srs_id))
+
+        column_definitions = ", ".join(f'"{field_name}" {_sqlite_type(array.dtype[field_name])}' for field_name in array.dtype.names)
+        connection.execute(f'DROP TABLE IF EXISTS "{self._table}";')
+        connection.execute(f'CREATE TABLE "{self._table}" (fid INTEGER PRIMARY KEY AUTOINCREMENT, geom POINT, {column_definitions});')
+
+    def _insert_statement(self) -> str:
+        column_list = ", ".join(f'"{field_name}"' for field_name in ("geom",) + self._field_names)
+        return f'INSERT INTO "{self._table}" ({column_list}) VALUES ({", ".join("?" * (1 + len(self._field_names)))});'
+
+    def _rows(self, array: np.ndarray):
+        points = np.empty(array.shape[0], dtype=self._POINT_DTYPE)
+        points["magic"] = b"GP"
+        points["version"] = 0
+        # little endian header without envelope
+        points["flags"] = 1
+        points["srs_id"] = self._srs_id
+        points["byte_order"] = 1
+        points["geometry_type"] = 1
+        points["x"] = array[self._x_column]
+        points["y"] = array[self._y_column]
+        geometries = points.view(f"V{self._POINT_DTYPE.itemsize}").tolist()
+        return zip(geometries, *_sqlite_columns(array))
+
+    def close(self):
+        if None is not self._connection:
+            with self._connection:
+                self._connection.execute(f"""UPDATE gpkg_contents SET min_x = (SELECT MIN("{self._x_column}") FROM "{self._table}"),
+                                         min_y = (SELECT MIN("{self._y_column}") FROM "{self._table}"),
+                                         max_x = (SELECT MAX("{self._x_column}") FROM "{self._table}"),
+                                         max_y = (SELECT MAX("{self._y_column}") FROM "{self._table}")
+                                         WHERE table_name = ?;""", (self._table,))
+        return super().close()
+
+
+class ArrowSink(object):
+    """
+    Writes structured traffic arrays into an Arrow IPC file.
+    Every batch becomes one record batch, so the file can be read back memory-mapped.
+    The integer columns of the traffic schema are nullable, because a batch having missing values
+    arrives as float, the other columns keep the types of the first batch.
+    """
+
+    def __init__(self, filepath: str) -> None:
+        self._filepath = filepath
+        self._sink = None
+        self._writer = None
+        self._schema = None
+
+    def _arrays(self, array: np.ndarray) -> list:
+        integer_types = _arrow_integer_types()
+        arrays = []
+        for field_name in array.dtype.names:
+            if field_name in integer_types:
+                # NaN values of float batches are missing values
+                arrays.append(pa.array(array[field_name], from_pandas=True).cast(integer_types[field_name]))
+            else:
+                arrays.append(pa.array(array[field_name]))
+        return arrays
+
+    def write(self, array: np.ndarray):
+        record_batch = pa.RecordBatch.from_arrays(self._arrays(array), names=list(array.dtype.names))
+        if None is self._writer:
+            self._schema = record_batch.schema
+            self._sink = pa.OSFile(self._filepath, "wb")
+            self._writer = pa.ipc.new_file(self._sink, self._schema)
+        elif not record_batch.schema.equals(self._schema):
+            record_batch = pa.RecordBatch.from_arrays([column.cast(field.type) for column, field in zip(record_batch.columns, self._schema)],
+                                                      schema=self._schema)
+        self._writer.write_batch(record_batch)
+
+    def close(self):
+        if None is not self._writer:
+            self._writer.close()
+            self._sink.close()
+            self._writer = None
+            self._sink = None
+        return self._filepath